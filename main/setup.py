@@ -26,5 +26,8 @@ setuptools.setup(
         'azure-storage-blob>=12.6.0',
         'azure-keyvault>=4.1.0',
         'azure-identity>=1.5.0'
-    ])
+    ],
+    extras_require={
+        'aio': ['aiohttp>=3.0']
+    })
 
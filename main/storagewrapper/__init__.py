@@ -1,11 +1,61 @@
-from storagewrapper._authenticate import AuthenticateFunctions
-from storagewrapper._blob import BlobFunctions
-from storagewrapper._fileshare import FileShareFunctions
-from storagewrapper._queue import QueueFunctions
-
-__all__ = [
-    'AuthenticateFunctions',
-    'BlobFunctions',
-    'FileShareFunctions',
-    'QueueFunctions'
-]
+import importlib
+import sys
+
+# Module each public name is defined in. Names are imported from it on first use, so importing storagewrapper doesn't
+# import the azure sdks, and a program using only queues never imports the blob, file share or key vault sdks
+_exports = {
+    'AsyncBlobFunctions': 'storagewrapper._blob_async',
+    'AsyncClientRegistry': 'storagewrapper._clients',
+    'AsyncFileShareFunctions': 'storagewrapper._fileshare_async',
+    'AsyncQueueFunctions': 'storagewrapper._queue_async',
+    'AuthenticateFunctions': 'storagewrapper._authenticate',
+    'BlobFunctions': 'storagewrapper._blob',
+    'ClaimCheck': 'storagewrapper._claim_check',
+    'ClientRegistry': 'storagewrapper._clients',
+    'CopyJob': 'storagewrapper._copy',
+    'CopyScheduler': 'storagewrapper._copy',
+    'DiskCache': 'storagewrapper._disk_cache',
+    'FileShareFunctions': 'storagewrapper._fileshare',
+    'InMemorySink': 'storagewrapper._metrics',
+    'ItemResult': 'storagewrapper._bulk',
+    'LocalBackend': 'storagewrapper._local',
+    'Metrics': 'storagewrapper._metrics',
+    'OperationReport': 'storagewrapper._bulk',
+    'PrefetchingCredential': 'storagewrapper._credentials',
+    'PrometheusSink': 'storagewrapper._metrics',
+    'QueueFunctions': 'storagewrapper._queue',
+    'RetryPolicy': 'storagewrapper._retry',
+    'SasCache': 'storagewrapper._sas_cache',
+    'SecretCache': 'storagewrapper._secrets'
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+
+    module_name = _exports.get(name)
+
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name), name)
+
+    # Later lookups find the name in the module without calling __getattr__ again
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+
+    return sorted(set(globals()) | set(_exports))
+
+
+if sys.version_info < (3, 7):
+
+    # Module __getattr__ arrived in Python 3.7 (PEP 562), so earlier versions import everything up front
+    for _name in __all__:
+        globals()[_name] = __getattr__(_name)
+
+    del _name
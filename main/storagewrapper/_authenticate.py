@@ -1,9 +1,8 @@
-from azure.storage.blob import ContainerSasPermissions
-from azure.storage.fileshare import AccountSasPermissions
-from azure.identity import ClientSecretCredential, UsernamePasswordCredential
-from azure.keyvault.secrets import SecretClient
 from datetime import timedelta
+from storagewrapper._credentials import shared_prefetching_credential
 from storagewrapper._exceptions import AuthenticationError
+from storagewrapper._metrics import NULL_METRICS
+import hashlib
 
 
 class AuthenticateFunctions:
@@ -30,24 +29,140 @@ class AuthenticateFunctions:
 
     args:
         params (dict): dictionary of params used to authenticate
+        metrics (Metrics, optional): if given, time spent acquiring tokens is recorded as the "token" stage
+        prefetch_tokens (bool, optional): if True, tokens for storage and key vault are acquired in the background straight
+            away and refreshed before they expire, and token is a PrefetchingCredential shared by every authenticator in
+            the process using the same identity. Defaults to False
+
+    attributes:
+        token: credential used by BlobFunctions, FileShareFunctions and QueueFunctions
+        async_token: asyncio credential used by AsyncBlobFunctions, AsyncFileShareFunctions and AsyncQueueFunctions. Created on first use
 
     """
 
-    def __init__(self, params):
+    def __init__(self, params, metrics=None, prefetch_tokens=False):
         self.params = params
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.prefetch_tokens = prefetch_tokens
         self.token = self.__generate_credential()
+
+        if self.metrics.enabled:
+            self.token = _InstrumentedCredential(self.token, self.metrics)
+
+        if self.prefetch_tokens:
+            self.token = shared_prefetching_credential(self.__identity(), self.token, version=self.__secret_hash())
+        self._async_token = None
+
+        # The permissions are checked here but only built on first use, so that only programs using blobs import the
+        # blob sdk and only programs using file shares import the file share sdk
+        self._container_sas_permissions = None
+        self._fileshare_sas_permissions = None
         
         if "sas_permissions" in self.params:
 
-            self.container_sas_permissions = self.__define_container_sas_permissions()
-            self.fileshare_sas_permissions = self.__define_fileshare_sas_permissions()
+            self._container_permission_args = self.__define_container_sas_permissions()
+            self._fileshare_permission_args = self.__define_fileshare_sas_permissions()
         
         elif "sas_permissions" not in self.params:
-            self.container_sas_permissions = self.__default_container_sas_permissions()
-            self.fileshare_sas_permissions = self.__default_fileshare_sas_permissions()
+            self._container_permission_args = self.__default_container_sas_permissions()
+            self._fileshare_permission_args = self.__default_fileshare_sas_permissions()
         
         self.sas_duration = self.__define_sas_duration()
 
+    @property
+    def async_token(self):
+        """
+        Asyncio credential equivalent to token. It is created once and shared by every async wrapper using this authenticator
+
+        return async token_credential: Azure async credential obj
+        """
+
+        if self._async_token is None:
+            self._async_token = self.__generate_async_credential()
+
+        return self._async_token
+
+    @property
+    def container_sas_permissions(self):
+        """
+        ContainerSasPermissions of the SAS tokens BlobFunctions generates
+
+        return container_sas_permissions: ContainerSasPermissions obj
+        """
+
+        if self._container_sas_permissions is None and self._container_permission_args is not None:
+
+            from azure.storage.blob import ContainerSasPermissions
+
+            self._container_sas_permissions = ContainerSasPermissions(**self._container_permission_args)
+
+        return self._container_sas_permissions
+
+    @container_sas_permissions.setter
+    def container_sas_permissions(self, container_sas_permissions):
+        self._container_sas_permissions = container_sas_permissions
+
+    @property
+    def fileshare_sas_permissions(self):
+        """
+        AccountSasPermissions of the SAS tokens FileShareFunctions generates
+
+        return fileshare_sas_permissions: AccountSasPermissions obj
+        """
+
+        if self._fileshare_sas_permissions is None and self._fileshare_permission_args is not None:
+
+            from azure.storage.fileshare import AccountSasPermissions
+
+            self._fileshare_sas_permissions = AccountSasPermissions(**self._fileshare_permission_args)
+
+        return self._fileshare_sas_permissions
+
+    @fileshare_sas_permissions.setter
+    def fileshare_sas_permissions(self, fileshare_sas_permissions):
+        self._fileshare_sas_permissions = fileshare_sas_permissions
+
+    def __generate_async_credential(self):
+        """
+        Generates an asyncio credential based on authentication_method selected. Azure identity has no async
+        username and password credential, so for user authentication the sync credential is run in an executor. So is
+        a prefetching credential, so async wrappers share its tokens
+
+        return token_credential: Azure async credential obj
+        """
+
+        if self.params["authentication_method"] == "client_secret" and not self.prefetch_tokens:
+
+            from azure.identity.aio import ClientSecretCredential as AsyncClientSecretCredential
+
+            return AsyncClientSecretCredential(tenant_id=self.params["client_id"], client_id=self.params["app_id"], client_secret=self.params["app_key"])
+
+        return _AsyncCredentialAdapter(self.token)
+
+    def __identity(self):
+        """
+        Identifies who the credential authenticates as, so authenticators for the same identity share a prefetching
+        credential
+
+        return identity: tuple
+        """
+
+        if self.params["authentication_method"] == "client_secret":
+            return ("client_secret", self.params["client_id"], self.params["app_id"])
+
+        return ("user", self.params["client_id"], self.params["username"])
+
+    def __secret_hash(self):
+        """
+        Hash of the secret the credential authenticates with, so a rotated secret replaces the shared prefetching credential
+
+        return str
+        """
+
+        secret = self.params["app_key"] if self.params["authentication_method"] == "client_secret" else self.params["password"]
+
+        return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
     def __generate_client_secret_credential(self, tenant_id, app_id, app_key):
         """
         Generates a token using a app id
@@ -58,6 +173,8 @@ class AuthenticateFunctions:
         return client_secret: ClientSecretObj
         """
 
+        from azure.identity import ClientSecretCredential
+
         try:
 
             token_credential = ClientSecretCredential(tenant_id=tenant_id, client_id=app_id, client_secret=app_key)
@@ -79,6 +196,8 @@ class AuthenticateFunctions:
         return token_credential: UsernamePasswordCredential obj
         """
 
+        from azure.identity import UsernamePasswordCredential
+
         try:
 
             token_credential = UsernamePasswordCredential(client_id=client_id, username=username, password=password)
@@ -106,20 +225,20 @@ class AuthenticateFunctions:
                 list_blob = container_permissions["list"]
                 tag = container_permissions["tag"]
 
-                return ContainerSasPermissions(read=read, write=write, delete=delete, 
-                                               delete_previous_version=delete_previous_version, list=list_blob, tag=tag)
+                return dict(read=read, write=write, delete=delete, 
+                            delete_previous_version=delete_previous_version, list=list_blob, tag=tag)
             except KeyError:
 
                 raise AuthenticationError("If specifying container SAS permissions all permissions status must be provided")
         
         elif "container_permission" not in permissions:
 
-            return ContainerSasPermissions(read=True, write=True, delete=True, 
-                                           delete_previous_version=True, list=True, tag=True)
+            return dict(read=True, write=True, delete=True, 
+                        delete_previous_version=True, list=True, tag=True)
     
     def __default_container_sas_permissions(self):
-        return ContainerSasPermissions(read=True, write=True, delete=True, 
-                                       delete_previous_version=True, list=True, tag=True)
+        return dict(read=True, write=True, delete=True, 
+                    delete_previous_version=True, list=True, tag=True)
 
     def __define_fileshare_sas_permissions(self):
         
@@ -143,25 +262,25 @@ class AuthenticateFunctions:
                 tag = fileshare_permissions["tag"]
                 filter_by_tags = fileshare_permissions["filter_by_tags"]
 
-                return AccountSasPermissions(read=read, write=write, delete=delete, list=list_files, 
-                                             add=add, create=create, update=update, process=process, 
-                                             delete_previous_version=delete_previous_version, tag=tag, 
-                                             filter_by_tags=filter_by_tags)
+                return dict(read=read, write=write, delete=delete, list=list_files, 
+                            add=add, create=create, update=update, process=process, 
+                            delete_previous_version=delete_previous_version, tag=tag, 
+                            filter_by_tags=filter_by_tags)
             except KeyError:
 
                 raise AuthenticationError("If specifying container SAS permissions all permissions status must be provided")
         
         elif "file_permissions" not in permissions:
 
-            return AccountSasPermissions(read=True, write=True, delete=True, list=True, 
-                                         add=True, create=True, update=True, process=True, 
-                                         delete_previous_version=True, tag=True, 
-                                         filter_by_tags=True)
+            return dict(read=True, write=True, delete=True, list=True, 
+                        add=True, create=True, update=True, process=True, 
+                        delete_previous_version=True, tag=True, 
+                        filter_by_tags=True)
 
     def __default_fileshare_sas_permissions(self):
-        return AccountSasPermissions(read=True, write=True, delete=True, list=True, 
-                                     add=True, create=True, update=True, process=True, 
-                                     delete_previous_version=True, tag=True, filter_by_tags=True)
+        return dict(read=True, write=True, delete=True, list=True, 
+                    add=True, create=True, update=True, process=True, 
+                    delete_previous_version=True, tag=True, filter_by_tags=True)
 
     def __define_sas_duration(self):
         if "sas_duration" in self.params:
@@ -211,4 +330,53 @@ class AuthenticateFunctions:
 
             print("KeyError: Check Authentication Params")
             
-            raise KeyError
\ No newline at end of file
+            raise KeyError
+
+
+class _InstrumentedCredential:
+    """
+    Wraps a sync credential, timing each token acquisition
+    """
+
+    def __init__(self, credential, metrics):
+        self.credential = credential
+        self.metrics = metrics
+
+    def get_token(self, *scopes, **kwargs):
+
+        with self.metrics.stage("authenticate", "token"):
+            return self.credential.get_token(*scopes, **kwargs)
+
+    def close(self):
+
+        close = getattr(self.credential, "close", None)
+
+        if close is not None:
+            close()
+
+
+class _AsyncCredentialAdapter:
+    """
+    Exposes a sync credential through the asyncio credential interface by acquiring tokens in an executor
+    """
+
+    def __init__(self, credential):
+        self.credential = credential
+
+    async def get_token(self, *scopes, **kwargs):
+
+        import functools
+        from storagewrapper._sas_cache import running_loop
+
+        loop = running_loop()
+
+        return await loop.run_in_executor(None, functools.partial(self.credential.get_token, *scopes, **kwargs))
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
@@ -1,11 +1,40 @@
-from azure.storage.blob import BlobServiceClient, generate_container_sas, ContainerSasPermissions, BlobClient
-from azure.keyvault.secrets import SecretClient
-from datetime import datetime
-from storagewrapper._exceptions import BlobFunctionsError
-
+from azure.core import MatchConditions
+from azure.core.exceptions import ClientAuthenticationError, HttpResponseError, ResourceNotFoundError
+from collections import namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from storagewrapper._bulk import ItemResult, OperationReport, run_bounded
+from storagewrapper._clients import ClientRegistry
+from storagewrapper._checkpoint import UploadJournal
+from storagewrapper._copy import CopyJob, CopyScheduler
+from storagewrapper._exceptions import BlobFunctionsError, InvalidArguments
+from storagewrapper._local import configured_backend
+from storagewrapper._metrics import NULL_METRICS, instrumented
+from storagewrapper._retry import RetryingPaged, shared_retry_policy
+from storagewrapper._sas_cache import SasCache
+from storagewrapper._secrets import shared_secret_cache
+from storagewrapper._sync import DEFAULT_MANIFEST_NAME, SyncReport, is_manifest_file, load_manifest, save_manifest, file_md5
+from storagewrapper._transfer import (DEFAULT_BLOCK_SIZE, DEFAULT_CHUNK_SIZE, block_size_for, split_ranges, stage_blocks_from_path, stream_ranges,
+                                      download_ranges_to_path, download_resumable)
+
+import base64
+import os
+import pathlib
 import sys
+import time
+import uuid
+
+
+BlobPage = namedtuple("BlobPage", ["blobs", "prefixes", "continuation_token"])
+
+# Longest a user delegation key may be valid for, less a little leeway for clock skew
+MAX_USER_DELEGATION_KEY_LIFETIME = timedelta(days=7) - timedelta(minutes=5)
 
+# Maximum number of sub-requests the blob batch API accepts in one request
+BATCH_SIZE = 256
 
+
+@instrumented("blob")
 class BlobFunctions:
     """
     A wrapper on blob storage functions
@@ -15,6 +44,13 @@ class BlobFunctions:
         storage_account_name(str): Name of the storage account
         sas_method (str, optional): Controls whether a user delegation key is used to generate SAS or whether an access key stored in key vault is used. If access key then vault_url, access_key_secret_name must be provided. Defaults to UserDelegationKey.
         handle_exceptions (bool, optional): If True exceptions raised are handled silently and passed back as a message in the return, if False raises an exception. Default is False
+        sas_cache (SasCache, optional): Cache of user delegation keys and SAS tokens. Can be shared between instances and threads. Defaults to a new SasCache per instance.
+        client_registry (ClientRegistry, optional): Pool of long lived clients sharing one HTTP session. Defaults to a new ClientRegistry per instance.
+        secret_cache (SecretCache, optional): Cache of key vault secrets used by the AccessKey sas_method. Defaults to a cache shared by every wrapper in the process.
+        disk_cache (DiskCache, optional): Local cache of blob content used by read_blob. Defaults to None, no caching.
+        retry_policy (RetryPolicy, optional): Retries, throttling and circuit breaking applied to requests. Defaults to a policy shared by every wrapper in the process.
+        metrics (Metrics, optional): Records call counts, latencies, bytes transferred and time spent on authentication. Defaults to None, recording nothing.
+        backend (LocalBackend, optional): Keeps blobs somewhere other than Azure, eg on local disk. Defaults to the backend selected by the STORAGEWRAPPER_BACKEND environment variable, which is Azure unless set to local.
     
     Attributes:
         token(TokenCredentialsClass obj): A token from the authentication module
@@ -23,7 +59,8 @@ class BlobFunctions:
 
     """
 
-    def __init__(self, storage_account_name, authenticator, sas_method="UserDelegationKey", vault_url=None, access_key_secret_name=None, handle_exceptions=False):
+    def __init__(self, storage_account_name, authenticator, sas_method="UserDelegationKey", vault_url=None, access_key_secret_name=None, handle_exceptions=False, sas_cache=None, client_registry=None, secret_cache=None,
+                 disk_cache=None, retry_policy=None, metrics=None, backend=None):
         self.authenticator = authenticator
         self.token = self.authenticator.token
         self.storage_account_name = storage_account_name
@@ -33,11 +70,21 @@ class BlobFunctions:
         self.vault_url = vault_url
         self.access_key_secret_name = access_key_secret_name
         self.handle_exceptions = handle_exceptions
+        self.sas_cache = sas_cache if sas_cache is not None else SasCache()
+        self.client_registry = client_registry if client_registry is not None else ClientRegistry()
+        self.secret_cache = secret_cache if secret_cache is not None else shared_secret_cache
+        self.disk_cache = disk_cache
+        self.retry_policy = retry_policy if retry_policy is not None else shared_retry_policy
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.backend = backend if backend is not None else configured_backend()
+        self.account_url = f"https://{self.storage_account_name}.blob.core.windows.net/"
     
     def __str__(self):
         return f"Functions for operating blob storage within storage account:'{self.storage_account_name}'"
 
     def __handle_errors(self, func_name, error):
+        self.metrics.error("blob", func_name)
+
         if self.handle_exceptions:
 
             return False
@@ -70,43 +117,127 @@ class BlobFunctions:
     def __access_key_or_udk(self, container_name):
         """Checks if access key is required or if User Delegation Key method is
 
+        SAS tokens are cached per account, container and permissions until shortly before they expire
+
         Returns:
             str: SAS token
         """
 
-        if self.sas_method == "UserDelegationKey":
+        if self.sas_method not in ("UserDelegationKey", "AccessKey"):
+            raise Exception("sas_method not UserDelegationKey or AccessKey")
 
-            blob_service_client = self.__create_blob_service_client()
+        with self.metrics.stage("blob", "sas"):
+            sas_token = self.sas_cache.get(self.__sas_cache_key(container_name), lambda: self.__generate_container_sas(container_name))
+
+        return sas_token
+
+    def __sas_cache_key(self, container_name):
+
+        return (self.sas_method, self.storage_account_name, container_name, str(self.sas_permissions))
+
+    def __generate_container_sas(self, container_name):
+        """Generates a container SAS token
+
+        Returns:
+            tuple: SAS token and its expiry time
+        """
+
+        from azure.storage.blob import generate_container_sas
+
+        if self.sas_method == "UserDelegationKey":
 
-            udk = blob_service_client.get_user_delegation_key(key_start_time=datetime.utcnow(),
-                                                              key_expiry_time=datetime.utcnow() + self.sas_duration)
+            udk, expiry = self.__get_user_delegation_key(datetime.utcnow() + self.sas_duration)
 
             sas_token = generate_container_sas(
                 account_name=self.storage_account_name,
                 container_name=container_name,
                 user_delegation_key=udk,
                 permission=self.sas_permissions,
-                expiry=datetime.utcnow() + self.sas_duration
+                expiry=expiry
             )
 
-            return sas_token
+            return sas_token, expiry
 
         elif self.sas_method == "AccessKey":
 
             access_key = self.__get_secret()
+            expiry = datetime.utcnow() + self.sas_duration
 
             sas_token = generate_container_sas(
                 account_name=self.storage_account_name,
-                container_name=self.container_name,
+                container_name=container_name,
                 account_key=access_key,
                 permission=self.sas_permissions,
-                expiry=datetime.utcnow() + self.sas_duration
+                expiry=expiry
             )
 
-            return sas_token
+            return sas_token, expiry
 
-        else:
-            raise Exception("sas_method not UserDelegationKey or AccessKey")
+    def __get_user_delegation_key(self, expiry):
+        """Returns a user delegation key valid until at least expiry, or for as long as the service allows if that is sooner.
+        One key is shared by every container in the account.
+
+        A new key is requested for twice the time asked for, so one key signs the SAS tokens made over a while. A SAS
+        gets the whole of its duration rather than whatever the key has left, and never outlives the key it was made from.
+
+        Returns:
+            tuple: UserDelegationKey obj and the expiry a SAS made from it can have
+        """
+
+        key = ("UserDelegationKey", self.storage_account_name)
+        now = datetime.utcnow()
+        expiry = min(expiry, now + MAX_USER_DELEGATION_KEY_LIFETIME)
+
+        def request():
+            return self.__request_user_delegation_key(min(2 * (expiry - now), MAX_USER_DELEGATION_KEY_LIFETIME))
+
+        udk, key_expiry = self.sas_cache.get(key, request)
+
+        if key_expiry < expiry:
+
+            self.sas_cache.invalidate(key)
+            udk, key_expiry = self.sas_cache.get(key, request)
+
+        return udk, min(expiry, key_expiry)
+
+    def __request_user_delegation_key(self, duration=None):
+
+        blob_service_client = self.__create_blob_service_client()
+
+        start = datetime.utcnow()
+        expiry = start + (duration if duration is not None else self.sas_duration)
+
+        with self.metrics.stage("blob", "user_delegation_key"):
+            udk = self.retry_policy.run(lambda: blob_service_client.get_user_delegation_key(key_start_time=start, key_expiry_time=expiry),
+                                        self.storage_account_name)
+
+        return (udk, expiry), expiry
+
+    def __generate_blob_read_sas(self, container_name, blob_name, sas_duration):
+        """Generates a read only SAS for a single blob, valid for sas_duration. It is never cached, so it has the whole
+        of sas_duration left. User delegation SAS are valid for at most 7 days
+
+        Returns:
+            str: SAS token
+        """
+
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        expiry = datetime.utcnow() + sas_duration
+
+        if self.sas_method == "UserDelegationKey":
+
+            udk, expiry = self.__get_user_delegation_key(expiry)
+
+            return generate_blob_sas(account_name=self.storage_account_name, container_name=container_name, blob_name=blob_name,
+                                     user_delegation_key=udk, permission=BlobSasPermissions(read=True), expiry=expiry)
+
+        elif self.sas_method == "AccessKey":
+
+            return generate_blob_sas(account_name=self.storage_account_name, container_name=container_name, blob_name=blob_name,
+                                     account_key=self.__get_secret(), permission=BlobSasPermissions(read=True), expiry=expiry)
+
+        raise Exception("sas_method not UserDelegationKey or AccessKey")
 
     def __get_secret(self):
         """
@@ -115,76 +246,172 @@ class BlobFunctions:
         return secret
         """
 
-        secret_client = SecretClient(vault_url=self.vault_url, credential=self.token)
-        secret = secret_client.get_secret(self.access_key_secret_name)
+        with self.metrics.stage("blob", "key_vault"):
+            secret = self.secret_cache.get(self.vault_url, self.access_key_secret_name, self.token)
+
+        return secret
+
+    def __run_with_key_refresh(self, operation, container_name):
+        """
+        Runs operation under the retry policy. When using the AccessKey sas_method and storage rejects the SAS because the
+        access key held in key vault has been rotated, the key is fetched again and operation is retried once.
+
+        Returns:
+            result of operation
+        """
+
+        def attempt():
+            started = time.monotonic()
+
+            try:
+                return operation()
+
+            except ClientAuthenticationError:
+
+                if self.sas_method != "AccessKey":
+                    raise
+
+                self.secret_cache.invalidate(self.vault_url, self.access_key_secret_name, fetched_before=started)
+                self.sas_cache.invalidate(self.__sas_cache_key(container_name))
+
+                return operation()
+
+        return self.retry_policy.run(attempt, self.storage_account_name)
+
+    def __run_upload(self, operation, data, container_name):
+        """
+        Runs an upload of data as __run_with_key_refresh does. If data is a stream it is rewound to where it started before
+        every attempt, so a retry uploads all of it again. A stream that can't seek is given a single attempt, as a retry
+        would upload only what the failed attempt left unread.
+
+        Returns:
+            result of operation
+        """
+
+        if not hasattr(data, "read"):
+            return self.__run_with_key_refresh(operation, container_name)
+
+        try:
+            start = data.tell()
+            data.seek(start)
+
+        except (AttributeError, OSError, ValueError):
+            return self.retry_policy.run(operation, self.storage_account_name, max_attempts=1)
+
+        def rewound():
+            data.seek(start)
+
+            return operation()
 
-        return secret.value
+        return self.__run_with_key_refresh(rewound, container_name)
 
     def __create_blob_client_from_url(self, blob_name, container_name):
         """
-        Generates a blob sas url, requires blob_name
+        Generates a blob client authenticated with a container sas, requires blob_name
 
         param blob_name: str
-        param storage_account_key: str
-        param storage_account_id: str
+        param container_name: str
 
         return blob_client: BlobClientObj
         """
 
+        if self.backend is not None:
+            return self.backend.container_client(self.storage_account_name, container_name).get_blob_client(blob_name)
+
+        from azure.storage.blob import ContainerClient
+
         blob_sas_token = self.__create_blob_sas_token(container_name=container_name)
 
-        blob_sas_url = f"https://{self.storage_account_name}.blob.core.windows.net/{container_name}/{blob_name}?{blob_sas_token}"
+        with self.metrics.stage("blob", "client"):
+            container_client = self.client_registry.get(
+                ("blob_sas", self.storage_account_name, container_name),
+                lambda transport: ContainerClient(account_url=self.account_url, container_name=container_name, credential=blob_sas_token, transport=transport,
+                                                  retry_total=0),
+                credential=blob_sas_token)
 
-        blob_client = BlobClient.from_blob_url(blob_sas_url)
+        blob_client = container_client.get_blob_client(blob_name)
 
         return blob_client
 
     def __create_blob_service_client(self):
         """
+        Returns the pooled blob service client for the storage account
+
+        return blob_service_client: BlobServiceClientObj
         """
 
-        url = f"https://{self.storage_account_name}.blob.core.windows.net/"
+        if self.backend is not None:
+            return self.backend.blob_service_client(self.storage_account_name)
 
-        blob_service_client = BlobServiceClient(account_url=url, credential=self.token)
+        from azure.storage.blob import BlobServiceClient
+
+        with self.metrics.stage("blob", "client"):
+            blob_service_client = self.client_registry.get(
+                ("blob", self.storage_account_name),
+                lambda transport: BlobServiceClient(account_url=self.account_url, credential=self.token, transport=transport, retry_total=0),
+                credential=self.token)
 
         return blob_service_client
 
     def __create_container_client(self, container_name):
         """
-        Generates a container client using blob service client
+        Returns a pooled container client
 
         param container name: str
         return container_client: ContainerClientObj
         """
 
-        blob_service_client = self.__create_blob_service_client()
+        if self.backend is not None:
+            return self.backend.container_client(self.storage_account_name, container_name)
 
-        container_client = blob_service_client.get_container_client(container_name)
+        from azure.storage.blob import ContainerClient
+
+        with self.metrics.stage("blob", "client"):
+            container_client = self.client_registry.get(
+                ("blob", self.storage_account_name, container_name),
+                lambda transport: ContainerClient(account_url=self.account_url, container_name=container_name, credential=self.token, transport=transport,
+                                                  retry_total=0),
+                credential=self.token)
 
         return container_client
 
-    def list_blobs(self, container_name, name_starts_with="", timeout=10):
-        """Returns a generator to list the blobs under the specified container
+    def invalidate_clients(self):
+        """Drops pooled clients and cached SAS tokens so they are rebuilt with fresh credentials, eg after an access key has been rotated
+        """
+
+        self.token = self.authenticator.token
+        self.sas_cache.invalidate()
+        self.client_registry.invalidate(("blob", self.storage_account_name))
+        self.client_registry.invalidate(("blob_sas", self.storage_account_name))
+
+    def list_blobs(self, container_name, name_starts_with="", timeout=10, results_per_page=None, delimiter=None, continuation_token=None, lazy=False):
+        """Lists the blobs under the specified container
+
+        The prefix is applied by the service, so only matching blobs are returned. If a delimiter is given the listing is
+        hierarchical: blobs below the next delimiter are rolled up into a virtual directory name ending in the delimiter.
 
         Args:
+            container_name (str): Name of container
             name_starts_with (str, optional): Filters the results to return only blobs whose names begin with the specified prefix.
             timeout (int, optional): expressed in seconds. Defaults to 10.
+            results_per_page (int, optional): The maximum number of blobs retrieved per request. Defaults to the service maximum of 5000.
+            delimiter (str, optional): Lists virtual directories, eg "/". Defaults to None, listing every blob.
+            continuation_token (str, optional): Resumes a listing from a token returned by list_blob_pages.
+            lazy (bool, optional): If True a generator of names is returned and pages after the first are only fetched as it is consumed. A page that fails to be fetched raises BlobFunctionsError from the generator. Defaults to False.
 
         Returns:
-            list: list of all blobs in container
+            list or generator: names of blobs (and virtual directories) in container
         """
         try:
-            container_client = self.__create_container_client(container_name=container_name)
-
-            blobs_in_container = container_client.list_blobs()
 
-            blobs_list = []
+            pages = self.__list_pages(container_name, name_starts_with, timeout, results_per_page, delimiter, continuation_token)
 
-            for blob in blobs_in_container:
+            blob_names = (name for page in pages for name in sorted(page.prefixes + [blob.name for blob in page.blobs]))
 
-                blobs_list.append(blob.name)
+            if lazy:
+                return self.__lazily(sys._getframe().f_code.co_name, blob_names)
 
-            return blobs_list
+            return list(blob_names)
         
         except Exception as e:
             
@@ -192,6 +419,120 @@ class BlobFunctions:
 
             return status
 
+    def list_blob_pages(self, container_name, name_starts_with="", timeout=10, results_per_page=5000, delimiter=None, continuation_token=None):
+        """Returns a generator over pages of a blob listing, for listings that may need to be resumed
+
+        Each page carries the continuation token for the page after it. Passing that token back in as continuation_token
+        resumes the listing from that point, eg after a process restart. The first page is fetched straight away, so a
+        listing that can't start fails like any other call. A later page that fails to be fetched raises BlobFunctionsError
+        from the generator.
+
+        Args:
+            container_name (str): Name of container
+            name_starts_with (str, optional): Filters the results to return only blobs whose names begin with the specified prefix.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+            results_per_page (int, optional): The maximum number of blobs retrieved per page. Defaults to 5000.
+            delimiter (str, optional): Lists virtual directories, eg "/". Defaults to None, listing every blob.
+            continuation_token (str, optional): Resumes a listing from a previously returned token.
+
+        Returns:
+            generator: BlobPage for each page, with blobs (list of BlobProperties), prefixes (list of str) and continuation_token (str or None once listing is complete)
+        """
+        try:
+
+            pages = self.__list_pages(container_name, name_starts_with, timeout, results_per_page, delimiter, continuation_token)
+
+            return self.__lazily(sys._getframe().f_code.co_name, pages)
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __lazily(self, func_name, iterator):
+        """Fetches the first item of iterator, so errors before iteration starts are handled like those of any other call
+
+        A generator can't report failure through its return value, so errors raised while the rest of iterator is
+        consumed are raised as BlobFunctionsError even if handle_exceptions is True.
+
+        Returns:
+            generator: every item of iterator
+        """
+
+        try:
+            first = next(iterator)
+
+        except StopIteration:
+            return iter(())
+
+        return self.__iterate(func_name, iterator, (first,))
+
+    def __listing_error(self, func_name):
+        """Returns the wrap_error of a RetryingPaged listing. A page that fails to be fetched is raised as BlobFunctionsError,
+        even if handle_exceptions is True, and counted as an error of func_name
+
+        Returns:
+            callable
+        """
+
+        def wrap_error(error):
+
+            self.metrics.error("blob", func_name)
+
+            return BlobFunctionsError(f"Failed to execute {func_name} with error {error}")
+
+        return wrap_error
+
+    def __iterate(self, func_name, iterator, items=()):
+        """Yields items and then everything else from iterator, raising errors as BlobFunctionsError
+        """
+
+        yield from items
+
+        try:
+            yield from iterator
+
+        except Exception as e:
+
+            raise BlobFunctionsError(f"Failed to execute {func_name} with error {e}") from e
+
+    def __list_pages(self, container_name, name_starts_with, timeout, results_per_page, delimiter, continuation_token):
+        """Lazily lists a container one page at a time
+
+        Returns:
+            generator: BlobPage for each page
+        """
+
+        from azure.storage.blob import BlobPrefix
+
+        container_client = self.__create_container_client(container_name=container_name)
+
+        prefix = name_starts_with or None
+
+        if delimiter:
+            blobs = container_client.walk_blobs(name_starts_with=prefix, delimiter=delimiter, results_per_page=results_per_page, timeout=timeout)
+
+        else:
+            blobs = container_client.list_blobs(name_starts_with=prefix, results_per_page=results_per_page, timeout=timeout)
+
+        pager = blobs.by_page(continuation_token=continuation_token)
+
+        for page in self.retry_policy.pages(pager, self.storage_account_name):
+
+            blob_properties = []
+            prefixes = []
+
+            for item in page:
+
+                if isinstance(item, BlobPrefix):
+                    prefixes.append(item.name)
+
+                else:
+                    blob_properties.append(item)
+
+            yield BlobPage(blob_properties, prefixes, pager.continuation_token or None)
+
     def delete_blob(self, blob_name, container_name):
         """Deletes a specified blob
 
@@ -203,9 +544,8 @@ class BlobFunctions:
         """
         try:
             
-            container_client = self.__create_container_client(container_name=container_name)
-
-            container_client.delete_blob(blob_name, delete_snapshots=None)
+            self.retry_policy.run(
+                lambda: self.__create_container_client(container_name=container_name).delete_blob(blob_name, delete_snapshots=None), self.storage_account_name)
 
             return True
         
@@ -215,6 +555,77 @@ class BlobFunctions:
 
             return status
 
+    def delete_blobs(self, container_name, names=None, prefix=None, max_batches=4, delete_snapshots=None):
+        """Deletes many blobs using the blob batch API, which deletes up to 256 blobs per request
+
+        Either names or prefix must be given. names is consumed lazily, and when deleting by prefix the container is listed
+        page by page as deletion proceeds, so millions of blobs can be deleted without listing them up front.
+
+        Args:
+            container_name (str): Name of container
+            names (iterable, optional): names of blobs to delete
+            prefix (str, optional): deletes every blob whose name begins with prefix
+            max_batches (int, optional): number of batch requests in flight at once. Defaults to 4
+            delete_snapshots (str, optional): "include" deletes blobs along with their snapshots. Required if blobs have snapshots. Defaults to None
+
+        Returns:
+            OperationReport: result for every blob, detail holds the http status of its deletion. Truthy if every blob was deleted
+        """
+        try:
+
+            if (names is None) == (prefix is None):
+                raise InvalidArguments("Exactly one of names or prefix must be given")
+
+            if names is None:
+                names = (blob.name for page in self.__list_pages(container_name, prefix, 30, None, None, None) for blob in page.blobs)
+
+            report = OperationReport()
+
+            batches = _batched(names, BATCH_SIZE)
+
+            for results in run_bounded(lambda batch: self.__delete_batch(container_name, batch, delete_snapshots), batches, max_batches):
+
+                for result in results:
+                    report.add(result)
+
+            return report.finish()
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __delete_batch(self, container_name, names, delete_snapshots):
+        """Deletes up to 256 blobs in a single batch request
+
+        Returns:
+            list: ItemResult for each blob
+        """
+
+        try:
+
+            responses = self.retry_policy.run(
+                lambda: self.__create_container_client(container_name=container_name).delete_blobs(*names, delete_snapshots=delete_snapshots, raise_on_any_failure=False),
+                self.storage_account_name)
+
+            results = []
+
+            for name, response in zip(names, responses):
+
+                if response.status_code in (200, 202):
+                    results.append(ItemResult(name, True, detail=response.status_code))
+
+                else:
+                    error = response.headers.get("x-ms-error-code") or response.reason
+                    results.append(ItemResult(name, False, error=error, detail=response.status_code))
+
+            return results
+
+        except Exception as e:
+
+            return [ItemResult(name, False, error=str(e)) for name in names]
+
     def upload_blob(self, blob_name, data, container_name, overwrite=True, blob_type="BlockBlob"):
         """Creates a new blob from a data source with automatic chunking
 
@@ -230,8 +641,12 @@ class BlobFunctions:
         """
         try:
 
-            blob_client = self.__create_blob_client_from_url(blob_name, container_name)
-            blob_client = blob_client.upload_blob(data=data, blob_type=blob_type, overwrite=overwrite)
+            blob_client = self.__run_upload(
+                lambda: self.__create_blob_client_from_url(blob_name, container_name).upload_blob(data=data, blob_type=blob_type, overwrite=overwrite),
+                data, container_name)
+
+            if isinstance(data, (str, bytes)):
+                self.metrics.transferred("blob", "upload", len(data))
 
             return blob_client
         
@@ -241,86 +656,728 @@ class BlobFunctions:
 
             return status
 
-    def delete_container(self, container_name, lease=None, if_modified_since=None, if_unmodified_since=None, etag=None, match_condition=None, timeout=20):
-        """Deletes a specified container
+    def upload_from_path(self, blob_name, file_path, container_name, block_size=DEFAULT_BLOCK_SIZE, max_workers=8, overwrite=True, resumable=True,
+                         checkpoint_path=None):
+        """Uploads a large local file as a block blob, staging its blocks in parallel, and resumes an upload that failed part way
+
+        The file is split into blocks which are staged concurrently, read straight out of a memory map of the file, and then
+        committed together, so the blob only changes once every block is in place. If resumable, each staged block is
+        recorded in a checkpoint journal. If the upload fails or the process dies, calling upload_from_path again with the
+        same arguments stages only the blocks storage doesn't already hold. The journal is deleted once the blob is committed,
+        and started afresh if the file has changed since it was written. Blocks that are never committed are discarded by
+        storage after a week.
 
         Args:
-            container_name (str): Name of container
-            lease (optional): only deletes if container has active lease and matches this ID
-            if_modified_since (datetime, optional): A datetime value. Azure expects this to be utc
-            if_unmodified_since (datetime, optional): A datetime value. Azure expects this to be utc
-            etag (str, optional): An ETag value, or the wildcard character (*)
-            match_condition (MatchConditions obj, optional): The match condition to use upon the etag.
-            timeout (int, optional): Expressed in seconds. Defaults to 20
+            blob_name (str): Name of the blob
+            file_path (str): Local path of the file to upload
+            container_name (str): Name of container to upload blob to
+            block_size (int, optional): Size in bytes of each block. Raised if needed to fit the file in 50,000 blocks. Defaults to 8MiB
+            max_workers (int, optional): Number of blocks staged at once. Defaults to 8
+            overwrite (bool, optional): Whether an existing blob should be overwritten. Defaults to True
+            resumable (bool, optional): Whether to keep a checkpoint journal so a failed upload can be resumed. Defaults to True
+            checkpoint_path (str, optional): Path of the checkpoint journal. Defaults to file_path followed by ".upload"
 
         Returns:
-            True if deletion is successful
-
-        Raises:
-            Exception: If container given does not match instantiated version exception is raised
+            dict: etag and last_modified of the uploaded blob
         """
         try:
 
-            container_client = self.__create_container_client(container_name)
+            stat = os.stat(file_path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            block_size = block_size_for(size, block_size)
+            blocks = [(index, offset, length) for index, (offset, length) in enumerate(split_ranges(size, block_size))]
 
-            container_client.delete_container()
+            if not overwrite and self.__run_with_key_refresh(lambda: self.__create_blob_client_from_url(blob_name, container_name).exists(), container_name):
+                raise BlobFunctionsError(f"Blob {blob_name} already exists in {container_name}")
 
-            return True
+            journal = None
 
-        except Exception as e:
-            
-            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+            if resumable:
+                upload = {"account": self.storage_account_name, "container": container_name, "blob": blob_name, "size": size, "mtime_ns": mtime_ns,
+                          "block_size": block_size}
 
-            return status
+                journal = UploadJournal(checkpoint_path or f"{file_path}.upload", upload).open()
 
-    def create_container(self, container_name, metadata=None, public_access=None, **kwargs):
-        """Creates a new container under the specified account. If the container with the same name already exists, the operation fails.
+            try:
+                upload_id = journal.upload_id if journal is not None else uuid.uuid4().hex
+                staged = self.__staged_blocks(blob_name, container_name, upload_id, journal.staged) if journal is not None else set()
 
-        Args:
-            container_name (str): Name of container
-            metadata ([type], optional): [description]. Defaults to None.
-            public_access ([type], optional): [description]. Defaults to None.
+                def stage_block(index, data):
 
-        Returns:
-            Bool: True if container is created
+                    self.__run_with_key_refresh(
+                        lambda: self.__create_blob_client_from_url(blob_name, container_name).stage_block(_block_id(upload_id, index), data, length=len(data)),
+                        container_name)
 
-        Raises:
-            Exception: If container given does not match instantiated version exception is raised
-        """
-        try:
+                    self.metrics.transferred("blob", "upload", len(data))
 
-            blob_service_client = self.__create_blob_service_client()
+                stage_blocks_from_path(stage_block, file_path, [block for block in blocks if block[0] not in staged], max_workers=max_workers,
+                                       on_block_staged=journal.record if journal is not None else None)
 
-            if metadata is None:
-                blob_service_client.create_container(container_name)
+                if os.stat(file_path).st_mtime_ns != mtime_ns:
+                    raise BlobFunctionsError(f"{file_path} was modified during the upload")
 
-            elif metadata is not None:
+                from azure.storage.blob import BlobBlock
 
-                blob_service_client.create_container(container_name, metadata)
+                block_list = [BlobBlock(block_id=_block_id(upload_id, index)) for index, _, _ in blocks]
+                conditions = {} if overwrite else {"match_condition": MatchConditions.IfMissing}
 
-            return True
+                uploaded = self.__run_with_key_refresh(
+                    lambda: self.__create_blob_client_from_url(blob_name, container_name).commit_block_list(block_list, **conditions), container_name)
+
+            except BaseException:
+
+                if journal is not None:
+                    journal.close()
+
+                raise
+
+            if journal is not None:
+                journal.remove()
+
+            return uploaded
 
         except Exception as e:
-            
+
             status = self.__handle_errors(sys._getframe().f_code.co_name, e)
 
             return status
 
-    def list_containers(self, name_starts_with=None, include_metadata=False, include_deleted=False, results_per_page=5000, timeout=10):
+    def __staged_blocks(self, blob_name, container_name, upload_id, recorded):
+        """Returns the blocks recorded in a checkpoint journal that storage still holds uncommitted
+
+        Returns:
+            set: indexes of the blocks
         """
-        Returns a generator to list the containers under the specified account.
 
-        The generator will lazily follow the continuation tokens returned by the service and stop when all containers have been returned.
+        if not recorded:
+            return set()
+
+        try:
+            _, uncommitted = self.__run_with_key_refresh(
+                lambda: self.__create_blob_client_from_url(blob_name, container_name).get_block_list("uncommitted"), container_name)
+
+        except ResourceNotFoundError:
+            return set()
+
+        held = {block.id for block in uncommitted}
+
+        return {index for index in recorded if _block_id(upload_id, index) in held}
+
+    def upload_many(self, items, container_name, max_workers=8, overwrite=True, blob_type="BlockBlob"):
+        """Uploads many blobs concurrently on a bounded pool of worker threads
+
+        Every upload shares the same cached SAS and pooled container client. Local files are streamed from disk rather than
+        read into memory, and items is consumed lazily so very large datasets can be uploaded from a generator.
 
         Args:
-            name_starts_with (str, optional): Filters the results to return only containers whose names begin with the specified prefix. Defaults to None.
-            include_metadata (bool, optional): Specifies that container metadata to be returned in the response. Defaults to False.
-            include_deleted (bool, optional): Specifies that deleted containers to be returned in the response. Defaults to False.
-            results_per_page (int, optional): The maximum number of container names to retrieve per API call. Defaults to 5000.
-            timeout (int, optional): expressed in seconds. Defaults to 10.
+            items (iterable): (blob_name, source) pairs. source is a local file path given as an os.PathLike such as pathlib.Path, bytes, str or a
+                file-like object. A str is always uploaded as content, never treated as a path
+            container_name (str): Name of container to upload blobs to
+            max_workers (int, optional): Number of uploads in flight at once. Defaults to 8
+            overwrite (bool, opt): Whether existing blobs should be overwritten. Defaults to True
+            blob_type (str, optional): The type of the blobs. This can be either BlockBlob, PageBlob or AppendBlob. Defaults to "BlockBlob".
 
         Returns:
-            ListGenerator: a generator to list containers under specified account
+            OperationReport: per blob results along with aggregate throughput. Truthy if every blob was uploaded
+        """
+        try:
+
+            report = OperationReport()
+
+            def upload(item):
+                blob_name, source = item
+
+                return self.__upload_item(blob_name, source, container_name, overwrite, blob_type)
+
+            for result in run_bounded(upload, items, max_workers):
+                report.add(result)
+
+            return report.finish()
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def upload_directory(self, local_dir, container_name, prefix="", max_workers=8, overwrite=True):
+        """Uploads every file below a local directory, preserving relative paths as virtual directories in the blob names
+
+        Args:
+            local_dir (str): Path of the local directory to upload
+            container_name (str): Name of container to upload blobs to
+            prefix (str, optional): Prepended to every blob name, eg "datasets/2021/". Defaults to ""
+            max_workers (int, optional): Number of uploads in flight at once. Defaults to 8
+            overwrite (bool, opt): Whether existing blobs should be overwritten. Defaults to True
+
+        Returns:
+            OperationReport: per blob results along with aggregate throughput. Truthy if every file was uploaded
+        """
+        try:
+
+            if not os.path.isdir(local_dir):
+                raise NotADirectoryError(f"{local_dir} is not a directory")
+
+            items = ((prefix + relative_path, pathlib.Path(file_path)) for relative_path, file_path in _walk_local_files(local_dir))
+
+            report = self.upload_many(items, container_name, max_workers=max_workers, overwrite=overwrite)
+
+            return report
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def sync(self, local_dir, container_name, prefix="", max_workers=8, delete_orphans=False, manifest_path=None):
+        """Makes the blobs under prefix match a local directory, uploading only files that are new or have changed
+
+        A manifest of the size, modification time, MD5 and uploaded ETag of every file is kept between syncs. A file whose
+        size and modification time match the manifest, and whose blob still has the ETag recorded, is skipped without being
+        read. Other files are hashed and compared with the Content-MD5 of their blob, and only uploaded if it differs, so the
+        cost of a sync is proportional to what has changed rather than to the size of the directory. Blobs are uploaded with
+        their Content-MD5 set.
+
+        Args:
+            local_dir (str): Path of the local directory to sync
+            container_name (str): Name of container to sync to
+            prefix (str, optional): Prepended to every blob name, eg "datasets/2021/". Defaults to ""
+            max_workers (int, optional): Number of files checked and uploaded at once. Defaults to 8
+            delete_orphans (bool, optional): If True blobs under prefix with no matching local file are deleted. Defaults to False
+            manifest_path (str, optional): Where the manifest is kept. Defaults to a .storagewrapper-sync.json file in local_dir, which is not uploaded
+
+        Returns:
+            SyncReport: results for every blob uploaded or deleted, and the number of unchanged files. Truthy if nothing failed
+        """
+        try:
+
+            if not os.path.isdir(local_dir):
+                raise NotADirectoryError(f"{local_dir} is not a directory")
+
+            if manifest_path is None:
+                manifest_path = os.path.join(local_dir, DEFAULT_MANIFEST_NAME)
+
+            manifest_path = os.path.abspath(manifest_path)
+            manifest = load_manifest(manifest_path, container_name, prefix)
+
+            remote = {}
+
+            for page in self.__list_pages(container_name, prefix, 30, None, None, None):
+
+                for blob in page.blobs:
+
+                    content_md5 = blob.content_settings.content_md5
+                    remote[blob.name] = (blob.etag, base64.b64encode(content_md5).decode("ascii") if content_md5 else None, blob.size)
+
+            report = SyncReport()
+            entries = {}
+            local_blobs = set()
+
+            def local_files():
+                for relative_path, file_path in _walk_local_files(local_dir):
+
+                    if is_manifest_file(file_path, manifest_path):
+                        continue
+
+                    local_blobs.add(prefix + relative_path)
+
+                    yield relative_path, file_path
+
+            def check(item):
+                relative_path, file_path = item
+
+                entry, result = self.__sync_file(prefix + relative_path, file_path, container_name, manifest.get(relative_path), remote.get(prefix + relative_path))
+
+                return relative_path, entry, result
+
+            for relative_path, entry, result in run_bounded(check, local_files(), max_workers):
+
+                if entry is not None:
+                    entries[relative_path] = entry
+
+                if result is None:
+                    report.unchanged += 1
+
+                else:
+                    report.add(result)
+
+            save_manifest(manifest_path, container_name, prefix, entries)
+
+            orphans = [blob_name for blob_name in remote if blob_name not in local_blobs]
+
+            if delete_orphans and orphans:
+
+                deleted = self.delete_blobs(container_name, names=orphans)
+
+                # delete_blobs returns False rather than raising when handle_exceptions is set
+                results = deleted.results if deleted is not False else [ItemResult(blob_name, False, error="Failed to delete orphaned blob") for blob_name in orphans]
+
+                for result in results:
+                    report.add(result._replace(detail="deleted"))
+
+            return report.finish()
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __sync_file(self, blob_name, file_path, container_name, known, remote_blob):
+        """Uploads one file for a sync if it differs from its blob
+
+        Returns:
+            tuple: (manifest entry or None, ItemResult or None if the file was unchanged)
+        """
+
+        try:
+
+            stat = os.stat(file_path)
+
+            if known is not None and remote_blob is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns \
+                    and known["etag"] == remote_blob[0]:
+                return known, None
+
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": file_md5(file_path), "etag": None}
+
+            if remote_blob is not None and remote_blob[1] == entry["md5"] and remote_blob[2] == stat.st_size:
+
+                entry["etag"] = remote_blob[0]
+
+                return entry, None
+
+            from azure.storage.blob import ContentSettings
+
+            content_settings = ContentSettings(content_md5=bytearray(base64.b64decode(entry["md5"])))
+
+            result = self.__upload_item(blob_name, pathlib.Path(file_path), container_name, True, "BlockBlob", content_settings=content_settings)
+
+            if not result.succeeded:
+                return None, result
+
+            entry["etag"] = result.detail
+
+            return entry, result._replace(detail="uploaded")
+
+        except Exception as e:
+
+            return None, ItemResult(blob_name, False, 0, str(e))
+
+    def __upload_item(self, blob_name, source, container_name, overwrite, blob_type, content_settings=None):
+        """Uploads one blob for a bulk upload, streaming it from disk if source is an os.PathLike
+
+        Returns:
+            ItemResult: detail is the ETag of the uploaded blob
+        """
+
+        try:
+
+            if isinstance(source, os.PathLike):
+
+                length = os.path.getsize(source)
+
+                def upload():
+                    with open(source, "rb") as data:
+                        return self.__create_blob_client_from_url(blob_name, container_name).upload_blob(
+                            data=data, length=length, blob_type=blob_type, overwrite=overwrite, content_settings=content_settings)
+
+            else:
+
+                if isinstance(source, str):
+                    source = source.encode("utf-8")
+
+                length = None
+
+                if isinstance(source, (bytes, bytearray)):
+                    length = len(source)
+
+                elif hasattr(source, "read"):
+                    length = _remaining_length(source)
+
+                    if length is None:
+                        # Counts what is read from a stream that can't report its length
+                        source = _CountingReader(source)
+
+                def upload():
+                    return self.__create_blob_client_from_url(blob_name, container_name).upload_blob(
+                        data=source, blob_type=blob_type, overwrite=overwrite, content_settings=content_settings)
+
+            uploaded = self.__run_upload(upload, source, container_name)
+
+            if length is None:
+                length = source.count if isinstance(source, _CountingReader) else 0
+
+            self.metrics.transferred("blob", "upload", length)
+
+            return ItemResult(blob_name, True, length, detail=uploaded.get("etag"))
+
+        except Exception as e:
+
+            return ItemResult(blob_name, False, 0, str(e))
+
+    def read_blob(self, container_name, blob_name, as_mmap=False):
+        """Reads the content of a blob, through the disk cache if one was given
+
+        With a disk cache a blob is only downloaded if it is not cached or has changed. Cached content is revalidated with
+        a conditional request on its ETag, and served from disk if storage reports it is unchanged.
+
+        Args:
+            container_name (str): Name of container
+            blob_name (str): Name of blob
+            as_mmap (bool, optional): If True and a disk cache is in use, a read only memory map of the cached file is returned rather than bytes. Defaults to False
+
+        Returns:
+            bytes or mmap.mmap: content of the blob
+        """
+        try:
+
+            if self.disk_cache is None:
+
+                content = self.__run_with_key_refresh(
+                    lambda: self.__create_blob_client_from_url(blob_name, container_name).download_blob().readall(), container_name)
+
+                self.metrics.transferred("blob", "download", len(content))
+
+                return content
+
+            key = (self.storage_account_name, container_name, blob_name)
+            entry = self.disk_cache.lookup(key)
+
+            if entry is not None and entry.fresh:
+
+                content = self.disk_cache.read(entry, as_mmap)
+
+                if content is not None:
+                    return content
+
+            content = self.__read_through_disk_cache(key, container_name, blob_name, entry, as_mmap)
+
+            if content is None:
+                content = self.__read_through_disk_cache(key, container_name, blob_name, None, as_mmap)
+
+            if content is None:
+                content = self.__run_with_key_refresh(
+                    lambda: self.__create_blob_client_from_url(blob_name, container_name).download_blob().readall(), container_name)
+
+                self.metrics.transferred("blob", "download", len(content))
+
+            return content
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __read_through_disk_cache(self, key, container_name, blob_name, entry, as_mmap):
+        """Downloads a blob into the disk cache, or revalidates entry with a conditional request if one is given
+
+        Returns:
+            bytes or mmap.mmap: content of the blob, or None if it was evicted by another reader before it could be read
+        """
+
+        def download():
+            blob_client = self.__create_blob_client_from_url(blob_name, container_name)
+
+            if entry is None:
+                downloader = blob_client.download_blob()
+
+            else:
+                downloader = blob_client.download_blob(etag=entry.etag, match_condition=MatchConditions.IfModified)
+
+            # The body is read under the policy too, so a connection dropped part way through is retried
+            return downloader, self.disk_cache.store(key, downloader.properties.etag, downloader.readinto)
+
+        try:
+            downloader, stored = self.__run_with_key_refresh(download, container_name)
+
+        except HttpResponseError as e:
+
+            if entry is None or e.status_code != 304:
+                raise
+
+            self.disk_cache.touch(key, entry)
+
+            return self.disk_cache.read(entry, as_mmap)
+
+        self.metrics.transferred("blob", "download", downloader.size)
+
+        return self.disk_cache.read(stored, as_mmap)
+
+    def download_blob_stream(self, container_name, blob_name, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4):
+        """Streams a blob in order, fetching ranges of it with parallel ranged GETs
+
+        At most twice max_workers chunks are held in memory at once, however large the blob is. The blob's ETag is pinned when
+        the download starts, so if the blob is modified part way through the download fails rather than mixing versions.
+        A range that fails to download raises BlobFunctionsError from the generator.
+
+        Args:
+            container_name (str): Name of container the blob is in
+            blob_name (str): Name of the blob
+            chunk_size (int, optional): Size in bytes of each ranged request and of each chunk yielded. Defaults to 4MiB
+            max_workers (int, optional): Number of ranged requests in flight at once. Defaults to 4
+
+        Returns:
+            generator: yields the blob content as consecutive bytes chunks
+        """
+        try:
+
+            read_range, properties = self.__ranged_reader(container_name, blob_name)
+
+            chunks = stream_ranges(read_range, properties.size, chunk_size=chunk_size, max_workers=max_workers)
+
+            return self.__iterate(sys._getframe().f_code.co_name, chunks)
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def download_to_path(self, container_name, blob_name, file_path, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4, resumable=False, progress_path=None):
+        """Downloads a blob to a local file using parallel ranged GETs
+
+        The destination file is preallocated and memory mapped, and each range is written straight into place, so memory use
+        stays bounded for multi-GB blobs and throughput scales with max_workers.
+
+        If resumable, a bitmap of the ranges written is kept in a progress file beside the destination, and a failed
+        download leaves both in place. Calling download_to_path again then only fetches the missing ranges, provided the
+        blob still has the same ETag. Otherwise the download starts again.
+
+        Args:
+            container_name (str): Name of container the blob is in
+            blob_name (str): Name of the blob
+            file_path (str): Local path to download to. Overwritten if it exists
+            chunk_size (int, optional): Size in bytes of each ranged request. Defaults to 4MiB
+            max_workers (int, optional): Number of ranged requests in flight at once. Defaults to 4
+            resumable (bool, optional): Whether to keep progress so a failed download can be resumed. Defaults to False
+            progress_path (str, optional): Path of the progress file. Defaults to file_path followed by ".progress"
+
+        Returns:
+            True if the blob is downloaded
+        """
+        try:
+
+            read_range, properties = self.__ranged_reader(container_name, blob_name)
+
+            if resumable:
+
+                download = {"account": self.storage_account_name, "container": container_name, "blob": blob_name, "etag": properties.etag}
+
+                download_resumable(read_range, properties.size, file_path, download, chunk_size=chunk_size, max_workers=max_workers,
+                                   progress_path=progress_path)
+
+                return True
+
+            try:
+                download_ranges_to_path(read_range, properties.size, file_path, chunk_size=chunk_size, max_workers=max_workers)
+
+            except Exception:
+
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+                raise
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __ranged_reader(self, container_name, blob_name):
+        """Reads the properties of a blob and returns a function that downloads ranges of that version of it
+
+        Returns:
+            tuple: read_range(offset, length, stream) function and BlobProperties
+        """
+
+        properties = self.__run_with_key_refresh(
+            lambda: self.__create_blob_client_from_url(blob_name, container_name).get_blob_properties(), container_name)
+
+        def read_range(offset, length, stream):
+            start = stream.tell()
+
+            def attempt():
+                stream.seek(start)
+
+                blob_client = self.__create_blob_client_from_url(blob_name, container_name)
+
+                downloader = blob_client.download_blob(offset=offset, length=length, etag=properties.etag,
+                                                       match_condition=MatchConditions.IfNotModified, max_concurrency=1)
+
+                return downloader.readinto(stream)
+
+            read = self.__run_with_key_refresh(attempt, container_name)
+
+            self.metrics.transferred("blob", "download", read)
+
+            return read
+
+        return read_range, properties
+
+    def get_blob_url(self, container_name, blob_name, sas_duration=timedelta(hours=24)):
+        """Returns the url of a blob, authenticated with a read only SAS of its own so it can be used as the source of a copy
+
+        Args:
+            container_name (str): Name of container
+            blob_name (str): Name of blob
+            sas_duration (timedelta, optional): How long the url can be used for, which should cover the longest copy. Defaults to 24 hours
+
+        Returns:
+            str: url including SAS token
+        """
+        try:
+
+            if self.backend is not None:
+                return self.__create_blob_client_from_url(blob_name, container_name).url
+
+            sas_token = self.__generate_blob_read_sas(container_name, blob_name, sas_duration)
+
+            return f"{self.account_url}{container_name}/{quote(blob_name, safe='/~')}?{sas_token}"
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def copy_blobs(self, source_container_name, container_name, names=None, prefix=None, destination_prefix="", source=None, max_in_flight=32,
+                   max_workers=8, wait=True):
+        """Copies many blobs server-side, without streaming their content through this host
+
+        Copies are started concurrently, up to max_in_flight at once, and their progress is polled by a shared scheduler
+        which backs off while copies remain pending. Either names or prefix must be given.
+
+        Args:
+            source_container_name (str): Container to copy from
+            container_name (str): Container to copy to
+            names (iterable, optional): Names of blobs to copy
+            prefix (str, optional): Copies every blob whose name begins with prefix
+            destination_prefix (str, optional): Prepended to the name of every copied blob. Defaults to ""
+            source (BlobFunctions, optional): BlobFunctions of the source storage account. Defaults to this account
+            max_in_flight (int, optional): Maximum copies unfinished at once. Defaults to 32
+            max_workers (int, optional): Number of requests made at once. Defaults to 8
+            wait (bool, optional): If True waits for every copy to finish. If False returns the running CopyScheduler, which can be cancelled. Defaults to True
+
+        Returns:
+            OperationReport or CopyScheduler: result of every copy, detail is its final copy status. Truthy if every copy succeeded
+        """
+        try:
+
+            if (names is None) == (prefix is None):
+                raise InvalidArguments("Exactly one of names or prefix must be given")
+
+            source = source if source is not None else self
+
+            if names is None:
+                names = source.list_blobs(source_container_name, name_starts_with=prefix, lazy=True)
+
+            def job(blob_name):
+                destination_name = destination_prefix + blob_name
+
+                return CopyJob(destination_name, source.get_blob_url(source_container_name, blob_name),
+                               lambda: self.__create_blob_client_from_url(destination_name, container_name))
+
+            scheduler = CopyScheduler((job(blob_name) for blob_name in names), max_in_flight=max_in_flight, max_workers=max_workers,
+                                      run=lambda operation: self.retry_policy.run(operation, self.storage_account_name))
+
+            if not wait:
+                return scheduler.start()
+
+            return scheduler.run()
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def delete_container(self, container_name, lease=None, if_modified_since=None, if_unmodified_since=None, etag=None, match_condition=None, timeout=20):
+        """Deletes a specified container
+
+        Args:
+            container_name (str): Name of container
+            lease (optional): only deletes if container has active lease and matches this ID
+            if_modified_since (datetime, optional): A datetime value. Azure expects this to be utc
+            if_unmodified_since (datetime, optional): A datetime value. Azure expects this to be utc
+            etag (str, optional): An ETag value, or the wildcard character (*)
+            match_condition (MatchConditions obj, optional): The match condition to use upon the etag.
+            timeout (int, optional): Expressed in seconds. Defaults to 20
+
+        Returns:
+            True if deletion is successful
+
+        Raises:
+            Exception: If container given does not match instantiated version exception is raised
+        """
+        try:
+
+            container_client = self.__create_container_client(container_name)
+
+            self.retry_policy.run(lambda: container_client.delete_container(), self.storage_account_name)
+
+            return True
+
+        except Exception as e:
+            
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def create_container(self, container_name, metadata=None, public_access=None, **kwargs):
+        """Creates a new container under the specified account. If the container with the same name already exists, the operation fails.
+
+        Args:
+            container_name (str): Name of container
+            metadata ([type], optional): [description]. Defaults to None.
+            public_access ([type], optional): [description]. Defaults to None.
+
+        Returns:
+            Bool: True if container is created
+
+        Raises:
+            Exception: If container given does not match instantiated version exception is raised
+        """
+        try:
+
+            blob_service_client = self.__create_blob_service_client()
+
+            if metadata is None:
+                self.retry_policy.run(lambda: blob_service_client.create_container(container_name), self.storage_account_name)
+
+            elif metadata is not None:
+
+                self.retry_policy.run(lambda: blob_service_client.create_container(container_name, metadata), self.storage_account_name)
+
+            return True
+
+        except Exception as e:
+            
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def list_containers(self, name_starts_with=None, include_metadata=False, include_deleted=False, results_per_page=5000, timeout=10):
+        """
+        Returns an iterator to list the containers under the specified account.
+
+        The iterator will lazily follow the continuation tokens returned by the service and stop when all containers have been returned.
+        As with the ItemPaged returned by the azure sdk, by_page() iterates pages and can start from a continuation token.
+        Each page is fetched under the retry policy, and a page that fails to be fetched raises BlobFunctionsError from the iterator.
+
+        Args:
+            name_starts_with (str, optional): Filters the results to return only containers whose names begin with the specified prefix. Defaults to None.
+            include_metadata (bool, optional): Specifies that container metadata to be returned in the response. Defaults to False.
+            include_deleted (bool, optional): Specifies that deleted containers to be returned in the response. Defaults to False.
+            results_per_page (int, optional): The maximum number of container names to retrieve per API call. Defaults to 5000.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+
+        Returns:
+            RetryingPaged: an ItemPaged of the ContainerProperties of containers under specified account
         """
         try:
 
@@ -328,10 +1385,86 @@ class BlobFunctions:
 
             retrieved_containers = blob_service_client.list_containers(name_starts_with=name_starts_with, include_metadata=include_metadata,
                                                                        include_deleted=include_deleted, results_per_page=results_per_page, timeout=timeout)
-            return retrieved_containers
+
+            return RetryingPaged(retrieved_containers, self.retry_policy, self.storage_account_name, self.__listing_error(sys._getframe().f_code.co_name))
 
         except Exception as e:
             
             status = self.__handle_errors(sys._getframe().f_code.co_name, e)
 
             return status
+
+
+def _walk_local_files(local_dir):
+    """
+    Lazily yields (relative_path, file_path) for every file below local_dir. Relative paths always use / as separator
+    """
+
+    for root, _, file_names in os.walk(local_dir):
+
+        for file_name in sorted(file_names):
+
+            file_path = os.path.join(root, file_name)
+
+            yield os.path.relpath(file_path, local_dir).replace(os.sep, "/"), file_path
+
+
+def _batched(items, size):
+    """
+    Groups items into lists of at most size items, consuming items lazily
+    """
+
+    batch = []
+
+    for item in items:
+
+        batch.append(item)
+
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _remaining_length(stream):
+    """
+    Returns the number of bytes left to read from a seekable stream, or None if it can't seek
+    """
+
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        end = stream.tell()
+        stream.seek(position)
+
+    except (AttributeError, OSError, ValueError):
+        return None
+
+    return end - position
+
+
+class _CountingReader:
+    """
+    Wraps a stream that can't seek, counting the bytes read from it
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+
+        data = self.stream.read(size)
+        self.count += len(data)
+
+        return data
+
+
+def _block_id(upload_id, index):
+    """
+    Returns the id of a block of an upload. Every id of a blob must be the same length
+    """
+
+    return base64.b64encode(f"{upload_id}{index:05d}".encode("utf-8")).decode("utf-8")
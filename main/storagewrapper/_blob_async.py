@@ -0,0 +1,401 @@
+from azure.core.exceptions import ClientAuthenticationError
+from azure.storage.blob import generate_container_sas
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
+from datetime import datetime
+from storagewrapper._blob import MAX_USER_DELEGATION_KEY_LIFETIME
+from storagewrapper._clients import AsyncClientRegistry
+from storagewrapper._exceptions import BlobFunctionsError
+from storagewrapper._sas_cache import SasCache
+from storagewrapper._secrets import shared_secret_cache
+
+import sys
+import time
+
+
+class AsyncBlobFunctions:
+    """
+    An asyncio wrapper on blob storage functions
+
+    Has the same methods as BlobFunctions, each of which must be awaited. Built on the azure.storage.blob.aio clients so
+    thousands of operations can run concurrently on one event loop. Requires aiohttp to be installed.
+
+    Args:
+        authenticator(AuthenticateFunctions class): provides authentication to service blob functions. Its async_token is used
+        storage_account_name(str): Name of the storage account
+        sas_method (str, optional): Controls whether a user delegation key is used to generate SAS or whether an access key stored in key vault is used. If access key then vault_url, access_key_secret_name must be provided. Defaults to UserDelegationKey.
+        handle_exceptions (bool, optional): If True exceptions raised are handled silently and passed back as a message in the return, if False raises an exception. Default is False
+        sas_cache (SasCache, optional): Cache of user delegation keys and SAS tokens. Can be shared with sync BlobFunctions. Defaults to a new SasCache per instance.
+        client_registry (AsyncClientRegistry, optional): Pool of long lived async clients sharing one aiohttp session. Defaults to a new AsyncClientRegistry per instance.
+        secret_cache (SecretCache, optional): Cache of key vault secrets used by the AccessKey sas_method. Defaults to a cache shared by every wrapper in the process.
+
+    Usage:
+        async with AsyncBlobFunctions(storage_account_name, authenticator) as blob_functions:
+            await blob_functions.upload_blob(blob_name, data, container_name)
+    """
+
+    def __init__(self, storage_account_name, authenticator, sas_method="UserDelegationKey", vault_url=None, access_key_secret_name=None, handle_exceptions=False,
+                 sas_cache=None, client_registry=None, secret_cache=None):
+        self.authenticator = authenticator
+        self.token = self.authenticator.async_token
+        self.storage_account_name = storage_account_name
+        self.sas_duration = self.authenticator.sas_duration
+        self.sas_permissions = self.authenticator.container_sas_permissions
+        self.sas_method = sas_method
+        self.vault_url = vault_url
+        self.access_key_secret_name = access_key_secret_name
+        self.handle_exceptions = handle_exceptions
+        self.sas_cache = sas_cache if sas_cache is not None else SasCache()
+        self.client_registry = client_registry if client_registry is not None else AsyncClientRegistry()
+        self.secret_cache = secret_cache if secret_cache is not None else shared_secret_cache
+        self.account_url = f"https://{self.storage_account_name}.blob.core.windows.net/"
+
+    def __str__(self):
+        return f"Async functions for operating blob storage within storage account:'{self.storage_account_name}'"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Closes pooled clients and their shared connection pool
+        """
+
+        await self.client_registry.close()
+
+    def __handle_errors(self, func_name, error):
+        if self.handle_exceptions:
+
+            return False
+
+        elif not self.handle_exceptions:
+
+            raise BlobFunctionsError(f"Failed to execute {func_name} with error {error}")
+
+    async def __access_key_or_udk(self, container_name):
+        """Checks if access key is required or if User Delegation Key method is
+
+        SAS tokens are cached per account, container and permissions until shortly before they expire
+
+        Returns:
+            str: SAS token
+        """
+
+        if self.sas_method not in ("UserDelegationKey", "AccessKey"):
+            raise Exception("sas_method not UserDelegationKey or AccessKey")
+
+        sas_token = await self.sas_cache.get_async(self.__sas_cache_key(container_name), lambda: self.__generate_container_sas(container_name))
+
+        return sas_token
+
+    def __sas_cache_key(self, container_name):
+
+        return (self.sas_method, self.storage_account_name, container_name, str(self.sas_permissions))
+
+    async def __generate_container_sas(self, container_name):
+        """Generates a container SAS token
+
+        Returns:
+            tuple: SAS token and its expiry time
+        """
+
+        if self.sas_method == "UserDelegationKey":
+
+            udk, expiry = await self.__get_user_delegation_key(datetime.utcnow() + self.sas_duration)
+
+            sas_token = generate_container_sas(
+                account_name=self.storage_account_name,
+                container_name=container_name,
+                user_delegation_key=udk,
+                permission=self.sas_permissions,
+                expiry=expiry
+            )
+
+            return sas_token, expiry
+
+        elif self.sas_method == "AccessKey":
+
+            access_key = await self.secret_cache.get_async(self.vault_url, self.access_key_secret_name, self.token)
+            expiry = datetime.utcnow() + self.sas_duration
+
+            sas_token = generate_container_sas(
+                account_name=self.storage_account_name,
+                container_name=container_name,
+                account_key=access_key,
+                permission=self.sas_permissions,
+                expiry=expiry
+            )
+
+            return sas_token, expiry
+
+    async def __get_user_delegation_key(self, expiry):
+        """Returns a user delegation key valid until at least expiry, as BlobFunctions does. One key is shared by every
+        container in the account, and with sync BlobFunctions using the same SasCache
+
+        Returns:
+            tuple: UserDelegationKey obj and the expiry a SAS made from it can have
+        """
+
+        key = ("UserDelegationKey", self.storage_account_name)
+        now = datetime.utcnow()
+        expiry = min(expiry, now + MAX_USER_DELEGATION_KEY_LIFETIME)
+
+        def request():
+            return self.__request_user_delegation_key(min(2 * (expiry - now), MAX_USER_DELEGATION_KEY_LIFETIME))
+
+        udk, key_expiry = await self.sas_cache.get_async(key, request)
+
+        if key_expiry < expiry:
+
+            self.sas_cache.invalidate(key)
+            udk, key_expiry = await self.sas_cache.get_async(key, request)
+
+        return udk, min(expiry, key_expiry)
+
+    async def __request_user_delegation_key(self, duration):
+
+        blob_service_client = self.__create_blob_service_client()
+
+        start = datetime.utcnow()
+        expiry = start + duration
+
+        udk = await blob_service_client.get_user_delegation_key(key_start_time=start, key_expiry_time=expiry)
+
+        return (udk, expiry), expiry
+
+    async def __run_with_key_refresh(self, operation, container_name):
+        """
+        Awaits operation. When using the AccessKey sas_method and storage rejects the SAS because the access key held in
+        key vault has been rotated, the key is fetched again and operation is retried once.
+
+        Returns:
+            result of operation
+        """
+
+        started = time.monotonic()
+
+        try:
+            return await operation()
+
+        except ClientAuthenticationError:
+
+            if self.sas_method != "AccessKey":
+                raise
+
+            self.secret_cache.invalidate(self.vault_url, self.access_key_secret_name, fetched_before=started)
+            self.sas_cache.invalidate(self.__sas_cache_key(container_name))
+
+            return await operation()
+
+    async def __create_blob_client_from_url(self, blob_name, container_name):
+        """
+        Generates an async blob client authenticated with a container sas, requires blob_name
+
+        return blob_client: aio BlobClientObj
+        """
+
+        blob_sas_token = await self.__access_key_or_udk(container_name)
+
+        container_client = self.client_registry.get(
+            ("blob_sas", self.storage_account_name, container_name),
+            lambda transport: ContainerClient(account_url=self.account_url, container_name=container_name, credential=blob_sas_token, transport=transport),
+            credential=blob_sas_token)
+
+        return container_client.get_blob_client(blob_name)
+
+    def __create_blob_service_client(self):
+
+        blob_service_client = self.client_registry.get(
+            ("blob", self.storage_account_name),
+            lambda transport: BlobServiceClient(account_url=self.account_url, credential=self.token, transport=transport),
+            credential=self.token)
+
+        return blob_service_client
+
+    def __create_container_client(self, container_name):
+
+        container_client = self.client_registry.get(
+            ("blob", self.storage_account_name, container_name),
+            lambda transport: ContainerClient(account_url=self.account_url, container_name=container_name, credential=self.token, transport=transport),
+            credential=self.token)
+
+        return container_client
+
+    def invalidate_clients(self):
+        """Drops pooled clients and cached SAS tokens so they are rebuilt with fresh credentials, eg after an access key has been rotated
+        """
+
+        self.token = self.authenticator.async_token
+        self.sas_cache.invalidate()
+        self.client_registry.invalidate(("blob", self.storage_account_name))
+        self.client_registry.invalidate(("blob_sas", self.storage_account_name))
+
+    async def list_blobs(self, container_name, name_starts_with="", timeout=10, results_per_page=None):
+        """Lists the blobs under the specified container
+
+        Args:
+            container_name (str): Name of container
+            name_starts_with (str, optional): Filters the results to return only blobs whose names begin with the specified prefix.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+            results_per_page (int, optional): The maximum number of blobs retrieved per request. Defaults to the service maximum of 5000.
+
+        Returns:
+            list: list of all blobs in container
+        """
+        try:
+            container_client = self.__create_container_client(container_name=container_name)
+
+            blobs_list = []
+
+            async for blob in container_client.list_blobs(name_starts_with=name_starts_with or None, results_per_page=results_per_page, timeout=timeout):
+
+                blobs_list.append(blob.name)
+
+            return blobs_list
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_blob(self, blob_name, container_name):
+        """Deletes a specified blob
+
+        Args:
+            blob_name (str): name of blob to delete
+
+        Returns:
+            True: True is returned if blob successfully deleted
+        """
+        try:
+
+            container_client = self.__create_container_client(container_name=container_name)
+
+            await container_client.delete_blob(blob_name, delete_snapshots=None)
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def upload_blob(self, blob_name, data, container_name, overwrite=True, blob_type="BlockBlob"):
+        """Creates a new blob from a data source with automatic chunking
+
+        Args:
+            blob_name (str or BlobProperties): The blob with which to interact. If specified, this value will override a blob value specified in the blob URL
+            data (str): The blob data to upload.
+            container_name (str): Name of container to upload blob to
+            overwrite (bool, opt): Whether an existing blob should be overwritten. Defualts to True
+            blob_type (str, optional): The type of the blob. This can be either BlockBlob, PageBlob or AppendBlob. Defaults to "BlockBlob".
+
+        Returns:
+            BlobClient: an async client with which to interact with the uploaded blob
+        """
+        try:
+
+            async def upload():
+                blob_client = await self.__create_blob_client_from_url(blob_name, container_name)
+
+                return await blob_client.upload_blob(data=data, blob_type=blob_type, overwrite=overwrite)
+
+            blob_client = await self.__run_with_key_refresh(upload, container_name)
+
+            return blob_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_container(self, container_name, lease=None, if_modified_since=None, if_unmodified_since=None, etag=None, match_condition=None, timeout=20):
+        """Deletes a specified container
+
+        Args:
+            container_name (str): Name of container
+            lease (optional): only deletes if container has active lease and matches this ID
+            if_modified_since (datetime, optional): A datetime value. Azure expects this to be utc
+            if_unmodified_since (datetime, optional): A datetime value. Azure expects this to be utc
+            etag (str, optional): An ETag value, or the wildcard character (*)
+            match_condition (MatchConditions obj, optional): The match condition to use upon the etag.
+            timeout (int, optional): Expressed in seconds. Defaults to 20
+
+        Returns:
+            True if deletion is successful
+        """
+        try:
+
+            container_client = self.__create_container_client(container_name)
+
+            await container_client.delete_container()
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_container(self, container_name, metadata=None, public_access=None, **kwargs):
+        """Creates a new container under the specified account. If the container with the same name already exists, the operation fails.
+
+        Args:
+            container_name (str): Name of container
+            metadata (dict, optional): Name-value pairs associated with the container as metadata. Defaults to None.
+            public_access (str, optional): Defaults to None.
+
+        Returns:
+            Bool: True if container is created
+        """
+        try:
+
+            blob_service_client = self.__create_blob_service_client()
+
+            if metadata is None:
+                await blob_service_client.create_container(container_name)
+
+            elif metadata is not None:
+
+                await blob_service_client.create_container(container_name, metadata)
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def list_containers(self, name_starts_with=None, include_metadata=False, include_deleted=False, results_per_page=5000, timeout=10):
+        """
+        Returns an async generator to list the containers under the specified account. Iterate it with async for
+
+        Args:
+            name_starts_with (str, optional): Filters the results to return only containers whose names begin with the specified prefix. Defaults to None.
+            include_metadata (bool, optional): Specifies that container metadata to be returned in the response. Defaults to False.
+            include_deleted (bool, optional): Specifies that deleted containers to be returned in the response. Defaults to False.
+            results_per_page (int, optional): The maximum number of container names to retrieve per API call. Defaults to 5000.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+
+        Returns:
+            AsyncItemPaged: an async generator to list containers under specified account
+        """
+        try:
+
+            blob_service_client = self.__create_blob_service_client()
+
+            retrieved_containers = blob_service_client.list_containers(name_starts_with=name_starts_with, include_metadata=include_metadata,
+                                                                       include_deleted=include_deleted, results_per_page=results_per_page, timeout=timeout)
+            return retrieved_containers
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
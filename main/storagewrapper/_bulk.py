@@ -0,0 +1,134 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import time
+
+
+ItemResult = namedtuple("ItemResult", ["name", "succeeded", "bytes_transferred", "error", "detail"])
+ItemResult.__new__.__defaults__ = (0, None, None)
+ItemResult.__doc__ = """
+Outcome of one item in a bulk operation
+
+Attributes:
+    name (str): name of the blob, file or message the result is for
+    succeeded (bool): True if the operation on this item succeeded
+    bytes_transferred (int): number of bytes sent or received for this item
+    error (str): error message if the operation failed, otherwise None
+    detail: operation specific information, eg a message id or http status
+"""
+
+
+class OperationReport:
+    """
+    Per item results and aggregate statistics of a bulk operation
+
+    A report is truthy when every item succeeded, so it can be checked in the same way as the True/False returned by
+    single item methods.
+
+    Attributes:
+        results (list): ItemResult for every item processed
+        elapsed (float): seconds taken by the operation
+    """
+
+    def __init__(self):
+        self.results = []
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, result):
+
+        with self._lock:
+            self.results.append(result)
+
+    def finish(self):
+
+        self.finished = time.monotonic()
+
+        return self
+
+    @property
+    def succeeded(self):
+        """list: names of items that succeeded"""
+        return [result.name for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        """dict: error message of every item that failed, keyed by name"""
+        return {result.name: result.error for result in self.results if not result.succeeded}
+
+    @property
+    def bytes_transferred(self):
+        return sum(result.bytes_transferred for result in self.results)
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def items_per_second(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_transferred / self.elapsed if self.elapsed else 0.0
+
+    def __bool__(self):
+        return all(result.succeeded for result in self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return (f"OperationReport(items={len(self.results)}, failed={len(self.failed)}, bytes={self.bytes_transferred}, "
+                f"elapsed={self.elapsed:.2f}s, items_per_second={self.items_per_second:.1f}, bytes_per_second={self.bytes_per_second:.0f})")
+
+
+def run_bounded(func, items, max_workers, max_pending=None):
+    """
+    Calls func on every item using a pool of max_workers threads, yielding results as they complete
+
+    items is consumed lazily, at most max_pending calls are queued or running at once so memory stays bounded however
+    many items there are.
+
+    Args:
+        func (callable): called with each item. Exceptions are not caught, func should return a result describing any failure
+        items (iterable): items to process
+        max_workers (int): number of worker threads
+        max_pending (int, optional): maximum calls queued or running at once. Defaults to twice max_workers
+
+    Yields:
+        result of each call, in completion order
+    """
+
+    if max_pending is None:
+        max_pending = max_workers * 2
+
+    items = iter(items)
+    pending = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storagewrapper") as executor:
+
+        exhausted = False
+
+        while pending or not exhausted:
+
+            while not exhausted and len(pending) < max_pending:
+
+                try:
+                    item = next(items)
+
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                pending.add(executor.submit(func, item))
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield future.result()
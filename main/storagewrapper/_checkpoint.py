@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import uuid
+
+
+class UploadJournal:
+    """
+    Append-only checkpoint of a block upload, recording each block once it has been staged
+
+    The first line of the file describes the upload: the destination, the size and modification time of the source and
+    the block size. Every following line records one staged block. Each record is flushed and synced to disk before the
+    next block is counted as done, so after a crash the journal lists every block that was staged, bar at most the ones
+    in flight. A journal that doesn't describe the same upload of the same version of the source is discarded and the
+    upload starts again.
+
+    Args:
+        path (str): path of the journal file
+        upload (dict): describes the upload. A journal written for a different description is discarded
+    """
+
+    def __init__(self, path, upload):
+        self.path = path
+        self.upload = upload
+        self.upload_id = None
+        self.staged = set()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        """
+        Reads the blocks recorded by an earlier attempt at the same upload, or starts a new journal
+
+        Returns:
+            UploadJournal: self, with upload_id and staged set
+        """
+
+        if not self.__resume():
+
+            self.upload_id = uuid.uuid4().hex
+            self.staged = set()
+
+            with open(self.path, "wb") as file:
+                file.write(_line(dict(self.upload, upload_id=self.upload_id)))
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._file = open(self.path, "ab")
+
+        return self
+
+    def __resume(self):
+
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+
+        except FileNotFoundError:
+            return False
+
+        # A record cut short by a crash is dropped, as is everything after it
+        complete = data.rfind(b"\n") + 1
+        lines = data[:complete].splitlines()
+
+        try:
+            header = json.loads(lines[0].decode("utf-8"))
+            staged = {json.loads(line.decode("utf-8"))["block"] for line in lines[1:]}
+
+        except (IndexError, KeyError, TypeError, ValueError):
+            return False
+
+        if {key: value for key, value in header.items() if key != "upload_id"} != self.upload:
+            return False
+
+        if complete < len(data):
+
+            with open(self.path, "r+b") as file:
+                file.truncate(complete)
+
+        self.upload_id = header["upload_id"]
+        self.staged = staged
+
+        return True
+
+    def record(self, index):
+        """
+        Records that block index has been staged, returning once the record is on disk
+        """
+
+        with self._lock:
+            self._file.write(_line({"block": index}))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            self.staged.add(index)
+
+    def close(self):
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Closes and deletes the journal once the upload has been committed
+        """
+
+        self.close()
+
+        try:
+            os.remove(self.path)
+
+        except FileNotFoundError:
+            pass
+
+
+class DownloadProgress:
+    """
+    Compact record of which ranges of a download have been written, kept in a file beside the partial download
+
+    The first line of the file describes the download: its source, the ETag of the version being downloaded, its size
+    and the range size. It is followed by a bitmap with one bit per range, set once the range has been written and
+    flushed to the partial file. A 100GB download in 4MiB ranges needs a 3KiB bitmap. The progress of a different
+    download, or of another version of the source, is discarded and the download starts again.
+
+    Args:
+        path (str): path of the progress file
+        download (dict): describes the download. Progress written for a different description is discarded
+        ranges (int): number of ranges in the download
+    """
+
+    def __init__(self, path, download, ranges):
+        self.path = path
+        self.download = download
+        self.ranges = ranges
+        self._bitmap = bytearray((ranges + 7) // 8)
+        self._header_length = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self, resume=True):
+        """
+        Reads the progress of an earlier attempt at the same download, or starts afresh
+
+        Args:
+            resume (bool, optional): if False earlier progress is discarded, eg because the partial file is missing. Defaults to True
+
+        Returns:
+            DownloadProgress: self
+        """
+
+        if not (resume and self.__resume()):
+
+            self._bitmap = bytearray(len(self._bitmap))
+
+            header = _line(self.download)
+            self._header_length = len(header)
+
+            with open(self.path, "wb") as file:
+                file.write(header + bytes(self._bitmap))
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._file = open(self.path, "r+b")
+
+        return self
+
+    def __resume(self):
+
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+
+        except FileNotFoundError:
+            return False
+
+        header_length = data.find(b"\n") + 1
+
+        try:
+            header = json.loads(data[:header_length].decode("utf-8"))
+
+        except ValueError:
+            return False
+
+        if header != self.download or len(data) - header_length != len(self._bitmap):
+            return False
+
+        self._header_length = header_length
+        self._bitmap = bytearray(data[header_length:])
+
+        return True
+
+    @property
+    def completed(self):
+        """
+        Number of ranges written
+        """
+
+        return sum(bin(byte).count("1") for byte in self._bitmap)
+
+    def is_complete(self, index):
+
+        return bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+
+    def complete(self, index):
+        """
+        Marks range index as written, returning once the mark is on disk
+        """
+
+        with self._lock:
+            self._bitmap[index >> 3] |= 1 << (index & 7)
+
+            self._file.seek(self._header_length + (index >> 3))
+            self._file.write(self._bitmap[index >> 3:(index >> 3) + 1])
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Closes and deletes the progress file once the download has finished
+        """
+
+        self.close()
+
+        try:
+            os.remove(self.path)
+
+        except FileNotFoundError:
+            pass
+
+
+def _line(record):
+
+    return json.dumps(record, separators=(",", ":"), sort_keys=True).encode("utf-8") + b"\n"
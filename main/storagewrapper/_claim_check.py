@@ -0,0 +1,147 @@
+from storagewrapper._transfer import DEFAULT_CHUNK_SIZE
+import json
+import uuid
+
+
+# Marker key identifying a queue message that carries a reference to a blob rather than its payload
+REFERENCE_KEY = "storagewrapper_claim_check"
+
+
+class ClaimCheck:
+    """
+    Stores queue message payloads that are too large for a queue message as blobs, sending only a small reference on the queue
+
+    Pass to QueueFunctions as claim_check. Payloads larger than threshold bytes are then uploaded to container_name when
+    sent, and received messages that carry a reference have the payload fetched back into their content. The blob is
+    deleted when the message is deleted through QueueFunctions.delete_message or by a consumer.
+
+    Args:
+        blob_functions (BlobFunctions): used to upload, download and delete payload blobs
+        container_name (str): existing container the payloads are stored in
+        threshold (int, optional): payloads larger than this many bytes are stored as blobs. Defaults to 48KiB, leaving headroom below the 64KiB queue message limit
+        prefix (str, optional): prepended to the name of every payload blob. Defaults to ""
+        inline_limit (int, optional): payloads up to this many bytes are downloaded into the message content, larger payloads are
+            returned as a generator of bytes chunks that streams the blob as it is consumed. Defaults to 16MiB
+        max_workers (int, optional): number of parallel ranged requests used to stream a payload. Defaults to 4
+    """
+
+    def __init__(self, blob_functions, container_name, threshold=48 * 1024, prefix="", inline_limit=16 * 1024 * 1024, max_workers=4):
+        self.blob_functions = blob_functions
+        self.container_name = container_name
+        self.threshold = threshold
+        self.prefix = prefix
+        self.inline_limit = inline_limit
+        self.max_workers = max_workers
+
+    def check_in(self, content):
+        """
+        Uploads content to a blob if it is larger than threshold
+
+        Args:
+            content (str or bytes): message payload
+
+        Returns:
+            tuple: (content to send on the queue, name of the payload blob or None if content was small enough to send as it is)
+        """
+
+        data = content.encode("utf-8") if isinstance(content, str) else content
+
+        if data is None or len(data) <= self.threshold:
+            return content, None
+
+        blob_name = f"{self.prefix}{uuid.uuid4()}"
+
+        if not self.blob_functions.upload_blob(blob_name, data, self.container_name):
+            raise Exception(f"Failed to store message payload in blob {blob_name}")
+
+        reference = {REFERENCE_KEY: 1, "container": self.container_name, "blob": blob_name, "size": len(data),
+                     "encoding": "utf-8" if isinstance(content, str) else None}
+
+        return json.dumps(reference), blob_name
+
+    def check_out(self, message):
+        """
+        Replaces the content of a message carrying a reference with the payload it refers to. Other messages are returned unchanged
+
+        The name of the payload blob is kept in the claim_check_blob attribute of the message so it can be deleted along with the message.
+
+        Args:
+            message (QueueMessage): received message
+
+        Returns:
+            QueueMessage: message
+
+        Raises:
+            Exception: if the payload blob can't be fetched
+        """
+
+        reference = self.__reference(message.content)
+
+        if reference is None:
+            return message
+
+        chunks = self.blob_functions.download_blob_stream(reference["container"], reference["blob"], chunk_size=DEFAULT_CHUNK_SIZE,
+                                                          max_workers=self.max_workers)
+
+        if chunks is False:
+            raise Exception(f"Failed to fetch message payload from blob {reference['blob']}")
+
+        if reference["size"] > self.inline_limit:
+            message.content = chunks
+
+        else:
+            data = b"".join(chunks)
+            message.content = data.decode(reference["encoding"]) if reference["encoding"] else data
+
+        message.claim_check_blob = (reference["container"], reference["blob"])
+
+        return message
+
+    def release(self, message):
+        """
+        Deletes the payload blob of a message returned by check_out, if it has one
+
+        Args:
+            message (QueueMessage or str): message, or a message id which has no payload blob to delete
+
+        Returns:
+            bool: True if a payload blob was deleted
+        """
+
+        claim_check_blob = getattr(message, "claim_check_blob", None)
+
+        if claim_check_blob is None:
+            return False
+
+        container_name, blob_name = claim_check_blob
+
+        return self.discard(blob_name, container_name)
+
+    def discard(self, blob_name, container_name=None):
+        """
+        Deletes a payload blob, eg one checked in for a message that then failed to send. Failures are ignored, as an
+        orphaned payload blob does no harm beyond its storage cost.
+
+        Returns:
+            bool: True if the blob was deleted
+        """
+
+        try:
+            return bool(self.blob_functions.delete_blob(blob_name, container_name or self.container_name))
+
+        except Exception:
+            return False
+
+    @staticmethod
+    def __reference(content):
+
+        if not isinstance(content, str) or not content.startswith('{"' + REFERENCE_KEY + '"'):
+            return None
+
+        try:
+            reference = json.loads(content)
+
+        except ValueError:
+            return None
+
+        return reference
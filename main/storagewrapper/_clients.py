@@ -0,0 +1,156 @@
+from azure.core.pipeline.transport import RequestsTransport
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+
+
+class ClientRegistry:
+    """
+    Registry of long lived azure storage clients
+
+    Every client in the registry sends its requests over one shared HTTP session, so connections are pooled and reused
+    rather than each operation paying for a new TCP and TLS handshake. Clients that have not been used recently are evicted
+    once max_clients is reached, and a client is rebuilt if the credential it was created with changes.
+
+    A registry can be shared between wrapper instances and threads.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections kept per host. Defaults to 32.
+        max_clients (int, optional): Maximum number of clients held before the least recently used is evicted. Defaults to 64.
+        transport_factory (callable, optional): Returns the transport each new client should use. Defaults to a RequestsTransport on the shared session.
+    """
+
+    def __init__(self, pool_size=32, max_clients=64, transport_factory=None):
+        self.pool_size = pool_size
+        self.max_clients = max_clients
+        self.session = None
+        self.transport_factory = transport_factory if transport_factory is not None else self._create_transport
+        self._clients = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _create_session(self):
+
+        session = requests.Session()
+
+        # retries are handled by the azure pipeline, not by urllib3
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=Retry(total=False, redirect=False, raise_on_status=False))
+
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def _create_transport(self):
+
+        if self.session is None:
+            self.session = self._create_session()
+
+        return RequestsTransport(session=self.session, session_owner=False)
+
+    def get(self, key, factory, credential=None):
+        """
+        Returns the client registered under key, creating it with factory if it does not exist yet
+
+        Args:
+            key (tuple): identifies the client, eg ("blob", storage_account_name, container_name)
+            factory (callable): takes a transport and returns a new client using it
+            credential (optional): credential the client is built with. If it differs from the one the registered client used, the client is rebuilt
+
+        Returns:
+            client
+        """
+
+        with self._lock:
+
+            entry = self._clients.get(key)
+
+            if entry is not None and entry[1] == credential:
+
+                self._clients.move_to_end(key)
+
+                return entry[0]
+
+            client = factory(self.transport_factory())
+
+            self._clients[key] = (client, credential)
+            self._clients.move_to_end(key)
+
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+            return client
+
+    def invalidate(self, key_prefix=()):
+        """
+        Removes clients from the registry, eg after credentials have been rotated
+
+        Args:
+            key_prefix (tuple, optional): only clients whose key starts with this are removed. Defaults to every client
+        """
+
+        with self._lock:
+
+            for key in list(self._clients):
+
+                if key[:len(key_prefix)] == key_prefix:
+                    del self._clients[key]
+
+    def close(self):
+        """
+        Removes every client and closes the shared session
+        """
+
+        self.invalidate()
+
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def __len__(self):
+        return len(self._clients)
+
+
+class AsyncClientRegistry(ClientRegistry):
+    """
+    Registry of long lived asyncio azure storage clients
+
+    Behaves as ClientRegistry, but every client sends its requests over one shared aiohttp session. The session is created
+    on first use so the registry can be built outside of a running event loop. Requires aiohttp to be installed.
+
+    Args:
+        pool_size (int, optional): Maximum number of connections open at once. Defaults to 100.
+        max_clients (int, optional): Maximum number of clients held before the least recently used is evicted. Defaults to 64.
+        transport_factory (callable, optional): Returns the transport each new client should use. Defaults to an AioHttpTransport on the shared session.
+    """
+
+    def __init__(self, pool_size=100, max_clients=64, transport_factory=None):
+        super().__init__(pool_size=pool_size, max_clients=max_clients, transport_factory=transport_factory)
+
+    def _create_session(self):
+
+        import aiohttp
+
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+
+    def _create_transport(self):
+
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        if self.session is None:
+            self.session = self._create_session()
+
+        return AioHttpTransport(session=self.session, session_owner=False)
+
+    async def close(self):
+        """
+        Removes every client and closes the shared aiohttp session
+        """
+
+        self.invalidate()
+
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
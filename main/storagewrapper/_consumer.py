@@ -0,0 +1,319 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from queue import Empty
+import threading
+import time
+
+
+ConsumerStats = namedtuple("ConsumerStats", ["received", "succeeded", "failed", "dead_lettered", "dropped", "heartbeats", "heartbeat_failures",
+                                             "in_flight", "elapsed", "messages_per_second", "mean_lag", "max_lag"])
+ConsumerStats.__doc__ = """
+Snapshot of the counters of a QueueConsumer
+
+Attributes:
+    received (int): messages taken from the queue for processing
+    succeeded (int): messages handled successfully and deleted
+    failed (int): messages whose handler raised, or which could not be deleted. They become visible again once their visibility timeout expires
+    dead_lettered (int): messages moved to the dead letter queue after exceeding the maximum dequeue count
+    dropped (int): prefetched messages dropped because they were close to their visibility deadline
+    heartbeats (int): visibility timeout extensions made for long running handlers
+    heartbeat_failures (int): visibility timeout extensions that failed. Each is tried again on the next tick of the heartbeat
+    in_flight (int): messages currently being handled
+    elapsed (float): seconds since the consumer started
+    messages_per_second (float): messages succeeded per second
+    mean_lag (float): mean seconds between a message being enqueued and being taken for processing
+    max_lag (float): largest lag seen, in seconds
+"""
+
+
+class _InFlight:
+    """
+    A message being handled, along with its current pop receipt and when its visibility must next be extended
+    """
+
+    def __init__(self, message, renew_at):
+        self.message = message
+        self.pop_receipt = message.pop_receipt
+        self.renew_at = renew_at
+        self.done = False
+        self.lock = threading.Lock()
+
+
+class QueueConsumer:
+    """
+    Runs a handler on every message received from a queue, on a pool of worker threads
+
+    A message is deleted once its handler returns. If the handler raises, the message is left on the queue to be
+    redelivered once its visibility timeout expires. While a handler is running the visibility timeout of its message is
+    extended every heartbeat_interval seconds, so long running handlers do not have their message redelivered to another
+    consumer. Messages that have been dequeued more than max_dequeue_count times are moved to a dead letter queue without
+    being handled.
+
+    Created by QueueFunctions.consume.
+
+    Args:
+        queue_client (QueueClient): client of the queue being consumed
+        handler (callable): called with each QueueMessage
+        prefetcher (MessagePrefetcher): source of messages received from queue_client
+        concurrency (int, optional): number of handlers run at once. Defaults to 8
+        visibility_timeout (int, optional): seconds a message is kept invisible for by each heartbeat. Defaults to 60
+        heartbeat_interval (float, optional): seconds between visibility extensions. Defaults to half of visibility_timeout
+        max_dequeue_count (int, optional): messages dequeued more times than this are dead lettered. None disables dead lettering. Defaults to 5
+        dead_letter_client (callable, optional): returns the QueueClient of the dead letter queue. Required if max_dequeue_count is set
+        claim_check (ClaimCheck, optional): if given, claim checked payloads are fetched before the handler runs and deleted along with their message
+        timeout (int, optional): server timeout of each request, in seconds. Defaults to 10
+        run (callable, optional): run(operation) makes each request, eg under a RetryPolicy. Defaults to calling operation directly
+
+    Attributes:
+        error (Exception): error that stopped receiving, if any
+        last_handler_error (Exception): most recent exception raised by the handler, if any
+        last_heartbeat_error (Exception): most recent exception raised extending the visibility timeout of a message, if any
+    """
+
+    def __init__(self, queue_client, handler, prefetcher, concurrency=8, visibility_timeout=60, heartbeat_interval=None, max_dequeue_count=5,
+                 dead_letter_client=None, claim_check=None, timeout=10, run=None):
+        self.queue_client = queue_client
+        self.handler = handler
+        self.prefetcher = prefetcher
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else visibility_timeout / 2
+        self.max_dequeue_count = max_dequeue_count
+        self.dead_letter_client = dead_letter_client
+        self.claim_check = claim_check
+        self.timeout = timeout
+        self.run = run if run is not None else (lambda operation: operation())
+        self.error = None
+        self.last_handler_error = None
+        self.last_heartbeat_error = None
+
+        self._counts = {"received": 0, "succeeded": 0, "failed": 0, "dead_lettered": 0, "heartbeats": 0, "heartbeat_failures": 0}
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._slots = threading.Semaphore(concurrency)
+        self._stopping = threading.Event()
+        self._finished = threading.Event()
+        self._started = None
+        self._dispatcher = None
+        self._heartbeat = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        self.join()
+
+    def start(self):
+        """
+        Starts receiving and handling messages in the background
+
+        Returns:
+            QueueConsumer: self
+        """
+
+        self._started = time.monotonic()
+
+        self._dispatcher = threading.Thread(target=self.__dispatch, name="storagewrapper-consumer", daemon=True)
+        self._heartbeat = threading.Thread(target=self.__heartbeat, name="storagewrapper-heartbeat", daemon=True)
+
+        self._dispatcher.start()
+        self._heartbeat.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stops receiving messages. Handlers already running are allowed to finish
+        """
+
+        self._stopping.set()
+
+    def join(self, timeout=None):
+        """
+        Waits for the consumer to finish, either because stop() was called or because the queue was empty and the consumer was started with stop_when_empty
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to waiting indefinitely
+
+        Returns:
+            bool: True if the consumer has finished
+        """
+
+        return self._finished.wait(timeout)
+
+    @property
+    def running(self):
+        return self._started is not None and not self._finished.is_set()
+
+    def stats(self):
+        """
+        Returns a snapshot of the consumer's counters
+
+        Returns:
+            ConsumerStats
+        """
+
+        with self._lock:
+
+            counts = dict(self._counts)
+            in_flight = len(self._in_flight)
+            mean_lag = self._lag_total / counts["received"] if counts["received"] else 0.0
+            max_lag = self._lag_max
+
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        messages_per_second = counts["succeeded"] / elapsed if elapsed else 0.0
+
+        return ConsumerStats(counts["received"], counts["succeeded"], counts["failed"], counts["dead_lettered"], self.prefetcher.dropped,
+                             counts["heartbeats"], counts["heartbeat_failures"], in_flight, elapsed, messages_per_second, mean_lag, max_lag)
+
+    def __count(self, name):
+
+        with self._lock:
+            self._counts[name] += 1
+
+    def __dispatch(self):
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="storagewrapper-handler") as executor:
+
+                while not self._stopping.is_set():
+
+                    if not self._slots.acquire(timeout=0.5):
+                        continue
+
+                    try:
+                        entry = self.prefetcher.get(timeout=0.5)
+
+                    except Empty:
+                        self._slots.release()
+                        continue
+
+                    except Exception as e:
+                        self.error = e
+                        self._slots.release()
+                        break
+
+                    if entry is None:
+                        self._slots.release()
+                        break
+
+                    message, deadline = entry
+
+                    record = _InFlight(message, deadline - self.visibility_timeout + self.heartbeat_interval)
+
+                    self.__track(record)
+
+                    executor.submit(self.__process, record)
+
+        finally:
+            self.prefetcher.close()
+            self._stopping.set()
+            self._finished.set()
+
+    def __track(self, record):
+
+        lag = 0.0
+        inserted_on = record.message.inserted_on
+
+        if inserted_on is not None:
+
+            if inserted_on.tzinfo is None:
+                inserted_on = inserted_on.replace(tzinfo=timezone.utc)
+
+            lag = max((datetime.now(timezone.utc) - inserted_on).total_seconds(), 0.0)
+
+        with self._lock:
+            self._in_flight.add(record)
+            self._counts["received"] += 1
+            self._lag_total += lag
+            self._lag_max = max(self._lag_max, lag)
+
+    def __process(self, record):
+
+        message = record.message
+
+        try:
+
+            if self.max_dequeue_count is not None and (message.dequeue_count or 0) > self.max_dequeue_count:
+
+                self.__dead_letter(record)
+                self.__count("dead_lettered")
+
+                return
+
+            if self.claim_check is not None:
+                message = self.claim_check.check_out(message)
+
+            self.handler(message)
+
+            self.__delete(record)
+            self.__count("succeeded")
+
+            if self.claim_check is not None:
+                self.claim_check.release(message)
+
+        except Exception as e:
+
+            self.last_handler_error = e
+            self.__count("failed")
+
+        finally:
+
+            with record.lock:
+                record.done = True
+
+            with self._lock:
+                self._in_flight.discard(record)
+
+            self._slots.release()
+
+    def __delete(self, record):
+
+        with record.lock:
+
+            self.run(lambda: self.queue_client.delete_message(record.message.id, pop_receipt=record.pop_receipt, timeout=self.timeout))
+            record.done = True
+
+    def __dead_letter(self, record):
+
+        dead_letter_client = self.dead_letter_client()
+
+        self.run(lambda: dead_letter_client.send_message(record.message.content, time_to_live=-1, timeout=self.timeout))
+
+        self.__delete(record)
+
+    def __heartbeat(self):
+
+        tick = min(1.0, self.heartbeat_interval / 4)
+
+        while not self._finished.wait(tick):
+
+            now = time.monotonic()
+
+            with self._lock:
+                due = [record for record in self._in_flight if record.renew_at <= now]
+
+            for record in due:
+
+                with record.lock:
+
+                    if record.done:
+                        continue
+
+                    try:
+                        updated = self.run(lambda: self.queue_client.update_message(record.message.id, pop_receipt=record.pop_receipt,
+                                                                                    visibility_timeout=self.visibility_timeout, timeout=self.timeout))
+
+                    except Exception as e:
+                        self.last_heartbeat_error = e
+                        self.__count("heartbeat_failures")
+                        continue
+
+                    record.pop_receipt = updated.pop_receipt
+                    record.renew_at = time.monotonic() + self.heartbeat_interval
+
+                self.__count("heartbeats")
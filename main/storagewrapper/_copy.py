@@ -0,0 +1,280 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from storagewrapper._bulk import ItemResult, OperationReport
+import heapq
+import itertools
+import threading
+import time
+
+
+CopyJob = namedtuple("CopyJob", ["name", "source_url", "destination"])
+CopyJob.__doc__ = """
+A server-side copy to be run by a CopyScheduler
+
+Attributes:
+    name (str): name the copy is reported under, usually the destination path
+    source_url (str): url of the source blob or file, including a SAS if one is needed to read it
+    destination (callable): called on a worker thread to return the destination BlobClient or ShareFileClient, eg after creating its parent directories
+"""
+
+
+class _Copy:
+    """
+    State of one copy started by a CopyScheduler
+    """
+
+    def __init__(self, job, poll_interval):
+        self.job = job
+        self.client = None
+        self.copy_id = None
+        self.interval = poll_interval
+
+
+class CopyScheduler:
+    """
+    Runs many server-side copies at once, without streaming any data through this host
+
+    Copies are started as jobs is consumed, with at most max_in_flight unfinished at a time. Rather than each copy
+    polling its own status in a loop, unfinished copies are kept on a single heap ordered by when they are next due to be
+    polled, and each copy's poll interval doubles up to max_poll_interval while it remains pending. Starting, polling
+    and aborting are done on a pool of max_workers threads.
+
+    Args:
+        jobs (iterable): CopyJob for every copy. Consumed lazily
+        max_in_flight (int, optional): maximum copies started but not yet finished. Defaults to 32
+        max_workers (int, optional): number of requests made at once. Defaults to 8
+        poll_interval (float, optional): seconds before a copy's status is first polled. Defaults to 1
+        max_poll_interval (float, optional): maximum seconds between polls of one copy. Defaults to 30
+        run (callable, optional): run(operation) makes each request, eg under a RetryPolicy. Defaults to calling operation directly
+
+    Attributes:
+        report (OperationReport): an ItemResult per finished copy. detail is the final copy status: "success", "failed" or "aborted"
+        error (Exception): error raised while reading jobs, if any
+    """
+
+    def __init__(self, jobs, max_in_flight=32, max_workers=8, poll_interval=1, max_poll_interval=30, run=None):
+        self.jobs = iter(jobs)
+        self.max_in_flight = max_in_flight
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.run_request = run if run is not None else (lambda operation: operation())
+        self.report = OperationReport()
+        self.error = None
+
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts running copies in the background
+
+        Returns:
+            CopyScheduler: self
+        """
+
+        self._thread = threading.Thread(target=self.__run, name="storagewrapper-copy", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def run(self):
+        """
+        Runs every copy, returning once all have finished
+
+        Returns:
+            OperationReport: report
+        """
+
+        self.start()
+
+        try:
+            self.join()
+
+        except KeyboardInterrupt:
+            self.cancel()
+            self.join()
+
+        if self.error is not None:
+            raise self.error
+
+        return self.report
+
+    def cancel(self):
+        """
+        Stops starting new copies and aborts those still pending
+        """
+
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        """
+        Waits for every copy to finish or be aborted
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to waiting indefinitely
+
+        Returns:
+            bool: True if the scheduler has finished
+        """
+
+        return self._finished.wait(timeout)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def __run(self):
+
+        heap = []
+        sequence = itertools.count()
+        futures = {}
+        in_flight = 0
+        exhausted = False
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storagewrapper-copy") as executor:
+
+                while True:
+
+                    if self._cancelled.is_set():
+
+                        exhausted = True
+
+                        while heap:
+                            _, _, copy = heapq.heappop(heap)
+                            futures[executor.submit(self.__abort, copy)] = copy
+
+                    while not exhausted and in_flight < self.max_in_flight:
+
+                        try:
+                            job = next(self.jobs)
+
+                        except StopIteration:
+                            exhausted = True
+                            break
+
+                        except Exception as e:
+                            self.error = e
+                            exhausted = True
+                            break
+
+                        copy = _Copy(job, self.poll_interval)
+                        futures[executor.submit(self.__start, copy)] = copy
+                        in_flight += 1
+
+                    now = time.monotonic()
+
+                    while heap and heap[0][0] <= now:
+                        _, _, copy = heapq.heappop(heap)
+                        futures[executor.submit(self.__poll, copy)] = copy
+
+                    if not futures and not heap and exhausted:
+                        break
+
+                    timeout = max(heap[0][0] - now, 0) if heap else None
+                    timeout = 0.5 if timeout is None else min(timeout, 0.5)
+
+                    if not futures:
+                        self._cancelled.wait(timeout)
+                        continue
+
+                    done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+
+                        copy = futures.pop(future)
+                        result = future.result()
+
+                        if result is None:
+                            heapq.heappush(heap, (time.monotonic() + copy.interval, next(sequence), copy))
+                            copy.interval = min(copy.interval * 2, self.max_poll_interval)
+
+                        else:
+                            self.report.add(result)
+                            in_flight -= 1
+
+        finally:
+            self.report.finish()
+            self._finished.set()
+
+    def __start(self, copy):
+        """
+        Starts a copy
+
+        Returns:
+            ItemResult if the copy has already finished or could not be started, otherwise None
+        """
+
+        try:
+
+            copy.client = copy.job.destination()
+
+            started = self.run_request(lambda: copy.client.start_copy_from_url(copy.job.source_url))
+
+            copy.copy_id = started["copy_id"]
+
+            if started["copy_status"] == "pending":
+                return None
+
+            return self.__finished(copy, started["copy_status"], None)
+
+        except Exception as e:
+
+            return ItemResult(copy.job.name, False, error=str(e), detail="failed")
+
+    def __poll(self, copy):
+        """
+        Checks the status of a pending copy
+
+        Returns:
+            ItemResult if the copy has finished, otherwise None
+        """
+
+        try:
+
+            properties = self.__properties(copy)
+
+            if properties.copy.status == "pending":
+                return None
+
+            return self.__finished(copy, properties.copy.status, properties)
+
+        except Exception as e:
+
+            return ItemResult(copy.job.name, False, error=str(e), detail="failed")
+
+    def __abort(self, copy):
+        """
+        Aborts a pending copy
+
+        Returns:
+            ItemResult
+        """
+
+        try:
+            self.run_request(lambda: copy.client.abort_copy(copy.copy_id))
+
+            return ItemResult(copy.job.name, False, error="Copy cancelled", detail="aborted")
+
+        except Exception as e:
+
+            return ItemResult(copy.job.name, False, error=f"Copy cancelled, but could not be aborted: {e}", detail="failed")
+
+    def __finished(self, copy, status, properties):
+
+        if properties is None:
+            properties = self.__properties(copy)
+
+        if status == "success":
+            return ItemResult(copy.job.name, True, properties.size or 0, detail=status)
+
+        return ItemResult(copy.job.name, False, error=properties.copy.status_description or f"Copy {status}", detail=status)
+
+    def __properties(self, copy):
+
+        if hasattr(copy.client, "get_blob_properties"):
+            return self.run_request(copy.client.get_blob_properties)
+
+        return self.run_request(copy.client.get_file_properties)
@@ -0,0 +1,269 @@
+import threading
+import time
+
+
+# Scopes of the tokens the wrappers request: storage for blobs, files and queues, and key vault for access keys
+STORAGE_SCOPE = "https://storage.azure.com/.default"
+KEY_VAULT_SCOPE = "https://vault.azure.net/.default"
+
+# The sdk clients treat a token with less than this many seconds left as expired and ask for a new one
+USABLE_MARGIN = 300
+
+
+class PrefetchingCredential:
+    """
+    Thread safe credential that acquires tokens before they are needed and refreshes them in the background
+
+    Tokens for scopes are acquired on a background thread as soon as the credential is created, so the first storage
+    call of a process doesn't wait on a round trip to Azure AD. Every token handed out is cached per scope and refreshed
+    refresh_margin seconds before it expires, or halfway through its lifetime if it lives less than twice that, so
+    callers are served from memory and never wait on a refresh. Scopes other than those given are acquired on first use
+    and then kept fresh in the same way.
+
+    If a background refresh fails it is retried every retry_interval seconds. A caller only acquires a token itself if
+    the cached one is about to expire, and is given the cached token if that acquisition fails while it is still valid.
+    Requests with claims or other options are passed straight to credential.
+
+    AuthenticateFunctions(params, prefetch_tokens=True) shares one PrefetchingCredential per identity across the
+    process.
+
+    Args:
+        credential (token obj): credential tokens are acquired from, eg ClientSecretCredential
+        scopes (iterable of str, optional): scopes to acquire straight away. Defaults to storage and key vault
+        refresh_margin (float, optional): seconds before expiry tokens are refreshed. Defaults to 600
+        retry_interval (float, optional): seconds between attempts after a refresh fails. Defaults to 30
+
+    Attributes:
+        refreshes (int): tokens acquired by the background thread
+        failures (int): background acquisitions that failed
+        last_error (Exception): error of the last failed background acquisition, or None
+    """
+
+    def __init__(self, credential, scopes=(STORAGE_SCOPE, KEY_VAULT_SCOPE), refresh_margin=600, retry_interval=30):
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.closed = False
+
+        # scopes -> (AccessToken, time.time() it was acquired). A scope without a token is due at once
+        self._tokens = {}
+        self._retry_at = {}
+        self._condition = threading.Condition()
+        self._key_locks = {}
+
+        for scope in scopes:
+            self._tokens[(scope,)] = None
+
+        self._thread = threading.Thread(target=self.__refresh, name="storagewrapper-token-refresh", daemon=True)
+        self._thread.start()
+
+    def get_token(self, *scopes, **kwargs):
+        """
+        Returns a token for scopes, from the cache unless it is about to expire
+
+        Returns:
+            AccessToken
+        """
+
+        if any(value is not None for value in kwargs.values()):
+            return self.credential.get_token(*scopes, **kwargs)
+
+        key = tuple(scopes)
+
+        token = self.__usable(key, USABLE_MARGIN)
+
+        if token is not None:
+            return token
+
+        with self.__key_lock(key):
+
+            token = self.__usable(key, USABLE_MARGIN)
+
+            if token is not None:
+                return token
+
+            try:
+                token = self.credential.get_token(*scopes)
+
+            except Exception:
+
+                token = self.__usable(key, 0)
+
+                if token is None:
+                    raise
+
+                return token
+
+            self.__store(key, token)
+
+            return token
+
+    def stop(self):
+        """
+        Stops refreshing tokens in the background. Tokens are still acquired when callers need them
+        """
+
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Stops refreshing tokens and closes credential
+        """
+
+        self.stop()
+
+        close = getattr(self.credential, "close", None)
+
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __usable(self, key, margin):
+
+        entry = self._tokens.get(key)
+
+        if entry is None or entry[0].expires_on - time.time() <= margin:
+            return None
+
+        return entry[0]
+
+    def __store(self, key, token):
+
+        with self._condition:
+            self._tokens[key] = (token, time.time())
+            self._retry_at.pop(key, None)
+            self._condition.notify_all()
+
+    def __key_lock(self, key):
+
+        with self._condition:
+
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+
+            return self._key_locks[key]
+
+    def __due_at(self, key):
+        """
+        Returns the time.time() at which the token for key should next be acquired
+        """
+
+        entry = self._tokens[key]
+
+        if entry is None:
+            due_at = 0
+
+        else:
+            token, acquired_at = entry
+            due_at = max(token.expires_on - self.refresh_margin, acquired_at + (token.expires_on - acquired_at) / 2)
+
+        return max(due_at, self._retry_at.get(key, 0))
+
+    def __refresh(self):
+        """
+        Runs on the background thread, acquiring each token once it is due
+        """
+
+        while True:
+
+            with self._condition:
+
+                while True:
+
+                    if self.closed:
+                        return
+
+                    now = time.time()
+                    due_at = {key: self.__due_at(key) for key in self._tokens}
+                    due = [key for key, at in due_at.items() if at <= now]
+
+                    if due:
+                        break
+
+                    self._condition.wait(min(due_at.values()) - now if due_at else None)
+
+            for key in due:
+                self.__refresh_token(key)
+
+    def __refresh_token(self, key):
+
+        with self.__key_lock(key):
+
+            with self._condition:
+
+                if self.__due_at(key) > time.time():
+                    # A caller acquired it while this thread was waiting for the lock
+                    return
+
+            try:
+                token = self.credential.get_token(*key)
+
+            except Exception as e:
+
+                with self._condition:
+                    self.failures += 1
+                    self.last_error = e
+                    self._retry_at[key] = time.time() + self.retry_interval
+
+                return
+
+            with self._condition:
+                self.refreshes += 1
+
+            self.__store(key, token)
+
+
+# key -> (version, PrefetchingCredential)
+_shared_credentials = {}
+_shared_lock = threading.Lock()
+
+
+def shared_prefetching_credential(key, credential, version=None):
+    """
+    Returns the process wide PrefetchingCredential for key, creating it from credential if there isn't one. If there is,
+    credential is closed and the existing one returned
+
+    A credential with a different version, eg made with a rotated secret, replaces the shared one. The replaced
+    credential stops refreshing in the background, so it no longer calls Azure AD with a secret that may be dead, but
+    still acquires tokens for anyone holding it when they ask for one.
+
+    Args:
+        key (tuple): identifies the identity credential authenticates as
+        credential (token obj): credential to acquire tokens with
+        version (str, optional): identifies the secret credential authenticates with, eg a hash of it
+
+    Returns:
+        PrefetchingCredential
+    """
+
+    with _shared_lock:
+
+        shared_version, prefetching_credential = _shared_credentials.get(key, (None, None))
+
+        if prefetching_credential is not None and not prefetching_credential.closed:
+
+            if shared_version == version:
+
+                close = getattr(credential, "close", None)
+
+                if close is not None:
+                    close()
+
+                return prefetching_credential
+
+            prefetching_credential.stop()
+
+        prefetching_credential = PrefetchingCredential(credential)
+        _shared_credentials[key] = (version, prefetching_credential)
+
+        return prefetching_credential
@@ -0,0 +1,244 @@
+from collections import namedtuple
+import hashlib
+import mmap
+import os
+import time
+import uuid
+
+
+CacheEntry = namedtuple("CacheEntry", ["etag", "path", "fresh"])
+
+# Temporary files older than this are left over from a write that crashed, rather than one still in progress
+STALE_TEMPORARY_FILE_AGE = 60 * 60
+
+
+class DiskCache:
+    """
+    Read-through cache of blob content on local disk, keyed by blob and validated by ETag
+
+    Each cached blob is stored in a data file named after the blob and its ETag, alongside a small pointer file holding
+    the current ETag. Both are written to a temporary file and renamed into place, so readers never see a partially
+    written file and several processes can share one cache directory. Once the data files take up more than max_size
+    bytes the least recently used are evicted, every read of a data file counting as a use. Temporary files left behind
+    by writes that crashed are removed when the cache is opened.
+
+    Args:
+        directory (str): directory to keep cached blobs in. Created if it does not exist
+        max_size (int, optional): maximum bytes of blob content kept. Defaults to 1GiB
+        revalidate_after (float, optional): seconds after a blob was last validated against storage during which it is
+            served without a conditional request. Defaults to 0, validating on every read
+    """
+
+    def __init__(self, directory, max_size=1024 ** 3, revalidate_after=0):
+        self.directory = directory
+        self.max_size = max_size
+        self.revalidate_after = revalidate_after
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.__remove_stale_temporary_files()
+
+    def __key_digest(self, key):
+
+        return hashlib.sha256("\n".join(key).encode("utf-8")).hexdigest()
+
+    def __pointer_path(self, digest):
+
+        return os.path.join(self.directory, f"{digest}.etag")
+
+    def __data_path(self, digest, etag):
+
+        return os.path.join(self.directory, f"{digest}-{hashlib.sha256(etag.encode('utf-8')).hexdigest()[:16]}.data")
+
+    def lookup(self, key):
+        """
+        Finds the cached content of a blob
+
+        Args:
+            key (tuple): strings identifying the blob, eg (account, container, blob)
+
+        Returns:
+            CacheEntry: etag, path of the data file and whether it is fresh enough to use without revalidation, or None if not cached
+        """
+
+        digest = self.__key_digest(key)
+        pointer_path = self.__pointer_path(digest)
+
+        try:
+            with open(pointer_path, "r", encoding="utf-8") as pointer:
+                etag = pointer.read()
+
+            validated = os.stat(pointer_path).st_mtime
+
+        except OSError:
+            return None
+
+        path = self.__data_path(digest, etag)
+
+        if not os.path.exists(path):
+            return None
+
+        return CacheEntry(etag, path, time.time() - validated < self.revalidate_after)
+
+    def touch(self, key, entry):
+        """
+        Records that entry has just been validated against storage, so it is fresh again for revalidate_after seconds
+        """
+
+        try:
+            os.utime(self.__pointer_path(self.__key_digest(key)))
+            os.utime(entry.path)
+
+        except OSError:
+            pass
+
+    def store(self, key, etag, write):
+        """
+        Caches new content of a blob
+
+        Args:
+            key (tuple): strings identifying the blob
+            etag (str): ETag of the content
+            write (callable): write(file) writes the content to an open binary file
+
+        Returns:
+            CacheEntry: the stored entry
+        """
+
+        digest = self.__key_digest(key)
+        pointer_path = self.__pointer_path(digest)
+        path = self.__data_path(digest, etag)
+        previous = self.lookup(key)
+
+        self.__write_atomically(path, write)
+        self.__write_atomically(pointer_path, lambda pointer: pointer.write(etag.encode("utf-8")))
+
+        if previous is not None and previous.path != path:
+            self.__remove(previous.path)
+
+        self.evict(keep=path)
+
+        return CacheEntry(etag, path, True)
+
+    def read(self, entry, as_mmap=False):
+        """
+        Returns cached content, making the entry the most recently used for eviction
+
+        Args:
+            entry (CacheEntry): entry returned by lookup or store
+            as_mmap (bool, optional): if True a read only memory map of the data file is returned instead of bytes. Defaults to False
+
+        Returns:
+            bytes or mmap.mmap: content, or None if the entry has been evicted since it was looked up
+        """
+
+        try:
+            file = open(entry.path, "rb")
+
+        except FileNotFoundError:
+            return None
+
+        try:
+            os.utime(entry.path)
+
+        except OSError:
+            pass
+
+        with file:
+
+            if not as_mmap:
+                return file.read()
+
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used data files until the cache is within max_size
+
+        Args:
+            keep (str, optional): path of a data file never to evict, eg one that has just been stored
+        """
+
+        files = []
+
+        for name in os.listdir(self.directory):
+
+            path = os.path.join(self.directory, name)
+
+            if not name.endswith(".data"):
+                continue
+
+            try:
+                stat = os.stat(path)
+
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files):
+
+            if total <= self.max_size:
+                break
+
+            if path == keep:
+                continue
+
+            self.__remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Removes everything from the cache
+        """
+
+        for name in os.listdir(self.directory):
+
+            if name.endswith((".data", ".etag")):
+                self.__remove(os.path.join(self.directory, name))
+
+    def __remove_stale_temporary_files(self):
+
+        cutoff = time.time() - STALE_TEMPORARY_FILE_AGE
+
+        for name in os.listdir(self.directory):
+
+            if not name.endswith(".tmp"):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+
+            except OSError:
+                pass
+
+    def __write_atomically(self, path, write):
+
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            with open(temporary_path, "wb") as file:
+                write(file)
+
+            os.replace(temporary_path, path)
+
+        except BaseException:
+            self.__remove(temporary_path)
+            raise
+
+    @staticmethod
+    def __remove(path):
+
+        try:
+            os.remove(path)
+
+        except OSError:
+            pass
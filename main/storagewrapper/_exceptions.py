@@ -59,3 +59,16 @@ class InitialisationError(Exception):
 
     def __str__(self):
         return self.message
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of making a request while the circuit breaker of a storage account is open
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
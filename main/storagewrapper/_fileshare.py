@@ -1,10 +1,29 @@
-from azure.keyvault.secrets import SecretClient
-from azure.storage.fileshare import generate_account_sas, ResourceTypes, AccountSasPermissions, ShareServiceClient, ShareClient, ShareDirectoryClient, ShareAccessTier
-from datetime import datetime
-from storagewrapper._exceptions import FileShareFunctionsError, InitialisationError
+from azure.core.exceptions import ClientAuthenticationError, ResourceExistsError
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from storagewrapper._bulk import ItemResult, OperationReport, run_bounded
+from storagewrapper._clients import ClientRegistry
+from storagewrapper._copy import CopyJob, CopyScheduler
+from storagewrapper._exceptions import FileShareFunctionsError, InitialisationError, InvalidArguments
+from storagewrapper._local import configured_backend
+from storagewrapper._metrics import NULL_METRICS, instrumented
+from storagewrapper._retry import RetryingPaged, shared_retry_policy
+from storagewrapper._sas_cache import SasCache
+from storagewrapper._secrets import shared_secret_cache
+from storagewrapper._transfer import DEFAULT_CHUNK_SIZE, download_ranges_to_path, download_resumable
+import concurrent.futures
+import os
 import sys
+import threading
+import time
 
 
+WalkEntry = namedtuple("WalkEntry", ["path", "is_directory", "size"])
+
+
+@instrumented("file")
 class FileShareFunctions:
     """
         Initialiser for FileShareFunctions class obj
@@ -20,9 +39,16 @@ class FileShareFunctions:
             vault_url (str, optional): URL of key vault in which account access key is stored
             secret_name (str, optional): Name of the access key secret which is stored in key vault
             token(token obj, optional): Credential created in AuthenticateFunctions
+            sas_cache (SasCache, optional): Cache of account SAS tokens. Can be shared between instances and threads. Defaults to a new SasCache per instance.
+            client_registry (ClientRegistry, optional): Pool of long lived clients sharing one HTTP session. Defaults to a new ClientRegistry per instance.
+            secret_cache (SecretCache, optional): Cache of key vault secrets. Defaults to a cache shared by every wrapper in the process.
+            retry_policy (RetryPolicy, optional): Retries, throttling and circuit breaking applied to requests. Defaults to a policy shared by every wrapper in the process.
+            metrics (Metrics, optional): Records call counts, latencies, bytes transferred and time spent on authentication. Defaults to None, recording nothing.
+            backend (LocalBackend, optional): Keeps shares somewhere other than Azure, eg on local disk. Defaults to the backend selected by the STORAGEWRAPPER_BACKEND environment variable, which is Azure unless set to local.
     """
 
-    def __init__(self, storage_account_name, authenticator, storage_account_access_key=None, vault_url=None, secret_name=None, handle_exceptions=False):
+    def __init__(self, storage_account_name, authenticator, storage_account_access_key=None, vault_url=None, secret_name=None, handle_exceptions=False,
+                 sas_cache=None, client_registry=None, secret_cache=None, retry_policy=None, metrics=None, backend=None):
         self.storage_account_name = storage_account_name
         self.authenticator = authenticator
         self.sas_duration = self.authenticator.sas_duration
@@ -31,6 +57,13 @@ class FileShareFunctions:
         self.storage_account_access_key = storage_account_access_key
         self.vault_url = vault_url
         self.secret_name = secret_name
+        self.sas_cache = sas_cache if sas_cache is not None else SasCache()
+        self.client_registry = client_registry if client_registry is not None else ClientRegistry()
+        self.secret_cache = secret_cache if secret_cache is not None else shared_secret_cache
+        self.retry_policy = retry_policy if retry_policy is not None else shared_retry_policy
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.backend = backend if backend is not None else configured_backend()
+        self.account_url = f"https://{self.storage_account_name}.file.core.windows.net/"
         
         self.handle_exceptions = handle_exceptions
         
@@ -39,6 +72,8 @@ class FileShareFunctions:
 
     def __handle_errors(self, func_name, error, exception_type=None):
 
+        self.metrics.error("file", func_name)
+
         error_message = f"{error} in {func_name}"
 
         if self.handle_exceptions:
@@ -62,45 +97,96 @@ class FileShareFunctions:
         """
         Generates sas key for fileshare
         Requires key to account being stored in key vault
+        The SAS is cached until shortly before it expires
         param
         """
-        if self.storage_account_access_key is None:
-            secret = self.__get_secret()
 
-            fs_sas_token = generate_account_sas(
-                account_name=self.storage_account_name,
-                account_key=secret,
-                resource_types=ResourceTypes(service=True, container=True, object=True),
-                permission=self.sas_permissions,
-                expiry=datetime.utcnow() + self.sas_duration
-            )
+        with self.metrics.stage("file", "sas"):
+            fs_sas_token = self.sas_cache.get(self.__sas_cache_key(), self.__generate_account_sas)
+
+        return fs_sas_token
+
+    def __sas_cache_key(self):
+
+        return ("AccountSas", self.storage_account_name, str(self.sas_permissions))
+
+    def __generate_account_sas(self):
+
+        from azure.storage.fileshare import generate_account_sas, ResourceTypes
+
+        if self.storage_account_access_key is None:
+            account_key = self.__get_secret()
 
-            return fs_sas_token
-        
         else:
+            account_key = self.storage_account_access_key
+
+        expiry = datetime.utcnow() + self.sas_duration
+
+        fs_sas_token = generate_account_sas(
+            account_name=self.storage_account_name,
+            account_key=account_key,
+            resource_types=ResourceTypes(service=True, container=True, object=True),
+            permission=self.sas_permissions,
+            expiry=expiry
+        )
+
+        return fs_sas_token, expiry
 
-            fs_sas_token = generate_account_sas(
-                account_name=self.storage_account_name,
-                account_key=self.storage_account_access_key,
-                resource_types=ResourceTypes(service=True, container=True, object=True),
-                permission=self.sas_permissions,
-                expiry=datetime.utcnow() + self.sas_duration
-            )
+    def __generate_file_read_sas(self, share_name, file_path, sas_duration):
+        """
+        Generates a read only SAS for a single file, valid for sas_duration. It is never cached, so it has the whole of sas_duration left
+
+        return str: SAS token
+        """
 
-            return fs_sas_token
+        from azure.storage.fileshare import FileSasPermissions, generate_file_sas
+
+        if self.storage_account_access_key is None:
+            account_key = self.__get_secret()
+
+        else:
+            account_key = self.storage_account_access_key
+
+        return generate_file_sas(
+            account_name=self.storage_account_name,
+            share_name=share_name,
+            file_path=file_path.strip("/").split("/"),
+            account_key=account_key,
+            permission=FileSasPermissions(read=True),
+            expiry=datetime.utcnow() + sas_duration
+        )
 
     def _create_share_service_client(self):
-        
+
+        if self.backend is not None:
+            return self.backend.share_service_client(self.storage_account_name)
+
+        from azure.storage.fileshare import ShareServiceClient
+
         sas_token = self._create_sas_for_fileshare()
-        account_url = f"https://{self.storage_account_name}.file.core.windows.net/"
-        share_service_client = ShareServiceClient(account_url=account_url, credential=sas_token)
+
+        with self.metrics.stage("file", "client"):
+            share_service_client = self.client_registry.get(
+                ("file", self.storage_account_name),
+                lambda transport: ShareServiceClient(account_url=self.account_url, credential=sas_token, transport=transport, retry_total=0),
+                credential=sas_token)
 
         return share_service_client
 
     def _get_share_client(self, share_name):
+
+        if self.backend is not None:
+            return self.backend.share_client(self.storage_account_name, share_name)
+
+        from azure.storage.fileshare import ShareClient
+
         fs_sas = self._create_sas_for_fileshare()
-        account_url = f"https://{self.storage_account_name}.file.core.windows.net"
-        share_client = ShareClient(account_url=account_url, share_name=share_name, credential=fs_sas)
+
+        with self.metrics.stage("file", "client"):
+            share_client = self.client_registry.get(
+                ("file", self.storage_account_name, share_name),
+                lambda transport: ShareClient(account_url=self.account_url, share_name=share_name, credential=fs_sas, transport=transport, retry_total=0),
+                credential=fs_sas)
 
         return share_client
 
@@ -116,6 +202,15 @@ class FileShareFunctions:
 
         return share_file_client
 
+    def invalidate_clients(self):
+        """
+        Drops pooled clients and cached SAS tokens so they are rebuilt with fresh credentials, eg after an access key has been rotated
+        """
+
+        self.token = self.authenticator.token
+        self.sas_cache.invalidate()
+        self.client_registry.invalidate(("file", self.storage_account_name))
+
     def __get_secret(self):
         """
         Retrieves storage acct access key from key vault
@@ -137,12 +232,106 @@ class FileShareFunctions:
             
             self.__handle_errors("Retrieving secret", error="token not provided", exception_type=InitialisationError)
 
-        secret_client = SecretClient(vault_url=self.vault_url, credential=self.token)
-        secret = secret_client.get_secret(self.secret_name)
+        with self.metrics.stage("file", "key_vault"):
+            secret = self.secret_cache.get(self.vault_url, self.secret_name, self.token)
+
+        return secret
+
+    def __run_with_key_refresh(self, operation):
+        """
+        Runs operation under the retry policy. If storage rejects the SAS because the access key held in key vault has
+        been rotated, the key is fetched again and operation is retried once.
+
+        param operation: callable taking no arguments
+
+        return result of operation
+        """
+
+        def attempt():
+            started = time.monotonic()
+
+            try:
+                return operation()
+
+            except ClientAuthenticationError:
+
+                if self.storage_account_access_key is not None:
+                    raise
+
+                self.secret_cache.invalidate(self.vault_url, self.secret_name, fetched_before=started)
+                self.sas_cache.invalidate(self.__sas_cache_key())
 
-        return secret.value
+                return operation()
 
-    def copy_file(self, share_name, file_path, source_url):
+        return self.retry_policy.run(attempt, self.storage_account_name)
+
+    def __run_upload(self, operation, data):
+        """
+        Runs an upload of data as __run_with_key_refresh does. If data is a stream it is rewound to where it started before
+        every attempt, so a retry uploads all of it again. A stream that can't seek is given a single attempt, as a retry
+        would upload only what the failed attempt left unread.
+
+        return result of operation
+        """
+
+        if not hasattr(data, "read"):
+            return self.__run_with_key_refresh(operation)
+
+        try:
+            start = data.tell()
+            data.seek(start)
+
+        except (AttributeError, OSError, ValueError):
+            return self.retry_policy.run(operation, self.storage_account_name, max_attempts=1)
+
+        def rewound():
+            data.seek(start)
+
+            return operation()
+
+        return self.__run_with_key_refresh(rewound)
+
+    def copy_blobs_to_share(self, blob_functions, container_name, share_name, names=None, prefix=None, destination_directory="", max_in_flight=32,
+                            max_workers=8, wait=True):
+        """Copies many blobs into a file share server-side, without streaming their content through this host
+
+        Directories implied by the blob names are created as needed. Copies are started concurrently, up to max_in_flight
+        at once, and their progress is polled by a shared scheduler which backs off while copies remain pending.
+        Either names or prefix must be given.
+
+        Args:
+            blob_functions (BlobFunctions): BlobFunctions of the storage account holding the blobs
+            container_name (str): Container to copy from
+            share_name (str): Share to copy to
+            names (iterable, optional): Names of blobs to copy
+            prefix (str, optional): Copies every blob whose name begins with prefix
+            destination_directory (str, optional): Directory the blobs are copied below, using their names as relative paths. Defaults to the root of the share
+            max_in_flight (int, optional): Maximum copies unfinished at once. Defaults to 32
+            max_workers (int, optional): Number of requests made at once. Defaults to 8
+            wait (bool, optional): If True waits for every copy to finish. If False returns the running CopyScheduler, which can be cancelled. Defaults to True
+
+        Returns:
+            OperationReport or CopyScheduler: result of every copy, detail is its final copy status. Truthy if every copy succeeded
+        """
+        try:
+
+            if (names is None) == (prefix is None):
+                raise InvalidArguments("Exactly one of names or prefix must be given")
+
+            if names is None:
+                names = blob_functions.list_blobs(container_name, name_starts_with=prefix, lazy=True)
+
+            sources = ((blob_functions.get_blob_url(container_name, blob_name), blob_name) for blob_name in names)
+
+            return self.__copy(sources, share_name, destination_directory, max_in_flight, max_workers, wait)
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def copy_file(self, share_name, file_path, source_url, wait=False):
         """
         Copies a file from a url to file share destination
         
@@ -150,17 +339,30 @@ class FileShareFunctions:
             share_name (str): share must exist
             file_path (str): full file path
             source_url (str): source url of file to be copied. May need to authenticate url with sas if in azure storage
+            wait (bool, optional): If True waits for the copy to finish, polling its status with backoff. Defaults to False
 
         Returns:
             FileProperties Class Obj
             https://docs.microsoft.com/en-us/python/api/azure-storage-file-share/azure.storage.fileshare.fileproperties?view=azure-python
         """
         try:
-            share_file_client = self._get_share_file_client(share_name, file_path)
+            if wait:
+
+                report = CopyScheduler([CopyJob(file_path, source_url, lambda: self._get_share_file_client(share_name, file_path))],
+                                       run=lambda operation: self.retry_policy.run(operation, self.storage_account_name)).run()
+
+                if not report:
+                    raise FileShareFunctionsError(report.failed[file_path])
+
+            def copy():
+                share_file_client = self._get_share_file_client(share_name, file_path)
 
-            share_file_client.start_copy_from_url(source_url)
+                if not wait:
+                    share_file_client.start_copy_from_url(source_url)
 
-            file_properties = share_file_client.get_file_properties(timeout=10)
+                return share_file_client.get_file_properties(timeout=10)
+
+            file_properties = self.__run_with_key_refresh(copy)
 
             return file_properties
         
@@ -170,6 +372,94 @@ class FileShareFunctions:
 
             return status
 
+    def copy_files(self, source_share_name, share_name, file_paths=None, directory_name=None, destination_directory="", source=None, max_in_flight=32,
+                   max_workers=8, wait=True):
+        """Copies many files between shares server-side, without streaming their content through this host
+
+        Files are given either as a list of paths, or as a directory whose whole tree is copied. Directories are created in
+        the destination share as needed. Copies are started concurrently, up to max_in_flight at once, and their progress
+        is polled by a shared scheduler which backs off while copies remain pending.
+
+        Args:
+            source_share_name (str): Share to copy from
+            share_name (str): Share to copy to. May be the same as source_share_name if destination_directory is given
+            file_paths (iterable, optional): Paths of files to copy
+            directory_name (str, optional): Copies every file below this directory
+            destination_directory (str, optional): Directory the files are copied below, keeping their paths. Defaults to the root of the share
+            source (FileShareFunctions, optional): FileShareFunctions of the source storage account. Defaults to this account
+            max_in_flight (int, optional): Maximum copies unfinished at once. Defaults to 32
+            max_workers (int, optional): Number of requests made at once. Defaults to 8
+            wait (bool, optional): If True waits for every copy to finish. If False returns the running CopyScheduler, which can be cancelled. Defaults to True
+
+        Returns:
+            OperationReport or CopyScheduler: result of every copy, detail is its final copy status. Truthy if every copy succeeded
+        """
+        try:
+
+            if (file_paths is None) == (directory_name is None):
+                raise InvalidArguments("Exactly one of file_paths or directory_name must be given")
+
+            source = source if source is not None else self
+
+            if file_paths is None:
+                file_paths = (entry.path for entry in source.walk(source_share_name, directory_name) if not entry.is_directory)
+
+            sources = ((source.get_file_url(source_share_name, file_path), file_path) for file_path in file_paths)
+
+            return self.__copy(sources, share_name, destination_directory, max_in_flight, max_workers, wait)
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __copy(self, sources, share_name, destination_directory, max_in_flight, max_workers, wait):
+        """Copies (source_url, relative_path) pairs into a share below destination_directory, creating directories as needed
+
+        Returns:
+            OperationReport or CopyScheduler
+        """
+
+        directories = set()
+        lock = threading.Lock()
+
+        def destination(file_path):
+
+            parts = file_path.split("/")[:-1]
+
+            for depth in range(1, len(parts) + 1):
+
+                directory = "/".join(parts[:depth])
+
+                with lock:
+                    if directory in directories:
+                        continue
+
+                try:
+                    self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, directory).create_directory())
+
+                except ResourceExistsError:
+                    pass
+
+                with lock:
+                    directories.add(directory)
+
+            return self._get_share_file_client(share_name, file_path)
+
+        def job(source_url, relative_path):
+            file_path = "/".join(part for part in (destination_directory.strip("/"), relative_path.strip("/")) if part)
+
+            return CopyJob(file_path, source_url, lambda: destination(file_path))
+
+        scheduler = CopyScheduler((job(source_url, relative_path) for source_url, relative_path in sources), max_in_flight=max_in_flight,
+                                  max_workers=max_workers, run=lambda operation: self.retry_policy.run(operation, self.storage_account_name))
+
+        if not wait:
+            return scheduler.start()
+
+        return scheduler.run()
+
     def create_fileshare_directory(self, share_name, directory_path, recursive=False):
         """Creates a new directory under the directory referenced by the client..
 
@@ -183,9 +473,7 @@ class FileShareFunctions:
         try:
             if not recursive:
 
-                share_directory_client = self._get_directory_client(share_name, directory_path)
-
-                share_directory_client.create_directory()
+                self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, directory_path).create_directory())
 
                 return True
 
@@ -195,14 +483,12 @@ class FileShareFunctions:
                 directories = directory_path.split("/")
                 path = directories[0]
 
-                share_directory_client = self._get_directory_client(share_name, path)
-                share_directory_client.create_directory()
+                self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, path).create_directory())
 
                 for directory in directories[1:]:
                     path = f"{path}/{directory}"
                     
-                    share_directory_client = self._get_directory_client(share_name, path)
-                    share_directory_client.create_directory()
+                    self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, path).create_directory())
                 
                 return True
 
@@ -224,10 +510,12 @@ class FileShareFunctions:
             timeout (int, optional): server timeout expressed in seconds. Defaults to 10
         """
 
-        try:
-            share_client = self._get_share_client(share_name=share_name)
+        from azure.storage.fileshare import ShareAccessTier
 
-            share_client = share_client.create_share(quota=quota, access_tier=ShareAccessTier(access_tier), timeout=timeout, metadata=metadata)
+        try:
+            share_client = self.__run_with_key_refresh(
+                lambda: self._get_share_client(share_name=share_name).create_share(quota=quota, access_tier=ShareAccessTier(access_tier),
+                                                                                   timeout=timeout, metadata=metadata))
 
             return share_client
         
@@ -327,46 +615,37 @@ class FileShareFunctions:
 
             return status
     
-    def delete_directory(self, share_name, directory_name, recursive=False, delete_files=False, timeout=10):
+    def delete_directory(self, share_name, directory_name, recursive=False, delete_files=False, timeout=10, max_workers=16, include_directory=False,
+                         return_report=False):
         """Deletes the specified empty directory. Note that the directory must be empty before it can be deleted.
         Attempting to delete directories that are not empty will fail.
         Can delete all folders below specified directory recursively
 
         Args:
             share_name (str): Name of existing share.
-            directory_name (str): Name of directory to delete, including the path to the parent directory.
-            timeout (int, optional): expressed in seconds. Defaults to 20.
+            directory_name (str, optional): Name of directory to delete, including the path to the parent directory.
+            recursive (bool, optional): True will delete all directories below directory_name, deepest first. Defaults to False.
+            delete_files (bool, optional): True will delete all files found during a recursive deletion. Defaults to False.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+            max_workers (int, optional): Number of concurrent deletions during a recursive deletion. Defaults to 16.
+            include_directory (bool, optional): True will also delete directory_name itself once a recursive deletion has emptied it. The root of a share is never deleted. Defaults to False.
+            return_report (bool, optional): True returns an OperationReport of a recursive deletion, rather than raising if anything could not be deleted. Defaults to False.
 
         Returns:
-            bool: True if directory is deleted, False otherwise
+            bool or OperationReport: True if everything is deleted. With return_report a recursive deletion returns an OperationReport, which is truthy if everything was deleted
         """
 
         try:
             if recursive:
 
-                self.files = []
-                self.directories = []
+                report = self.__delete_tree(share_name, directory_name, delete_files=delete_files, delete_directories=True, include_root=include_directory,
+                                            max_workers=max_workers, timeout=timeout)
 
-                self.__recursively_generate_list_of_files_and_dirs(share_name, directory_name)
-                
-                if delete_files:
-
-                    for file in self.files:
-
-                        self.delete_file(share_name=share_name, file_path=file)
-
-                
-                for directory in self.directories:
-
-                    directory_client = self._get_directory_client(share_name, directory)
-                    directory_client.delete_directory(timeout=timeout)
-                
-                return True
+                return self.__report_or_raise(report, return_report)
             
             elif not recursive:
 
-                directory_client = self._get_directory_client(share_name, directory_name)
-                directory_client.delete_directory(timeout=timeout)
+                self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, directory_name).delete_directory(timeout=timeout))
 
                 return True
 
@@ -387,8 +666,7 @@ class FileShareFunctions:
 
         try:
 
-            share_file_client = self._get_share_file_client(share_name, file_path)
-            share_file_client.delete_file()
+            self.__run_with_key_refresh(lambda: self._get_share_file_client(share_name, file_path).delete_file())
 
             return True
 
@@ -398,46 +676,43 @@ class FileShareFunctions:
 
             return status
 
-    def delete_files(self, share_name, directory_name, file_names, recursive=False, delete_directory=True):
-        """Deletes multiple files. If recursive is selected then all files within the specified directory and below will be deleted,
-        default behaviour for recursive deletion is for directories to also be removed, can be controlled with delete_directories.
+    def delete_files(self, share_name, directory_name, file_names, recursive=False, delete_directory=True, max_workers=16, timeout=10, return_report=False):
+        """Deletes multiple files concurrently. If recursive is selected then all files within the specified directory and below will be deleted,
+        default behaviour for recursive deletion is for directories to also be removed, can be controlled with delete_directory.
 
         Args:
             share_name ([str]): Name of the share
-            file_names (list)
+            directory_name (str): Directory containing the files
+            file_names (list): Names of files within directory_name to delete. Ignored if recursive is True
             recursive (bool, optional): True will recursively delete all files and folders below parent directory. Defaults to False.
-            delete_directory(bool, optional): True will delete folders during a recursive deletion. Defaults to False
+            delete_directory(bool, optional): True will delete folders below directory_name during a recursive deletion, deepest first. Defaults to True
+            max_workers (int, optional): Number of concurrent deletions. Defaults to 16.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+            return_report (bool, optional): True returns an OperationReport, rather than raising if anything could not be deleted. Defaults to False.
+
+        Returns:
+            bool or OperationReport: True if everything is deleted. With return_report an OperationReport, truthy if everything was deleted
         """
 
         try:
 
             if recursive:
 
-                self.files = []
-                self.directories = []
-
-                self.__recursively_generate_list_of_files_and_dirs(share_name, directory_name)
-
-                for file in self.files:
-                    self.delete_file(share_name=share_name, file_path=file)
-                
-                if delete_directory:
+                report = self.__delete_tree(share_name, directory_name, delete_files=True, delete_directories=delete_directory, include_root=False,
+                                            max_workers=max_workers, timeout=timeout)
 
-                    for directory in self.directories:
-
-                        self.delete_directory(share_name=share_name, directory_name=directory)
-                
-                return True
+                return self.__report_or_raise(report, return_report)
 
             elif not recursive:
-                
-                for file in file_names:
 
-                    file_path = f"{directory_name}/{file}"
+                report = OperationReport()
 
-                    self.delete_file(share_name=share_name, file_path=file_path)
+                file_paths = (f"{directory_name}/{file}" for file in file_names)
 
-                return True
+                for result in run_bounded(lambda file_path: self.__delete_item(share_name, file_path, False, timeout), file_paths, max_workers):
+                    report.add(result)
+
+                return self.__report_or_raise(report.finish(), return_report)
 
             else:
 
@@ -449,25 +724,91 @@ class FileShareFunctions:
 
             return status
 
-    def __recursively_generate_list_of_files_and_dirs(self, share_name, directory_name):
+    def __delete_tree(self, share_name, directory_name, delete_files, delete_directories, include_root, max_workers, timeout):
+        """Deletes the contents of a directory
 
-        files_and_dirs = self.list_directories_and_files(share_name, directory_name)
+        Files are deleted concurrently while the tree is still being walked. Directories are then deleted in waves, deepest
+        first, so every directory is empty by the time its deletion is attempted. Each wave deletes directories concurrently.
+        A directory that can't be listed raises, so a deletion never works from part of the tree.
 
-        for file in files_and_dirs:
-            
-            if file['is_directory']:
-                
-                sub_dir = f"{directory_name}/{file['name']}"
+        Returns:
+            OperationReport: result for every file and directory, detail is "file" or "directory"
+        """
+
+        report = OperationReport()
+        directories = []
+        root = directory_name.strip("/")
+
+        def files():
+            for entry in self.__walk(share_name, self.__list_directory(share_name, root, timeout), max_workers, timeout):
+
+                if entry.is_directory:
+                    directories.append(entry.path)
 
-                self.directories.append(sub_dir)
+                elif delete_files:
+                    yield entry.path
 
-                self.__recursively_generate_list_of_files_and_dirs(share_name, directory_name=sub_dir)
+        for result in run_bounded(lambda file_path: self.__delete_item(share_name, file_path, False, timeout), files(), max_workers):
+            report.add(result)
 
-            elif not file['is_directory']:
+        if include_root and root:
+            directories.append(root)
 
-                file_path = f"{directory_name}/{file['name']}"
+        if delete_directories:
 
-                self.files.append(file_path)
+            waves = {}
+
+            for directory in directories:
+                waves.setdefault(directory.count("/"), []).append(directory)
+
+            for depth in sorted(waves, reverse=True):
+
+                for result in run_bounded(lambda path: self.__delete_item(share_name, path, True, timeout), waves[depth], max_workers):
+                    report.add(result)
+
+        return report.finish()
+
+    @staticmethod
+    def __report_or_raise(report, return_report):
+        """Returns report if return_report is True. Otherwise returns True if everything was deleted, and raises if not
+
+        Returns:
+            bool or OperationReport
+        """
+
+        if return_report:
+            return report
+
+        if not report:
+
+            failed = report.failed
+            path, error = next(iter(failed.items()))
+
+            raise FileShareFunctionsError(f"Failed to delete {len(failed)} of {len(report)} items, including {path}: {error}")
+
+        return True
+
+    def __delete_item(self, share_name, path, is_directory, timeout):
+        """Deletes one file or empty directory, capturing any failure
+
+        Returns:
+            ItemResult
+        """
+
+        try:
+
+            if is_directory:
+                self.__run_with_key_refresh(lambda: self._get_directory_client(share_name, path).delete_directory(timeout=timeout))
+
+                return ItemResult(path, True, detail="directory")
+
+            self.__run_with_key_refresh(lambda: self._get_share_file_client(share_name, path).delete_file(timeout=timeout))
+
+            return ItemResult(path, True, detail="file")
+
+        except Exception as e:
+
+            return ItemResult(path, False, error=str(e), detail="directory" if is_directory else "file")
 
     def delete_share(self, share_name, timeout=10, delete_snapshots=None):
         """Marks the specified share for deletion. If the share does not exist, the operation fails on the service
@@ -485,8 +826,8 @@ class FileShareFunctions:
         """
         try:
 
-            share_service_client = self._create_share_service_client()
-            share_service_client.delete_share(share_name, timeout=timeout, delete_snapshots=delete_snapshots)
+            self.__run_with_key_refresh(
+                lambda: self._create_share_service_client().delete_share(share_name, timeout=timeout, delete_snapshots=delete_snapshots))
 
             return True
         
@@ -496,10 +837,124 @@ class FileShareFunctions:
 
             return status
 
+    def download_to_path(self, share_name, file_path, local_path, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4, resumable=False, progress_path=None):
+        """Downloads a file to a local file using parallel ranged GETs
+
+        The local file is preallocated and memory mapped, and each range is written straight into place, so memory use stays
+        bounded for very large files. Every range is checked against the ETag the file had when the download started, so if
+        the file is modified part way the download fails rather than mixing versions.
+
+        If resumable, a bitmap of the ranges written is kept in a progress file beside local_path, and a failed download
+        leaves both in place. Calling download_to_path again then only fetches the missing ranges, provided the file still
+        has the same ETag. Otherwise the download starts again.
+
+        Args:
+            share_name (str): Name of the share the file is in
+            file_path (str): Path of the file in the share
+            local_path (str): Local path to download to. Overwritten if it exists
+            chunk_size (int, optional): Size in bytes of each ranged request. Defaults to 4MiB
+            max_workers (int, optional): Number of ranged requests in flight at once. Defaults to 4
+            resumable (bool, optional): Whether to keep progress so a failed download can be resumed. Defaults to False
+            progress_path (str, optional): Path of the progress file. Defaults to local_path followed by ".progress"
+
+        Returns:
+            True if the file is downloaded
+        """
+
+        try:
+
+            read_range, properties = self.__ranged_reader(share_name, file_path)
+
+            if resumable:
+
+                download = {"account": self.storage_account_name, "share": share_name, "file": file_path, "etag": properties.etag}
+
+                download_resumable(read_range, properties.size, local_path, download, chunk_size=chunk_size, max_workers=max_workers,
+                                   progress_path=progress_path)
+
+                return True
+
+            try:
+                download_ranges_to_path(read_range, properties.size, local_path, chunk_size=chunk_size, max_workers=max_workers)
+
+            except Exception:
+
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+
+                raise
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __ranged_reader(self, share_name, file_path):
+        """
+        Reads the properties of a file and returns a function that downloads ranges of that version of it. Files have no
+        conditional GET, so each range fails if the ETag it was read with differs
+
+        return tuple: read_range(offset, length, stream) function and FileProperties
+        """
+
+        properties = self.__run_with_key_refresh(lambda: self._get_share_file_client(share_name, file_path).get_file_properties())
+
+        def read_range(offset, length, stream):
+            start = stream.tell()
+
+            def attempt():
+                stream.seek(start)
+
+                downloader = self._get_share_file_client(share_name, file_path).download_file(offset=offset, length=length, max_concurrency=1)
+
+                if downloader.properties.etag != properties.etag:
+                    raise FileShareFunctionsError(f"{file_path} was modified during the download")
+
+                return downloader.readinto(stream)
+
+            read = self.__run_with_key_refresh(attempt)
+
+            self.metrics.transferred("file", "download", read)
+
+            return read
+
+        return read_range, properties
+
+    def get_file_url(self, share_name, file_path, sas_duration=timedelta(hours=24)):
+        """Returns the url of a file, authenticated with a read only SAS of its own so it can be used as the source of a copy
+
+        Args:
+            share_name (str): Name of existing share
+            file_path (str): Path of the file
+            sas_duration (timedelta, optional): How long the url can be used for, which should cover the longest copy. Defaults to 24 hours
+
+        Returns:
+            str: url including SAS token
+        """
+        try:
+
+            if self.backend is not None:
+                return self._get_share_file_client(share_name, file_path).url
+
+            sas_token = self.__generate_file_read_sas(share_name, file_path, sas_duration)
+
+            return f"{self.account_url}{share_name}/{quote(file_path.strip('/'), safe='/~')}?{sas_token}"
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
     def list_directories_and_files(self, share_name, directory_name="", name_starts_with="", marker="", timeout=10):
-        """Returns a generator to list the directories and files under the specified share.
-        The generator will lazily follow the continuation tokens returned by the service and stop when all directories
-        and files have been returned or num_results is reached.
+        """Returns an iterator to list the directories and files under the specified share.
+        The iterator will lazily follow the continuation tokens returned by the service and stop when all directories
+        and files have been returned or num_results is reached. As with the ItemPaged returned by the azure sdk, by_page()
+        iterates pages and can start from a continuation token.
+        Each page is fetched under the retry policy, and a page that fails to be fetched raises FileShareFunctionsError from the iterator.
 
         Args:
             share_name (str): Name of existing share.
@@ -510,15 +965,14 @@ class FileShareFunctions:
             
 
         Returns:
-            Generator
+            RetryingPaged: an ItemPaged of the directories and files
         """
         try:
 
             directory_client = self._get_directory_client(share_name=share_name, directory_path=directory_name)
 
-            list_of_directories_and_files = directory_client.list_directories_and_files()
-
-            return list_of_directories_and_files
+            return RetryingPaged(directory_client.list_directories_and_files(), self.retry_policy, self.storage_account_name,
+                                 self.__listing_error(sys._getframe().f_code.co_name))
 
         except Exception as e:
             
@@ -542,9 +996,7 @@ class FileShareFunctions:
         """
         try:
 
-            share_service_client = self._create_share_service_client()
-            shares = share_service_client.list_shares()
-            share_list = list(shares)
+            share_list = self.__run_with_key_refresh(lambda: list(self._create_share_service_client().list_shares()))
 
             return share_list
 
@@ -574,8 +1026,12 @@ class FileShareFunctions:
 
         try:
 
-            share_directory_client = self._get_directory_client(share_name, directory_path)
-            share_file_client = share_directory_client.upload_file(file_name=file_name, data=data, metadata=metadata, length=length)
+            share_file_client = self.__run_upload(
+                lambda: self._get_directory_client(share_name, directory_path).upload_file(file_name=file_name, data=data, metadata=metadata, length=length),
+                data)
+
+            if length is not None or isinstance(data, (str, bytes)):
+                self.metrics.transferred("file", "upload", length if length is not None else len(data))
 
             return share_file_client
 
@@ -584,3 +1040,123 @@ class FileShareFunctions:
             status = self.__handle_errors(sys._getframe().f_code.co_name, e)
 
             return status
+
+    def walk(self, share_name, directory_name="", max_workers=8, timeout=10):
+        """Lists every file and directory below a directory, yielding entries as they are found
+
+        Directories are listed breadth-first, with up to max_workers directories listed concurrently. The generator
+        lists directories as it is consumed, so the whole tree is never held in memory.
+
+        directory_name is listed straight away, so a walk that can't start fails like any other call. A directory below it
+        that fails to be listed raises FileShareFunctionsError from the generator, so a walk never ends early without an error.
+
+        Args:
+            share_name (str): Name of existing share.
+            directory_name (str, optional): Path of the directory to walk. Defaults to the root of the share.
+            max_workers (int, optional): Number of directories listed concurrently. Defaults to 8.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+
+        Returns:
+            Generator of WalkEntry(path, is_directory, size). path is relative to the root of the share, size is None for directories
+        """
+
+        try:
+
+            entries = self.__list_directory(share_name, directory_name.strip("/"), timeout)
+
+            return self.__iterate(sys._getframe().f_code.co_name, self.__walk(share_name, entries, max_workers, timeout))
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __walk(self, share_name, entries, max_workers, timeout):
+        """Yields entries, then everything below the directories among them. Listing errors are raised as they are
+
+        Returns:
+            generator: WalkEntry for each file and directory
+        """
+
+        directories = deque()
+
+        for entry in entries:
+
+            if entry.is_directory:
+                directories.append(entry.path)
+
+            yield entry
+
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storagewrapper-walk") as executor:
+
+            while directories or pending:
+
+                while directories and len(pending) < max_workers * 2:
+
+                    pending.add(executor.submit(self.__list_directory, share_name, directories.popleft(), timeout))
+
+                done, pending = concurrent.futures.wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+
+                    for entry in future.result():
+
+                        if entry.is_directory:
+                            directories.append(entry.path)
+
+                        yield entry
+
+    def __listing_error(self, func_name):
+        """Returns the wrap_error of a RetryingPaged listing. A page that fails to be fetched is raised as
+        FileShareFunctionsError, even if handle_exceptions is True, and counted as an error of func_name
+
+        Returns:
+            callable
+        """
+
+        def wrap_error(error):
+
+            self.metrics.error("fileshare", func_name)
+
+            return FileShareFunctionsError(f"{error} in {func_name}")
+
+        return wrap_error
+
+    def __iterate(self, func_name, iterator):
+        """Yields everything from iterator, raising errors as FileShareFunctionsError. A generator can't report failure
+        through its return value, so they are raised even if handle_exceptions is True
+        """
+
+        try:
+            yield from iterator
+
+        except Exception as e:
+
+            raise FileShareFunctionsError(f"{e} in {func_name}") from e
+
+    def __list_directory(self, share_name, directory_name, timeout):
+        """Lists the immediate contents of one directory
+
+        Returns:
+            list: WalkEntry for each file and directory
+        """
+
+        items = self.__run_with_key_refresh(
+            lambda: list(self._get_directory_client(share_name, directory_name).list_directories_and_files(timeout=timeout)))
+
+        entries = []
+
+        for item in items:
+
+            path = f"{directory_name}/{item['name']}" if directory_name else item['name']
+
+            if item['is_directory']:
+                entries.append(WalkEntry(path, True, None))
+
+            else:
+                entries.append(WalkEntry(path, False, item['size']))
+
+        return entries
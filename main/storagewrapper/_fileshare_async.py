@@ -0,0 +1,666 @@
+from azure.core.exceptions import ClientAuthenticationError
+from azure.storage.fileshare import generate_account_sas, ResourceTypes, ShareAccessTier
+from azure.storage.fileshare.aio import ShareServiceClient, ShareClient
+from datetime import datetime
+from storagewrapper._clients import AsyncClientRegistry
+from storagewrapper._exceptions import FileShareFunctionsError, InitialisationError
+from storagewrapper._sas_cache import SasCache
+from storagewrapper._secrets import shared_secret_cache
+import asyncio
+import sys
+import time
+
+
+class AsyncFileShareFunctions:
+    """
+        Initialiser for AsyncFileShareFunctions class obj
+
+        Has the same methods as FileShareFunctions, each of which must be awaited. Built on the azure.storage.fileshare.aio
+        clients so thousands of operations can run concurrently on one event loop. Requires aiohttp to be installed.
+
+        For authentication requirements to be met one of the following two configurations must be provided
+
+        1. A Storage Account Access Key is provided during initialisation
+        2. An AuthenticateFunctions authenticator, along with a key vault url and secret name. The storage account access key must be stored as a secret in this key vault
+
+        Args:
+            storage_account_name (str): Name of the storage account
+            authenticator (AuthenticateFunctions): Its async_token is used to access key vault
+            storage_account_access_key (str, optional): Access key that will authenticate operations of this library
+            vault_url (str, optional): URL of key vault in which account access key is stored
+            secret_name (str, optional): Name of the access key secret which is stored in key vault
+            sas_cache (SasCache, optional): Cache of account SAS tokens. Can be shared with sync FileShareFunctions. Defaults to a new SasCache per instance.
+            client_registry (AsyncClientRegistry, optional): Pool of long lived async clients sharing one aiohttp session. Defaults to a new AsyncClientRegistry per instance.
+            secret_cache (SecretCache, optional): Cache of key vault secrets. Defaults to a cache shared by every wrapper in the process.
+    """
+
+    def __init__(self, storage_account_name, authenticator, storage_account_access_key=None, vault_url=None, secret_name=None, handle_exceptions=False,
+                 sas_cache=None, client_registry=None, secret_cache=None):
+        self.storage_account_name = storage_account_name
+        self.authenticator = authenticator
+        self.sas_duration = self.authenticator.sas_duration
+        self.token = self.authenticator.async_token
+        self.sas_permissions = self.authenticator.fileshare_sas_permissions
+        self.storage_account_access_key = storage_account_access_key
+        self.vault_url = vault_url
+        self.secret_name = secret_name
+        self.sas_cache = sas_cache if sas_cache is not None else SasCache()
+        self.client_registry = client_registry if client_registry is not None else AsyncClientRegistry()
+        self.secret_cache = secret_cache if secret_cache is not None else shared_secret_cache
+        self.account_url = f"https://{self.storage_account_name}.file.core.windows.net/"
+
+        self.handle_exceptions = handle_exceptions
+
+    def __str__(self):
+        return f"Async functions for operating fileshare storage within storage account:'{self.storage_account_name}'"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes pooled clients and their shared connection pool
+        """
+
+        await self.client_registry.close()
+
+    def __handle_errors(self, func_name, error, exception_type=None):
+
+        error_message = f"{error} in {func_name}"
+
+        if self.handle_exceptions:
+
+            return False
+
+        elif not self.handle_exceptions:
+
+            self.__raise_exceptions(message=error_message, exception_type=exception_type)
+
+    def __raise_exceptions(self, message, exception_type):
+
+        if exception_type is None:
+
+            raise FileShareFunctionsError(message)
+
+        else:
+            raise exception_type(message)
+
+    async def _create_sas_for_fileshare(self):
+        """
+        Generates sas key for fileshare, cached until shortly before it expires
+        """
+
+        fs_sas_token = await self.sas_cache.get_async(self.__sas_cache_key(), self.__generate_account_sas)
+
+        return fs_sas_token
+
+    def __sas_cache_key(self):
+
+        return ("AccountSas", self.storage_account_name, str(self.sas_permissions))
+
+    async def __generate_account_sas(self):
+
+        if self.storage_account_access_key is None:
+            account_key = await self.__get_secret()
+
+        else:
+            account_key = self.storage_account_access_key
+
+        expiry = datetime.utcnow() + self.sas_duration
+
+        fs_sas_token = generate_account_sas(
+            account_name=self.storage_account_name,
+            account_key=account_key,
+            resource_types=ResourceTypes(service=True, container=True, object=True),
+            permission=self.sas_permissions,
+            expiry=expiry
+        )
+
+        return fs_sas_token, expiry
+
+    async def __get_secret(self):
+        """
+        Retrieves storage acct access key from key vault
+
+        return secret
+        """
+        if self.vault_url is None:
+
+            self.__handle_errors("init", error="vault_url not initialised", exception_type=InitialisationError)
+
+        if self.secret_name is None:
+
+            self.__handle_errors("init", error="secret_name not initialised", exception_type=InitialisationError)
+
+        secret = await self.secret_cache.get_async(self.vault_url, self.secret_name, self.token)
+
+        return secret
+
+    async def __run_with_key_refresh(self, operation):
+        """
+        Awaits operation. If storage rejects the SAS because the access key held in key vault has been rotated,
+        the key is fetched again and operation is retried once.
+        """
+
+        started = time.monotonic()
+
+        try:
+            return await operation()
+
+        except ClientAuthenticationError:
+
+            if self.storage_account_access_key is not None:
+                raise
+
+            self.secret_cache.invalidate(self.vault_url, self.secret_name, fetched_before=started)
+            self.sas_cache.invalidate(self.__sas_cache_key())
+
+            return await operation()
+
+    async def _create_share_service_client(self):
+
+        sas_token = await self._create_sas_for_fileshare()
+
+        share_service_client = self.client_registry.get(
+            ("file", self.storage_account_name),
+            lambda transport: ShareServiceClient(account_url=self.account_url, credential=sas_token, transport=transport),
+            credential=sas_token)
+
+        return share_service_client
+
+    async def _get_share_client(self, share_name):
+        fs_sas = await self._create_sas_for_fileshare()
+
+        share_client = self.client_registry.get(
+            ("file", self.storage_account_name, share_name),
+            lambda transport: ShareClient(account_url=self.account_url, share_name=share_name, credential=fs_sas, transport=transport),
+            credential=fs_sas)
+
+        return share_client
+
+    async def _get_directory_client(self, share_name, directory_path):
+        share_client = await self._get_share_client(share_name)
+
+        return share_client.get_directory_client(directory_path=directory_path)
+
+    async def _get_share_file_client(self, share_name, file_path):
+        share_client = await self._get_share_client(share_name)
+
+        return share_client.get_file_client(file_path)
+
+    def invalidate_clients(self):
+        """
+        Drops pooled clients and cached SAS tokens so they are rebuilt with fresh credentials, eg after an access key has been rotated
+        """
+
+        self.token = self.authenticator.async_token
+        self.sas_cache.invalidate()
+        self.client_registry.invalidate(("file", self.storage_account_name))
+
+    async def copy_file(self, share_name, file_path, source_url):
+        """
+        Copies a file from a url to file share destination
+
+        Args:
+            share_name (str): share must exist
+            file_path (str): full file path
+            source_url (str): source url of file to be copied. May need to authenticate url with sas if in azure storage
+
+        Returns:
+            FileProperties Class Obj
+        """
+        try:
+            async def copy():
+                share_file_client = await self._get_share_file_client(share_name, file_path)
+
+                await share_file_client.start_copy_from_url(source_url)
+
+                return await share_file_client.get_file_properties(timeout=10)
+
+            file_properties = await self.__run_with_key_refresh(copy)
+
+            return file_properties
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_fileshare_directory(self, share_name, directory_path, recursive=False):
+        """Creates a new directory under the directory referenced by the client..
+
+        Args:
+            share_name (str): Name of existing share.
+            directory_path (str): Name of directory to create, including the path to the parent directory
+
+        Returns:
+            True if successful.
+        """
+        try:
+            if not recursive:
+
+                paths = [directory_path]
+
+            elif recursive:
+
+                directories = directory_path.split("/")
+                paths = ["/".join(directories[:depth]) for depth in range(1, len(directories) + 1)]
+
+            for path in paths:
+
+                async def create():
+                    directory_client = await self._get_directory_client(share_name, path)
+
+                    return await directory_client.create_directory()
+
+                await self.__run_with_key_refresh(create)
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_share(self, share_name, quota=1, access_tier="Hot", metadata=None, timeout=10):
+        """
+        Creates a file share within the initiated storage account
+
+        Args:
+            share_name (str): Name of share to be created
+            quota (int, optional): Volume of file share being created in bytes. Defaults to 1073741824 (1Gb)
+            access_tier (str, optional): Either "Hot", "TransactionOptimized" or "Cool". Defaults to Hot.
+            metadata (dict, optional): Name-value pairs associated with the share as metadata. Defaults to None
+            timeout (int, optional): server timeout expressed in seconds. Defaults to 10
+        """
+
+        try:
+            async def create():
+                share_client = await self._get_share_client(share_name=share_name)
+
+                return await share_client.create_share(quota=quota, access_tier=ShareAccessTier(access_tier), timeout=timeout, metadata=metadata)
+
+            share_client = await self.__run_with_key_refresh(create)
+
+            return share_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_share_client(self, share_name):
+        """
+        For operations not supported by the storage wrapper this method will create an async share client.
+
+            Args:
+                share_name (str): name of share
+
+            Returns:
+                aio ShareClient class obj
+        """
+        try:
+            share_client = await self._get_share_client(share_name)
+
+            return share_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_share_directory_client(self, share_name, directory):
+        """
+        For operations not supported by the storage wrapper this method will create an async share directory client.
+
+            Args:
+                share_name (str): name of share in which directory resides
+                directory (str): directory name within share
+
+            Returns:
+                aio ShareDirectoryClient class obj
+        """
+        try:
+            share_directory_client = await self._get_directory_client(share_name, directory)
+
+            return share_directory_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_share_file_client(self, share_name, file_path):
+        """
+        For operations not supported by the storage wrapper this method will create an async share file client.
+
+            Args:
+                share_name (str): name of share in which file resides
+                file_path (str): path of file within share
+
+            Returns:
+                aio ShareFileClient class obj
+        """
+        try:
+
+            share_file_client = await self._get_share_file_client(share_name, file_path)
+
+            return share_file_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_share_service_client(self):
+        """
+        For operations not supported by the storage wrapper this method will create an async share service client.
+
+            Returns:
+                aio ShareServiceClient class obj
+        """
+
+        try:
+
+            share_service_client = await self._create_share_service_client()
+            return share_service_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_directory(self, share_name, directory_name, recursive=False, delete_files=False, timeout=10):
+        """Deletes the specified empty directory. Note that the directory must be empty before it can be deleted.
+        Can delete all folders below specified directory recursively, in which case files are deleted concurrently
+        and directories are deleted deepest first
+
+        Args:
+            share_name (str): Name of existing share.
+            directory_name (str): Name of directory to delete, including the path to the parent directory.
+            recursive (bool, optional): delete all directories below directory_name. Defaults to False
+            delete_files (bool, optional): delete files found during a recursive deletion. Defaults to False
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+
+        Returns:
+            bool: True if directory is deleted, False otherwise
+        """
+
+        try:
+            if recursive:
+
+                files, directories = await self.__list_files_and_dirs(share_name, directory_name)
+
+                if delete_files:
+
+                    await asyncio.gather(*[self.__delete_file(share_name, file) for file in files])
+
+                for directory in sorted(directories, key=lambda path: path.count("/"), reverse=True):
+
+                    await self.__delete_directory(share_name, directory, timeout)
+
+                return True
+
+            elif not recursive:
+
+                await self.__delete_directory(share_name, directory_name, timeout)
+
+                return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def __delete_directory(self, share_name, directory_name, timeout):
+
+        async def delete():
+            directory_client = await self._get_directory_client(share_name, directory_name)
+
+            return await directory_client.delete_directory(timeout=timeout)
+
+        await self.__run_with_key_refresh(delete)
+
+    async def __delete_file(self, share_name, file_path):
+
+        async def delete():
+            share_file_client = await self._get_share_file_client(share_name, file_path)
+
+            return await share_file_client.delete_file()
+
+        await self.__run_with_key_refresh(delete)
+
+    async def delete_file(self, share_name, file_path):
+        """Marks the specified file for deletion. The file is later deleted during garbage collection.
+
+        Args:
+            share_name (str): Name of existing share
+            file_path (str): Name of existing file and path.
+        """
+
+        try:
+
+            await self.__delete_file(share_name, file_path)
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_files(self, share_name, directory_name, file_names, recursive=False, delete_directory=True):
+        """Deletes multiple files concurrently. If recursive is selected then all files within the specified directory and below will be deleted,
+        default behaviour for recursive deletion is for directories to also be removed, can be controlled with delete_directory.
+
+        Args:
+            share_name (str): Name of the share
+            directory_name (str): Directory containing the files
+            file_names (list)
+            recursive (bool, optional): True will recursively delete all files and folders below parent directory. Defaults to False.
+            delete_directory(bool, optional): True will delete folders during a recursive deletion. Defaults to True
+        """
+
+        try:
+
+            if recursive:
+
+                files, directories = await self.__list_files_and_dirs(share_name, directory_name)
+
+                await asyncio.gather(*[self.__delete_file(share_name, file) for file in files])
+
+                if delete_directory:
+
+                    for directory in sorted(directories, key=lambda path: path.count("/"), reverse=True):
+
+                        await self.__delete_directory(share_name, directory, timeout=10)
+
+                return True
+
+            elif not recursive:
+
+                await asyncio.gather(*[self.__delete_file(share_name, f"{directory_name}/{file}") for file in file_names])
+
+                return True
+
+            else:
+
+                raise FileShareFunctionsError("Recursive argument not recognised")
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def __list_files_and_dirs(self, share_name, directory_name):
+        """
+        Lists every file and directory below directory_name, listing each level of the tree concurrently
+
+        return tuple: list of file paths and list of directory paths
+        """
+
+        files = []
+        directories = []
+        level = [directory_name]
+
+        while level:
+
+            listings = await asyncio.gather(*[self.__list_directory(share_name, directory) for directory in level])
+
+            level = []
+
+            for parent, entries in listings:
+
+                for entry in entries:
+
+                    path = f"{parent}/{entry['name']}"
+
+                    if entry['is_directory']:
+
+                        directories.append(path)
+                        level.append(path)
+
+                    else:
+
+                        files.append(path)
+
+        return files, directories
+
+    async def __list_directory(self, share_name, directory_name):
+
+        directory_client = await self._get_directory_client(share_name, directory_name)
+
+        entries = [entry async for entry in directory_client.list_directories_and_files()]
+
+        return directory_name, entries
+
+    async def delete_share(self, share_name, timeout=10, delete_snapshots=None):
+        """Marks the specified share for deletion. If the share does not exist, the operation fails on the service
+
+        Args:
+            share_name (str): Name of share
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+            delete_snapshots (DeleteSnapshot, optional): To delete a share that has snapshots, this must be specified as DeleteSnapshot.Include. Defaults to None.
+
+        Returns:
+            bool: True if share is deleted, False share doesn't exist.
+        """
+        try:
+
+            async def delete():
+                share_service_client = await self._create_share_service_client()
+
+                return await share_service_client.delete_share(share_name, timeout=timeout, delete_snapshots=delete_snapshots)
+
+            await self.__run_with_key_refresh(delete)
+
+            return True
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def list_directories_and_files(self, share_name, directory_name="", name_starts_with="", marker="", timeout=10):
+        """Returns an async generator to list the directories and files under the specified share. Iterate it with async for
+
+        Args:
+            share_name (str): Name of existing share.
+            directory_name (str): The path to the directory.
+            name_starts_with (str, optional): list only the files and/or directories with the given prefix. Defaults to None.
+            marker (str, optional): An opaque continuation token.
+            timeout (int, optional): expressed in seconds. Defaults to 10.
+
+        Returns:
+            AsyncItemPaged
+        """
+        try:
+
+            directory_client = await self._get_directory_client(share_name=share_name, directory_path=directory_name)
+
+            list_of_directories_and_files = directory_client.list_directories_and_files()
+
+            return list_of_directories_and_files
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def list_shares(self, name_starts_with="", include_metadata=False, include_snapshots=False, timeout=10):
+        """
+        Returns list of shares in storage account
+
+        Args:
+            name_starts_with (str, optional): Filters the results to return only shares whose names begin with the specified name_starts_with.
+            include_metadata (bool, optional): Specifies that share metadata be returned in the response. Defaults to ""
+            include_snapshots (bool, optional): Specifies that share snapshot be returned in the response. Defaults to False
+            timeout (int, optional): Timeout in seconds, defaults to 10
+
+        Returns:
+            List
+        """
+        try:
+
+            async def list_shares():
+                share_service_client = await self._create_share_service_client()
+
+                return [share async for share in share_service_client.list_shares()]
+
+            share_list = await self.__run_with_key_refresh(list_shares)
+
+            return share_list
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def upload_file(self, share_name, directory_path, file_name, data, metadata=None, length=None, max_concurrency=None):
+        """
+        Uploads a file to a file share
+
+        Args:
+            share_name (str): Name of the share to upload data to
+            directory_path (str): Path on file share to store data
+            file_name (str): Target file name
+            data (str): Source of data
+            metadata (dict, optional): Name-value pairs associated with the file as metadata.
+            length (int, optional): Length of file in bytes (up to 1Tb)
+
+        Returns:
+            aio ShareFileClient class obj
+        """
+
+        try:
+
+            async def upload():
+                directory_client = await self._get_directory_client(share_name, directory_path)
+
+                return await directory_client.upload_file(file_name=file_name, data=data, metadata=metadata, length=length)
+
+            share_file_client = await self.__run_with_key_refresh(upload)
+
+            return share_file_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
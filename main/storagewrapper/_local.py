@@ -0,0 +1,148 @@
+from storagewrapper._exceptions import InvalidArguments
+from storagewrapper._local_common import resolve
+import os
+import tempfile
+import threading
+
+
+# Environment variables choosing the backend used by wrappers created without one
+BACKEND_VARIABLE = "STORAGEWRAPPER_BACKEND"
+ROOT_VARIABLE = "STORAGEWRAPPER_LOCAL_ROOT"
+
+
+class LocalBackend:
+    """
+    Keeps containers, shares and queues on local disk in place of a storage account, for running pipelines and tests at disk speed without a network
+
+    Pass one to BlobFunctions, FileShareFunctions or QueueFunctions as backend, or select it without changing code by
+    setting the STORAGEWRAPPER_BACKEND environment variable to "local". The wrappers then get their clients from the
+    backend instead of from Azure, and every other part of them works as it does against storage.
+
+    Below root each storage account has a directory holding:
+
+    - blob/<container>/: a directory per container, with a file per blob and / in blob names mapped to subdirectories
+    - file/<share>/: a directory per share, holding its directories and files
+    - queue/<queue>/: a directory per queue, holding an append-only log of its messages
+
+    Blobs and files are written to a temporary file and renamed into place, so readers never see a partial write, and
+    are read through memory maps. ETags change on every write, so conditional requests, the disk cache and ranged
+    downloads behave as they do against storage. Queue messages honour visibility timeouts, time to live and pop
+    receipts, and one queue can be shared by several processes. Metadata, snapshots, leases and access tiers are not
+    kept, and copies complete before start_copy_from_url returns.
+
+    Any other object with the same client methods can be given as a backend. The local clients of a service are only
+    imported once a wrapper for it asks for one, so a queue-only program doesn't import the blob or file share sdks.
+
+    Args:
+        root (str): directory holding the storage accounts. Created as needed
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._message_logs = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"LocalBackend({self.root!r})"
+
+    def directory(self, storage_account_name, service, *names):
+        """
+        Returns the directory of a service of a storage account, eg directory("account", "blob")
+        """
+
+        return os.path.join(resolve(self.root, storage_account_name, "storage account"), service, *names)
+
+    def temporary_directory(self, storage_account_name):
+        """
+        Returns the directory writes are staged in before being renamed into place
+        """
+
+        return os.path.join(resolve(self.root, storage_account_name, "storage account"), ".tmp")
+
+    def blob_service_client(self, storage_account_name):
+
+        from storagewrapper._local_blob import LocalBlobServiceClient
+
+        return LocalBlobServiceClient(self, storage_account_name)
+
+    def container_client(self, storage_account_name, container_name):
+
+        from storagewrapper._local_blob import LocalContainerClient
+
+        return LocalContainerClient(self, storage_account_name, container_name)
+
+    def share_service_client(self, storage_account_name):
+
+        from storagewrapper._local_fileshare import LocalShareServiceClient
+
+        return LocalShareServiceClient(self, storage_account_name)
+
+    def share_client(self, storage_account_name, share_name):
+
+        from storagewrapper._local_fileshare import LocalShareClient
+
+        return LocalShareClient(self, storage_account_name, share_name)
+
+    def queue_service_client(self, storage_account_name):
+
+        from storagewrapper._local_queue import LocalQueueServiceClient
+
+        return LocalQueueServiceClient(self, storage_account_name)
+
+    def queue_client(self, storage_account_name, queue_name):
+
+        from storagewrapper._local_queue import LocalQueueClient
+
+        return LocalQueueClient(self, storage_account_name, queue_name)
+
+    def message_log(self, directory):
+        """
+        Returns the MessageLog of a queue, shared by every client of the queue in this process
+        """
+
+        from storagewrapper._local_queue import MessageLog
+
+        with self._lock:
+
+            message_log = self._message_logs.get(directory)
+
+            if message_log is None:
+                message_log = self._message_logs[directory] = MessageLog(directory)
+
+            return message_log
+
+
+_configured_backends = {}
+_configured_lock = threading.Lock()
+
+
+def configured_backend():
+    """
+    Returns the backend selected by the environment, used by wrappers created without one
+
+    STORAGEWRAPPER_BACKEND is either "azure", the default, or "local". A local backend keeps its data below
+    STORAGEWRAPPER_LOCAL_ROOT, which defaults to a storagewrapper directory in the system temporary directory. Every
+    wrapper configured for the same root shares one LocalBackend.
+
+    Returns:
+        LocalBackend or None for Azure
+    """
+
+    name = os.environ.get(BACKEND_VARIABLE, "").strip().lower()
+
+    if name in ("", "azure"):
+        return None
+
+    if name != "local":
+        raise InvalidArguments(f"{BACKEND_VARIABLE} must be azure or local, not {name}")
+
+    root = os.path.abspath(os.environ.get(ROOT_VARIABLE) or os.path.join(tempfile.gettempdir(), "storagewrapper"))
+
+    with _configured_lock:
+
+        backend = _configured_backends.get(root)
+
+        if backend is None:
+            backend = _configured_backends[root] = LocalBackend(root)
+
+        return backend
@@ -0,0 +1,514 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, BlobPrefix, BlobProperties, BlobType, BlockState, ContainerProperties, ContentSettings
+from collections import namedtuple
+from storagewrapper._local_common import (COPY_CHUNK_SIZE, etag_of, modified_of, open_download, open_url, paged, path_url, remove_empty_parents,
+                                          remove_tree, resolve, storage_error, write_atomically, write_data)
+import hashlib
+import os
+import shutil
+import uuid
+
+
+BatchResponse = namedtuple("BatchResponse", ["status_code", "reason", "headers"])
+
+
+class LocalBlobServiceClient:
+    """
+    Stands in for BlobServiceClient, keeping each container as a directory
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+    """
+
+    def __init__(self, backend, storage_account_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.directory = backend.directory(storage_account_name, "blob")
+        self.url = path_url(self.directory)
+
+    def get_container_client(self, container):
+
+        return LocalContainerClient(self.backend, self.account_name, getattr(container, "name", container))
+
+    def get_blob_client(self, container, blob):
+
+        return self.get_container_client(container).get_blob_client(blob)
+
+    def create_container(self, name, metadata=None, public_access=None, **kwargs):
+
+        container_client = self.get_container_client(name)
+        container_client.create_container(metadata=metadata, public_access=public_access)
+
+        return container_client
+
+    def delete_container(self, container, **kwargs):
+
+        self.get_container_client(container).delete_container()
+
+    def list_containers(self, name_starts_with=None, include_metadata=False, results_per_page=None, **kwargs):
+
+        def get_page(continuation_token):
+
+            try:
+                names = sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir())
+
+            except FileNotFoundError:
+                names = []
+
+            containers = []
+
+            for name in names:
+
+                if not name.startswith(name_starts_with or ""):
+                    continue
+
+                properties = ContainerProperties()
+                properties.name = name
+                properties.last_modified = modified_of(os.stat(os.path.join(self.directory, name)))
+
+                containers.append(properties)
+
+            return None, containers
+
+        return paged(get_page)
+
+
+class LocalContainerClient:
+    """
+    Stands in for ContainerClient. Blobs are files below the container's directory, with / in their names mapped to
+    subdirectories, so a blob can't share its name with a virtual directory as it can in blob storage. Staged blocks
+    are kept in a directory per blob below a blocks directory of the storage account until they are committed
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+        container_name (str): Name of the container
+    """
+
+    def __init__(self, backend, storage_account_name, container_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.container_name = container_name
+        self.directory = resolve(backend.directory(storage_account_name, "blob"), container_name, "container")
+        self.blocks_directory = resolve(backend.directory(storage_account_name, "blocks"), container_name, "container")
+        self.temporary_directory = backend.temporary_directory(storage_account_name)
+        self.url = path_url(self.directory)
+
+    def require(self):
+        """
+        Raises:
+            ResourceNotFoundError: if the container does not exist
+        """
+
+        if not os.path.isdir(self.directory):
+            raise storage_error(ResourceNotFoundError, 404, "ContainerNotFound", "The specified container does not exist.")
+
+    def get_blob_client(self, blob):
+
+        return LocalBlobClient(self, getattr(blob, "name", blob))
+
+    def exists(self, **kwargs):
+
+        return os.path.isdir(self.directory)
+
+    def create_container(self, metadata=None, public_access=None, **kwargs):
+
+        os.makedirs(os.path.dirname(self.directory), exist_ok=True)
+
+        try:
+            os.mkdir(self.directory)
+
+        except FileExistsError:
+            raise storage_error(ResourceExistsError, 409, "ContainerAlreadyExists", "The specified container already exists.")
+
+        return {"etag": etag_of(os.stat(self.directory)), "last_modified": modified_of(os.stat(self.directory))}
+
+    def delete_container(self, **kwargs):
+
+        self.require()
+
+        try:
+            remove_tree(self.temporary_directory, self.directory)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "ContainerNotFound", "The specified container does not exist.")
+
+        _discard_blocks(self.temporary_directory, self.blocks_directory)
+
+    def list_blobs(self, name_starts_with=None, include=None, results_per_page=None, **kwargs):
+
+        return self.__pages(name_starts_with or "", None, results_per_page)
+
+    def walk_blobs(self, name_starts_with=None, include=None, delimiter="/", results_per_page=None, **kwargs):
+
+        return self.__pages(name_starts_with or "", delimiter, results_per_page)
+
+    def delete_blob(self, blob, delete_snapshots=None, **kwargs):
+
+        self.get_blob_client(blob).delete_blob()
+
+    def delete_blobs(self, *blobs, delete_snapshots=None, raise_on_any_failure=True, **kwargs):
+        """
+        Deletes blobs one by one, returning a response for each as a batch request would
+        """
+
+        responses = []
+
+        for blob in blobs:
+
+            try:
+                self.get_blob_client(blob).delete_blob()
+
+                responses.append(BatchResponse(202, "Accepted", {}))
+
+            except HttpResponseError as e:
+                responses.append(BatchResponse(e.status_code, e.reason, {"x-ms-error-code": e.error_code}))
+
+        if raise_on_any_failure and any(response.status_code != 202 for response in responses):
+            raise HttpResponseError(message="There is a partial failure in the batch operation.")
+
+        return iter(responses)
+
+    def __pages(self, prefix, delimiter, results_per_page):
+        """
+        Lists blobs in pages of results_per_page, in name order as storage does. The continuation token is the last name of a page
+
+        Returns:
+            ItemPaged: of BlobProperties, and of BlobPrefix if delimiter is given
+        """
+
+        self.require()
+
+        page_size = results_per_page or 5000
+
+        def get_page(continuation_token):
+
+            items = []
+
+            for name, path, is_prefix in self.__listing(prefix, continuation_token or "", delimiter):
+
+                if len(items) == page_size:
+                    return items[-1].name, items
+
+                if is_prefix:
+                    items.append(BlobPrefix(None, prefix=name, container=self.container_name, delimiter=delimiter, results_per_page=results_per_page))
+
+                else:
+
+                    try:
+                        items.append(self.properties(name, os.stat(path)))
+
+                    except FileNotFoundError:
+                        continue
+
+            return None, items
+
+        return paged(get_page)
+
+    def __listing(self, prefix, marker, delimiter):
+        """
+        Yields (name, path, is_prefix) for every blob and virtual directory after marker whose name begins with prefix
+        """
+
+        head = prefix.rpartition("/")[0]
+        directory = resolve(self.directory, head) if head else self.directory
+        last = None
+
+        for name, path, is_prefix in _walk(directory, f"{head}/" if head else "", prefix, marker, delimiter == "/"):
+
+            if delimiter and not is_prefix:
+
+                index = name.find(delimiter, len(prefix))
+
+                if index >= 0:
+                    name, is_prefix = name[:index + len(delimiter)], True
+
+            if name == last or name <= marker:
+                continue
+
+            last = name
+
+            yield name, path, is_prefix
+
+    def properties(self, blob_name, stat):
+
+        properties = BlobProperties()
+        properties.name = blob_name
+        properties.container = self.container_name
+        properties.blob_type = BlobType.BLOCKBLOB
+        properties.size = stat.st_size
+        properties.etag = etag_of(stat)
+        properties.last_modified = modified_of(stat)
+        properties.creation_time = properties.last_modified
+        properties.content_settings = ContentSettings()
+
+        return properties
+
+
+def _walk(directory, base, prefix, marker, roll_up_directories):
+    """
+    Yields (name, path, is_prefix) for the files below directory in name order, skipping subtrees whose names all come
+    before marker. If roll_up_directories is True directories are yielded as prefixes rather than descended into
+    """
+
+    try:
+        entries = list(os.scandir(directory))
+
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+    keyed = []
+
+    for entry in entries:
+
+        if entry.is_dir(follow_symlinks=False):
+            keyed.append((f"{base}{entry.name}/", entry.path, True))
+
+        else:
+            keyed.append((base + entry.name, entry.path, False))
+
+    # Sorting directories by name + "/" makes a depth first walk yield names in the same order as sorting every name would
+    keyed.sort()
+
+    for key, path, is_directory in keyed:
+
+        if not is_directory:
+
+            if key.startswith(prefix):
+                yield key, path, False
+
+            continue
+
+        if not (key.startswith(prefix) or prefix.startswith(key)):
+            continue
+
+        if marker >= key and not marker.startswith(key):
+            continue
+
+        if roll_up_directories and key.startswith(prefix):
+            yield key, path, True
+
+        else:
+            yield from _walk(path, key, prefix, marker, roll_up_directories)
+
+
+class LocalBlobClient:
+    """
+    Stands in for BlobClient, keeping a blob as a file
+
+    Args:
+        container_client (LocalContainerClient): container of the blob
+        blob_name (str): Name of the blob
+    """
+
+    def __init__(self, container_client, blob_name):
+        self.container_client = container_client
+        self.container_name = container_client.container_name
+        self.blob_name = blob_name
+        self.path = resolve(container_client.directory, blob_name, "blob")
+        self.blocks_path = os.path.join(container_client.blocks_directory, hashlib.sha256(blob_name.encode("utf-8")).hexdigest())
+        self.url = path_url(self.path)
+
+    def exists(self, **kwargs):
+
+        return os.path.isfile(self.path)
+
+    def upload_blob(self, data, blob_type=BlobType.BLOCKBLOB, length=None, metadata=None, overwrite=False, content_settings=None, **kwargs):
+        """
+        Writes the blob to a temporary file and renames it into place, so readers see either the old or the new blob
+
+        Returns:
+            dict: etag and last_modified of the blob
+        """
+
+        self.container_client.require()
+
+        stat = self.__write(lambda file: write_data(file, data, length), overwrite)
+
+        return {"etag": etag_of(stat), "last_modified": modified_of(stat)}
+
+    def __write(self, write, overwrite):
+
+        for _ in range(3):
+
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+                return write_atomically(self.container_client.temporary_directory, self.path, write, overwrite=overwrite)
+
+            except FileExistsError:
+                raise storage_error(ResourceExistsError, 409, "BlobAlreadyExists", "The specified blob already exists.")
+
+            except FileNotFoundError:
+                # The virtual directory was removed by a concurrent delete of its last blob
+                self.container_client.require()
+
+            except (IsADirectoryError, NotADirectoryError):
+                raise storage_error(HttpResponseError, 409, "BlobNameConflict", f"{self.blob_name} conflicts with the name of a local directory or file")
+
+        raise storage_error(HttpResponseError, 409, "BlobNameConflict", f"{self.blob_name} could not be written")
+
+    def download_blob(self, offset=None, length=None, etag=None, match_condition=None, **kwargs):
+
+        self.container_client.require()
+
+        return open_download(self.path, "BlobNotFound", lambda stat: self.container_client.properties(self.blob_name, stat), offset=offset, length=length,
+                             etag=etag, match_condition=match_condition)
+
+    def get_blob_properties(self, **kwargs):
+
+        try:
+            stat = os.stat(self.path)
+
+        except (FileNotFoundError, NotADirectoryError):
+            self.container_client.require()
+
+            raise storage_error(ResourceNotFoundError, 404, "BlobNotFound", "The specified blob does not exist.")
+
+        if not os.path.isfile(self.path):
+            raise storage_error(ResourceNotFoundError, 404, "BlobNotFound", "The specified blob does not exist.")
+
+        properties = self.container_client.properties(self.blob_name, stat)
+        properties.copy.status = "success"
+
+        return properties
+
+    def delete_blob(self, delete_snapshots=None, **kwargs):
+
+        if not os.path.isfile(self.path):
+            self.container_client.require()
+
+            raise storage_error(ResourceNotFoundError, 404, "BlobNotFound", "The specified blob does not exist.")
+
+        try:
+            os.remove(self.path)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "BlobNotFound", "The specified blob does not exist.")
+
+        remove_empty_parents(self.path, self.container_client.directory)
+
+        _discard_blocks(self.container_client.temporary_directory, self.blocks_path)
+
+    def stage_block(self, block_id, data, length=None, **kwargs):
+        """
+        Keeps a block in a file named after its id until it is committed or the blob is deleted
+        """
+
+        self.container_client.require()
+
+        os.makedirs(self.blocks_path, exist_ok=True)
+
+        write_atomically(self.container_client.temporary_directory, self.__block_path(block_id), lambda file: write_data(file, data, length))
+
+    def get_block_list(self, block_list_type="committed", **kwargs):
+        """
+        Returns the staged blocks of the blob. Which blocks a committed blob was made of is not kept, so the committed
+        list is always empty
+
+        Returns:
+            tuple: (committed BlobBlocks, uncommitted BlobBlocks)
+        """
+
+        self.container_client.require()
+
+        try:
+            names = sorted(os.listdir(self.blocks_path))
+
+        except FileNotFoundError:
+            names = []
+
+        if not names and not os.path.isfile(self.path):
+            raise storage_error(ResourceNotFoundError, 404, "BlobNotFound", "The specified blob does not exist.")
+
+        uncommitted = []
+
+        if block_list_type in ("uncommitted", "all"):
+
+            for name in names:
+
+                block = BlobBlock(bytes.fromhex(name).decode("utf-8"), BlockState.UNCOMMITTED)
+                block.size = os.path.getsize(os.path.join(self.blocks_path, name))
+
+                uncommitted.append(block)
+
+        return [], uncommitted
+
+    def commit_block_list(self, block_list, content_settings=None, metadata=None, etag=None, match_condition=None, **kwargs):
+        """
+        Writes the blob from its staged blocks in the order given, then discards the staged blocks as storage does
+
+        Returns:
+            dict: etag and last_modified of the blob
+        """
+
+        self.container_client.require()
+
+        paths = [self.__block_path(getattr(block, "id", block)) for block in block_list]
+
+        if not all(os.path.isfile(path) for path in paths):
+            raise storage_error(HttpResponseError, 400, "InvalidBlockList", "The specified block list is invalid.")
+
+        if match_condition == MatchConditions.IfNotModified:
+
+            try:
+                current_etag = etag_of(os.stat(self.path))
+
+            except FileNotFoundError:
+                current_etag = None
+
+            if etag != current_etag:
+                raise storage_error(ResourceModifiedError, 412, "ConditionNotMet", "The condition specified using HTTP conditional header(s) is not met.")
+
+        def write(file):
+
+            for path in paths:
+
+                with open(path, "rb") as block:
+                    shutil.copyfileobj(block, file, COPY_CHUNK_SIZE)
+
+        stat = self.__write(write, match_condition != MatchConditions.IfMissing)
+
+        _discard_blocks(self.container_client.temporary_directory, self.blocks_path)
+
+        return {"etag": etag_of(stat), "last_modified": modified_of(stat)}
+
+    def __block_path(self, block_id):
+
+        return os.path.join(self.blocks_path, block_id.encode("utf-8").hex())
+
+    def start_copy_from_url(self, source_url, metadata=None, **kwargs):
+        """
+        Copies the source into the blob before returning, so the copy is never pending
+
+        Returns:
+            dict: copy_id and copy_status, which is always "success"
+        """
+
+        self.container_client.require()
+
+        try:
+            source = open_url(source_url)
+
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise storage_error(ResourceNotFoundError, 404, "CannotVerifyCopySource", "The specified resource does not exist.")
+
+        with source:
+            self.__write(lambda file: write_data(file, source), True)
+
+        return {"copy_id": uuid.uuid4().hex, "copy_status": "success"}
+
+    def abort_copy(self, copy_id, **kwargs):
+
+        raise storage_error(HttpResponseError, 409, "NoPendingCopyOperation", "There is currently no pending copy operation.")
+
+
+def _discard_blocks(temporary_directory, path):
+
+    try:
+        remove_tree(temporary_directory, path)
+
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,333 @@
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceModifiedError, ResourceNotFoundError, ResourceNotModifiedError
+from azure.core.paging import ItemPaged
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname, urlopen
+import mmap
+import os
+import uuid
+
+
+# Size of the pieces data is copied in when writing to or reading from local files
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def storage_error(error_type, status_code, error_code, message):
+    """
+    Creates an azure.core exception carrying the status and error code storage would have responded with, so wrapper
+    code handling errors from the service handles the same errors from local storage
+    """
+
+    error = error_type(message=f"{message}\nErrorCode:{error_code}")
+    error.status_code = status_code
+    error.error_code = error_code
+    error.reason = error_code
+
+    return error
+
+
+def resolve(directory, name, kind="resource"):
+    """
+    Returns the path of a /-separated name below directory, refusing names that would escape it
+
+    Raises:
+        HttpResponseError: 400 if name is empty or has empty, "." or ".." segments
+    """
+
+    parts = name.strip("/").split("/") if name else []
+
+    if not parts or any(part in ("", ".", "..") for part in parts) or "\\" in name or "\0" in name:
+        raise storage_error(HttpResponseError, 400, "InvalidResourceName", f"Invalid {kind} name: {name!r}")
+
+    return os.path.join(directory, *parts)
+
+
+def paged(get_page):
+    """
+    Wraps get_page(continuation_token) -> (next continuation_token or None, items) in an ItemPaged, as the sdk clients return
+    """
+
+    return ItemPaged(get_page, lambda page: page)
+
+
+def etag_of(stat):
+    """
+    Returns an ETag for a local file. Every write replaces the file, so its inode and modification time change with its content
+    """
+
+    return f'"0x{stat.st_mtime_ns:X}{stat.st_ino:X}{stat.st_size:X}"'
+
+
+def modified_of(stat):
+
+    return datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+def path_url(path):
+
+    return Path(path).as_uri()
+
+
+def open_url(url):
+    """
+    Opens the source of a copy for reading. file urls are read straight from disk, other urls are downloaded
+    """
+
+    parsed = urlparse(url)
+
+    if parsed.scheme == "file":
+        return open(url2pathname(parsed.path), "rb")
+
+    return urlopen(url)
+
+
+def write_data(file, data, length=None):
+    """
+    Writes data to file, where data is str, bytes, a file-like object or an iterable of chunks
+
+    Returns:
+        int: bytes written
+    """
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        file.write(data)
+
+        return len(data)
+
+    written = 0
+
+    if hasattr(data, "read"):
+
+        while length is None or written < length:
+
+            chunk = data.read(COPY_CHUNK_SIZE if length is None else min(COPY_CHUNK_SIZE, length - written))
+
+            if not chunk:
+                break
+
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+
+            file.write(chunk)
+            written += len(chunk)
+
+        return written
+
+    for chunk in data:
+
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+
+        file.write(chunk)
+        written += len(chunk)
+
+    return written
+
+
+def write_atomically(temporary_directory, path, write, overwrite=True):
+    """
+    Writes a file by calling write(file) on a temporary file and renaming it into place, so readers only ever see complete files
+
+    Args:
+        temporary_directory (str): directory on the same filesystem as path
+        path (str): destination. Its directory must exist
+        write (callable): write(file) writes the content
+        overwrite (bool, optional): if False the file is only created if it does not already exist. Defaults to True
+
+    Returns:
+        os.stat_result: of the written file
+
+    Raises:
+        FileExistsError: if overwrite is False and path exists
+    """
+
+    os.makedirs(temporary_directory, exist_ok=True)
+
+    temporary_path = os.path.join(temporary_directory, uuid.uuid4().hex)
+
+    try:
+        with open(temporary_path, "wb") as file:
+            write(file)
+
+        if overwrite:
+            os.replace(temporary_path, path)
+
+        else:
+            # Linking fails if path exists, so two writers can't both create it
+            os.link(temporary_path, path)
+            os.remove(temporary_path)
+
+        return os.stat(path)
+
+    except BaseException:
+        remove_quietly(temporary_path)
+        raise
+
+
+def remove_quietly(path):
+
+    try:
+        os.remove(path)
+
+    except OSError:
+        pass
+
+
+def remove_empty_parents(path, stop):
+    """
+    Removes the directories above path that are empty, up to but excluding stop
+    """
+
+    directory = os.path.dirname(path)
+
+    while len(directory) > len(stop) and directory.startswith(stop):
+
+        try:
+            os.rmdir(directory)
+
+        except OSError:
+            return
+
+        directory = os.path.dirname(directory)
+
+
+def remove_tree(temporary_directory, path):
+    """
+    Deletes a directory tree. It is first renamed out of the way, so it disappears at once even if removing it takes a while
+    """
+
+    os.makedirs(temporary_directory, exist_ok=True)
+
+    doomed = os.path.join(temporary_directory, uuid.uuid4().hex)
+
+    os.rename(path, doomed)
+
+    for root, directories, files in os.walk(doomed, topdown=False):
+
+        for name in files:
+            os.remove(os.path.join(root, name))
+
+        for name in directories:
+            os.rmdir(os.path.join(root, name))
+
+    os.rmdir(doomed)
+
+
+def open_download(path, not_found_code, properties_of, offset=None, length=None, etag=None, match_condition=None):
+    """
+    Opens a range of a local file for download, checking the same conditions storage would
+
+    Args:
+        path (str): path of the file
+        not_found_code (str): error code if the file does not exist, eg "BlobNotFound"
+        properties_of (callable): properties_of(stat) returns the BlobProperties or FileProperties of the file
+        offset (int, optional): start of the range. Defaults to 0
+        length (int, optional): length of the range. Defaults to the rest of the file
+        etag (str, optional): ETag the condition applies to
+        match_condition (MatchConditions, optional): IfNotModified fails with 412 and IfModified with 304 as storage does
+
+    Returns:
+        LocalDownloader
+    """
+
+    try:
+        file = open(path, "rb")
+
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raise storage_error(ResourceNotFoundError, 404, not_found_code, "The specified resource does not exist.")
+
+    try:
+        stat = os.fstat(file.fileno())
+        current_etag = etag_of(stat)
+
+        if match_condition == MatchConditions.IfNotModified and etag != current_etag:
+            raise storage_error(ResourceModifiedError, 412, "ConditionNotMet", "The condition specified using HTTP conditional header(s) is not met.")
+
+        if match_condition == MatchConditions.IfModified and etag == current_etag:
+            raise storage_error(ResourceNotModifiedError, 304, "ConditionNotMet", "The condition specified using HTTP conditional header(s) is not met.")
+
+        offset = offset or 0
+
+        if offset and offset >= stat.st_size:
+            raise storage_error(HttpResponseError, 416, "InvalidRange", "The range specified is invalid for the current size of the resource.")
+
+        available = stat.st_size - offset
+        length = available if length is None else min(length, available)
+
+        return LocalDownloader(file, properties_of(stat), offset, length)
+
+    except BaseException:
+        file.close()
+        raise
+
+
+class LocalDownloader:
+    """
+    Stands in for the StorageStreamDownloader of the sdk, reading one range of a local file through a memory map
+
+    The file is opened when the download starts, so the content read is that version of the file even if it is replaced
+    before it is read.
+
+    Args:
+        file (file object): the open file, closed once read
+        properties: BlobProperties or FileProperties of the file
+        offset (int): start of the range
+        length (int): length of the range
+    """
+
+    def __init__(self, file, properties, offset, length):
+        self.file = file
+        self.properties = properties
+        self.offset = offset
+        self.size = length
+        self.name = properties.name
+
+    def readall(self):
+
+        chunks = []
+
+        self.readinto(_Collector(chunks))
+
+        return b"".join(chunks)
+
+    def readinto(self, stream):
+        """
+        Writes the range to stream
+
+        Returns:
+            int: bytes written
+        """
+
+        try:
+            if self.size == 0:
+                return 0
+
+            with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+                with memoryview(mapped) as view:
+
+                    for start in range(self.offset, self.offset + self.size, COPY_CHUNK_SIZE):
+
+                        with view[start:min(start + COPY_CHUNK_SIZE, self.offset + self.size)] as chunk:
+                            stream.write(chunk)
+
+            return self.size
+
+        finally:
+            self.file.close()
+
+
+class _Collector:
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+        return len(data)
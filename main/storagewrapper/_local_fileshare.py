@@ -0,0 +1,370 @@
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.fileshare import DirectoryProperties, FileProperties, ShareProperties
+from storagewrapper._local_common import (etag_of, modified_of, open_download, open_url, paged, path_url, remove_tree, resolve, storage_error,
+                                          write_atomically, write_data)
+import os
+import uuid
+
+
+class LocalShareServiceClient:
+    """
+    Stands in for ShareServiceClient, keeping each share as a directory
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+    """
+
+    def __init__(self, backend, storage_account_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.directory = backend.directory(storage_account_name, "file")
+        self.url = path_url(self.directory)
+
+    def get_share_client(self, share, snapshot=None):
+
+        return LocalShareClient(self.backend, self.account_name, getattr(share, "name", share))
+
+    def create_share(self, share_name, **kwargs):
+
+        share_client = self.get_share_client(share_name)
+        share_client.create_share(**kwargs)
+
+        return share_client
+
+    def delete_share(self, share_name, delete_snapshots=False, **kwargs):
+
+        self.get_share_client(share_name).delete_share()
+
+    def list_shares(self, name_starts_with=None, include_metadata=False, include_snapshots=False, **kwargs):
+
+        def get_page(continuation_token):
+
+            try:
+                names = sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir())
+
+            except FileNotFoundError:
+                names = []
+
+            shares = []
+
+            for name in names:
+
+                if not name.startswith(name_starts_with or ""):
+                    continue
+
+                stat = os.stat(os.path.join(self.directory, name))
+
+                properties = ShareProperties()
+                properties.name = name
+                properties.etag = etag_of(stat)
+                properties.last_modified = modified_of(stat)
+
+                shares.append(properties)
+
+            return None, shares
+
+        return paged(get_page)
+
+
+class LocalShareClient:
+    """
+    Stands in for ShareClient. Directories and files of the share are directories and files below its directory
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+        share_name (str): Name of the share
+    """
+
+    def __init__(self, backend, storage_account_name, share_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.share_name = share_name
+        self.directory = resolve(backend.directory(storage_account_name, "file"), share_name, "share")
+        self.temporary_directory = backend.temporary_directory(storage_account_name)
+        self.url = path_url(self.directory)
+
+    def require(self):
+        """
+        Raises:
+            ResourceNotFoundError: if the share does not exist
+        """
+
+        if not os.path.isdir(self.directory):
+            raise storage_error(ResourceNotFoundError, 404, "ShareNotFound", "The specified share does not exist.")
+
+    def path(self, relative_path, kind="resource"):
+        """
+        Returns the local path of a directory or file in the share. The root of the share is ""
+        """
+
+        relative_path = relative_path.strip("/") if relative_path else ""
+
+        return resolve(self.directory, relative_path, kind) if relative_path else self.directory
+
+    def get_directory_client(self, directory_path=None):
+
+        return LocalShareDirectoryClient(self, directory_path or "")
+
+    def get_file_client(self, file_path):
+
+        return LocalShareFileClient(self, file_path)
+
+    def create_share(self, quota=None, access_tier=None, metadata=None, **kwargs):
+
+        os.makedirs(os.path.dirname(self.directory), exist_ok=True)
+
+        try:
+            os.mkdir(self.directory)
+
+        except FileExistsError:
+            raise storage_error(ResourceExistsError, 409, "ShareAlreadyExists", "The specified share already exists.")
+
+        stat = os.stat(self.directory)
+
+        return {"etag": etag_of(stat), "last_modified": modified_of(stat)}
+
+    def delete_share(self, delete_snapshots=False, **kwargs):
+
+        self.require()
+
+        try:
+            remove_tree(self.temporary_directory, self.directory)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "ShareNotFound", "The specified share does not exist.")
+
+
+class LocalShareDirectoryClient:
+    """
+    Stands in for ShareDirectoryClient
+
+    Args:
+        share_client (LocalShareClient): share of the directory
+        directory_path (str): path of the directory in the share, "" for its root
+    """
+
+    def __init__(self, share_client, directory_path):
+        self.share_client = share_client
+        self.share_name = share_client.share_name
+        self.directory_path = directory_path.strip("/")
+        self.path = share_client.path(self.directory_path, "directory")
+        self.url = path_url(self.path)
+
+    def exists(self, **kwargs):
+
+        return os.path.isdir(self.path)
+
+    def get_file_client(self, file_name):
+
+        return LocalShareFileClient(self.share_client, "/".join(part for part in (self.directory_path, file_name) if part))
+
+    def get_subdirectory_client(self, directory_name):
+
+        return LocalShareDirectoryClient(self.share_client, "/".join(part for part in (self.directory_path, directory_name) if part))
+
+    def create_directory(self, **kwargs):
+
+        self.share_client.require()
+
+        try:
+            os.mkdir(self.path)
+
+        except FileExistsError:
+            raise storage_error(ResourceExistsError, 409, "ResourceAlreadyExists", "The specified resource already exists.")
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "ParentNotFound", "The specified parent path does not exist.")
+
+        stat = os.stat(self.path)
+
+        return {"etag": etag_of(stat), "last_modified": modified_of(stat)}
+
+    def delete_directory(self, **kwargs):
+
+        self.share_client.require()
+
+        if not os.path.isdir(self.path):
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+        try:
+            os.rmdir(self.path)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+        except OSError:
+            raise storage_error(HttpResponseError, 409, "DirectoryNotEmpty", "The specified directory is not empty.")
+
+    def list_directories_and_files(self, name_starts_with=None, **kwargs):
+
+        self.share_client.require()
+
+        def get_page(continuation_token):
+
+            try:
+                entries = sorted(os.scandir(self.path), key=lambda entry: entry.name)
+
+            except (FileNotFoundError, NotADirectoryError):
+                raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+            items = []
+
+            for entry in entries:
+
+                if not entry.name.startswith(name_starts_with or ""):
+                    continue
+
+                try:
+                    stat = entry.stat()
+
+                except FileNotFoundError:
+                    continue
+
+                if entry.is_dir():
+                    properties = DirectoryProperties()
+                    properties.is_directory = True
+
+                else:
+                    properties = FileProperties()
+                    properties.is_directory = False
+                    properties.size = stat.st_size
+
+                properties.name = entry.name
+                properties.etag = etag_of(stat)
+                properties.last_modified = modified_of(stat)
+
+                items.append(properties)
+
+            return None, items
+
+        return paged(get_page)
+
+    def upload_file(self, file_name, data, length=None, metadata=None, **kwargs):
+
+        file_client = self.get_file_client(file_name)
+        file_client.upload_file(data, length=length, metadata=metadata)
+
+        return file_client
+
+
+class LocalShareFileClient:
+    """
+    Stands in for ShareFileClient, keeping a file as a local file
+
+    Args:
+        share_client (LocalShareClient): share of the file
+        file_path (str): path of the file in the share
+    """
+
+    def __init__(self, share_client, file_path):
+        self.share_client = share_client
+        self.share_name = share_client.share_name
+        self.file_path = file_path.strip("/")
+        self.file_name = self.file_path.rpartition("/")[2]
+        self.path = share_client.path(self.file_path, "file")
+        self.url = path_url(self.path)
+
+    def exists(self, **kwargs):
+
+        return os.path.isfile(self.path)
+
+    def upload_file(self, data, length=None, metadata=None, **kwargs):
+        """
+        Writes the file to a temporary file and renames it into place, so readers see either the old or the new file
+
+        Returns:
+            dict: etag and last_modified of the file
+        """
+
+        stat = self.__write(lambda file: write_data(file, data, length))
+
+        return {"etag": etag_of(stat), "last_modified": modified_of(stat)}
+
+    def __write(self, write):
+
+        self.share_client.require()
+
+        try:
+            return write_atomically(self.share_client.temporary_directory, self.path, write)
+
+        except (FileNotFoundError, NotADirectoryError):
+            raise storage_error(ResourceNotFoundError, 404, "ParentNotFound", "The specified parent path does not exist.")
+
+        except IsADirectoryError:
+            raise storage_error(ResourceExistsError, 409, "ResourceTypeMismatch", "The specified resource type does not match the type of the existing resource.")
+
+    def download_file(self, offset=None, length=None, **kwargs):
+
+        self.share_client.require()
+
+        return open_download(self.path, "ResourceNotFound", self.__properties, offset=offset, length=length, etag=kwargs.get("etag"),
+                             match_condition=kwargs.get("match_condition"))
+
+    def get_file_properties(self, **kwargs):
+
+        self.share_client.require()
+
+        try:
+            stat = os.stat(self.path)
+
+        except (FileNotFoundError, NotADirectoryError):
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+        if not os.path.isfile(self.path):
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+        return self.__properties(stat)
+
+    def __properties(self, stat):
+
+        properties = FileProperties()
+        properties.name = self.file_name
+        properties.path = self.file_path
+        properties.share = self.share_name
+        properties.size = stat.st_size
+        properties.content_length = stat.st_size
+        properties.etag = etag_of(stat)
+        properties.last_modified = modified_of(stat)
+        properties.copy.status = "success"
+
+        return properties
+
+    def delete_file(self, **kwargs):
+
+        self.share_client.require()
+
+        if not os.path.isfile(self.path):
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+        try:
+            os.remove(self.path)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "ResourceNotFound", "The specified resource does not exist.")
+
+    def start_copy_from_url(self, source_url, **kwargs):
+        """
+        Copies the source into the file before returning, so the copy is never pending
+
+        Returns:
+            dict: copy_id and copy_status, which is always "success"
+        """
+
+        self.share_client.require()
+
+        try:
+            source = open_url(source_url)
+
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise storage_error(ResourceNotFoundError, 404, "CannotVerifyCopySource", "The specified resource does not exist.")
+
+        with source:
+            self.__write(lambda file: write_data(file, source))
+
+        return {"copy_id": uuid.uuid4().hex, "copy_status": "success"}
+
+    def abort_copy(self, copy_id, **kwargs):
+
+        raise storage_error(HttpResponseError, 409, "NoPendingCopyOperation", "There is currently no pending copy operation.")
@@ -0,0 +1,419 @@
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.queue import QueueMessage, QueueProperties
+from collections import OrderedDict
+from datetime import datetime, timezone
+from storagewrapper._local_common import paged, path_url, remove_tree, resolve, storage_error
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+LOG_NAME = "messages.log"
+LOCK_NAME = "lock"
+
+# The log is rewritten without deleted messages once it holds this many records and four times as many as live messages
+COMPACT_AFTER = 1000
+
+# Expiry storage reports for messages that never expire
+_NEVER = datetime(9999, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+
+
+class LocalQueueServiceClient:
+    """
+    Stands in for QueueServiceClient, keeping each queue as a directory holding its message log
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+    """
+
+    def __init__(self, backend, storage_account_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.directory = backend.directory(storage_account_name, "queue")
+        self.url = path_url(self.directory)
+
+    def get_queue_client(self, queue, **kwargs):
+
+        return LocalQueueClient(self.backend, self.account_name, getattr(queue, "name", queue))
+
+    def create_queue(self, name, metadata=None, **kwargs):
+
+        queue_client = self.get_queue_client(name)
+        queue_client.create_queue(metadata=metadata)
+
+        return queue_client
+
+    def delete_queue(self, queue, **kwargs):
+
+        self.get_queue_client(queue).delete_queue()
+
+    def list_queues(self, name_starts_with=None, include_metadata=False, results_per_page=None, **kwargs):
+
+        def get_page(continuation_token):
+
+            try:
+                names = sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir())
+
+            except FileNotFoundError:
+                names = []
+
+            queues = []
+
+            for name in names:
+
+                if name.startswith(name_starts_with or ""):
+
+                    properties = QueueProperties()
+                    properties.name = name
+
+                    queues.append(properties)
+
+            return None, queues
+
+        return paged(get_page)
+
+
+class LocalQueueClient:
+    """
+    Stands in for QueueClient. Messages are kept in an append-only log on disk, see MessageLog
+
+    Args:
+        backend (LocalBackend): backend holding the storage account
+        storage_account_name (str): Name of the storage account
+        queue_name (str): Name of the queue
+    """
+
+    def __init__(self, backend, storage_account_name, queue_name):
+        self.backend = backend
+        self.account_name = storage_account_name
+        self.queue_name = queue_name
+        self.directory = resolve(backend.directory(storage_account_name, "queue"), queue_name, "queue")
+        self.temporary_directory = backend.temporary_directory(storage_account_name)
+        self.url = path_url(self.directory)
+        self.log = backend.message_log(self.directory)
+
+    def create_queue(self, metadata=None, **kwargs):
+
+        os.makedirs(os.path.dirname(self.directory), exist_ok=True)
+
+        try:
+            os.mkdir(self.directory)
+
+        except FileExistsError:
+            raise storage_error(ResourceExistsError, 409, "QueueAlreadyExists", "The specified queue already exists.")
+
+        for name in (LOCK_NAME, LOG_NAME):
+            open(os.path.join(self.directory, name), "ab").close()
+
+    def delete_queue(self, **kwargs):
+
+        try:
+            remove_tree(self.temporary_directory, self.directory)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "QueueNotFound", "The specified queue does not exist.")
+
+    def send_message(self, content, visibility_timeout=None, time_to_live=None, **kwargs):
+
+        if content is not None and not isinstance(content, str):
+            raise TypeError("Message content must be a str")
+
+        now = time.time()
+        time_to_live = 7 * 24 * 3600 if time_to_live is None else time_to_live
+
+        record = {"op": "send", "id": str(uuid.uuid4()), "content": content, "inserted": now, "expires": None if time_to_live == -1 else now + time_to_live,
+                  "visible": now + (visibility_timeout or 0), "pop_receipt": uuid.uuid4().hex, "dequeue_count": 0}
+
+        self.log.transact(lambda messages, now: ([record], None))
+
+        return _message(record["id"], record)
+
+    def receive_message(self, visibility_timeout=None, **kwargs):
+
+        messages = self.receive_messages(max_messages=1, visibility_timeout=visibility_timeout)
+
+        return messages[0] if messages else None
+
+    def receive_messages(self, messages_per_page=None, visibility_timeout=None, max_messages=None, **kwargs):
+        """
+        Receives up to max_messages visible messages, in the order they were sent, hiding each for visibility_timeout seconds
+
+        Returns:
+            list: of QueueMessage
+        """
+
+        limit = max_messages or messages_per_page or 32
+        visibility_timeout = 30 if visibility_timeout is None else visibility_timeout
+
+        def receive(messages, now):
+
+            records = []
+            expired = []
+
+            for message_id, message in messages.items():
+
+                if len(records) == limit:
+                    break
+
+                if _expired(message, now):
+                    expired.append({"op": "delete", "id": message_id})
+
+                elif message["visible"] <= now:
+                    records.append({"op": "receive", "id": message_id, "pop_receipt": uuid.uuid4().hex, "visible": now + visibility_timeout})
+
+            return records + expired, [record["id"] for record in records]
+
+        received = self.log.transact(receive)
+
+        return [_message(message_id, message) for message_id, message in received]
+
+    def peek_messages(self, max_messages=None, **kwargs):
+
+        def peek(messages, now):
+
+            visible = [message_id for message_id, message in messages.items() if message["visible"] <= now and not _expired(message, now)]
+
+            return [], visible[:max_messages or 1]
+
+        return [_message(message_id, message) for message_id, message in self.log.transact(peek)]
+
+    def delete_message(self, message, pop_receipt=None, **kwargs):
+
+        message_id, pop_receipt = _identify(message, pop_receipt)
+
+        def delete(messages, now):
+
+            _check_receipt(messages, message_id, pop_receipt)
+
+            return [{"op": "delete", "id": message_id}], None
+
+        self.log.transact(delete)
+
+    def update_message(self, message, pop_receipt=None, content=None, visibility_timeout=None, **kwargs):
+
+        message_id, pop_receipt = _identify(message, pop_receipt)
+
+        if content is not None and not isinstance(content, str):
+            raise TypeError("Message content must be a str")
+
+        def update(messages, now):
+
+            _check_receipt(messages, message_id, pop_receipt)
+
+            record = {"op": "update", "id": message_id, "pop_receipt": uuid.uuid4().hex, "visible": now + (visibility_timeout or 0)}
+
+            if content is not None:
+                record["content"] = content
+
+            return [record], [message_id]
+
+        (message_id, updated), = self.log.transact(update)
+
+        return _message(message_id, updated)
+
+    def clear_messages(self, **kwargs):
+
+        self.log.transact(lambda messages, now: ([{"op": "clear"}], None))
+
+
+def _expired(message, now):
+
+    return message["expires"] is not None and message["expires"] <= now
+
+
+def _identify(message, pop_receipt):
+
+    if isinstance(message, QueueMessage):
+        return message.id, pop_receipt if pop_receipt is not None else message.pop_receipt
+
+    return message, pop_receipt
+
+
+def _check_receipt(messages, message_id, pop_receipt):
+
+    if message_id not in messages:
+        raise storage_error(ResourceNotFoundError, 404, "MessageNotFound", "The specified message does not exist.")
+
+    if messages[message_id]["pop_receipt"] != pop_receipt:
+        raise storage_error(HttpResponseError, 400, "PopReceiptMismatch", "The specified pop receipt did not match the pop receipt for a dequeued message.")
+
+
+def _message(message_id, message):
+
+    return QueueMessage(message["content"], id=message_id, inserted_on=datetime.fromtimestamp(message["inserted"], timezone.utc),
+                        expires_on=_NEVER if message["expires"] is None else datetime.fromtimestamp(message["expires"], timezone.utc),
+                        dequeue_count=message["dequeue_count"], pop_receipt=message["pop_receipt"],
+                        next_visible_on=datetime.fromtimestamp(message["visible"], timezone.utc))
+
+
+class MessageLog:
+    """
+    Messages of one queue, kept as an append-only log of JSON records that is replayed into memory
+
+    Every operation, receiving included, appends records describing what it changed. Before each operation the records
+    other processes have appended since are replayed, under an exclusive lock on the queue, so several processes can share
+    a queue. Where fcntl is unavailable, eg on Windows, the lock only covers threads and a queue should be used by one
+    process at a time. Once most of the log describes deleted messages it is rewritten holding only live ones.
+
+    Args:
+        directory (str): directory of the queue
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.lock_path = os.path.join(directory, LOCK_NAME)
+        self._lock = threading.Lock()
+        self._messages = OrderedDict()
+        self._identity = None
+        self._offset = 0
+        self._records = 0
+
+    def transact(self, operation):
+        """
+        Runs operation(messages, now) on the current messages, under the queue lock. It returns (records, ids) where
+        records describe its changes and are appended to the log, and ids are message ids to return with their state
+        once the records are applied
+
+        Returns:
+            list: (id, message dict) for each of ids, or None if ids is None
+        """
+
+        with self._lock:
+
+            try:
+                lock_file = open(self.lock_path, "r+b")
+
+            except FileNotFoundError:
+                raise storage_error(ResourceNotFoundError, 404, "QueueNotFound", "The specified queue does not exist.")
+
+            with lock_file:
+
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+                self.__catch_up()
+
+                records, ids = operation(self._messages, time.time())
+
+                if records:
+                    self.__append(records)
+
+                if self._records > COMPACT_AFTER and self._records > 4 * len(self._messages):
+                    self.__compact()
+
+                if ids is None:
+                    return None
+
+                return [(message_id, dict(self._messages[message_id])) for message_id in ids]
+
+    def __catch_up(self):
+        """
+        Replays records appended by other processes since this process last read the log
+        """
+
+        try:
+            stat = os.stat(self.log_path)
+
+        except FileNotFoundError:
+            raise storage_error(ResourceNotFoundError, 404, "QueueNotFound", "The specified queue does not exist.")
+
+        identity = (stat.st_dev, stat.st_ino)
+
+        if identity != self._identity:
+
+            # The log was compacted, or the queue deleted and created again
+            self._identity = identity
+            self._messages.clear()
+            self._offset = 0
+            self._records = 0
+
+        if stat.st_size <= self._offset:
+            return
+
+        with open(self.log_path, "rb") as log:
+            log.seek(self._offset)
+            data = log.read()
+
+        complete = data.rfind(b"\n") + 1
+
+        for line in data[:complete].splitlines():
+            self.__apply(json.loads(line.decode("utf-8")))
+
+        self._offset += complete
+
+        if complete < len(data):
+
+            # Whoever wrote the partial record died while holding the lock
+            with open(self.log_path, "r+b") as log:
+                log.truncate(self._offset)
+
+    def __append(self, records):
+
+        data = b"".join(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n" for record in records)
+
+        with open(self.log_path, "ab") as log:
+            log.write(data)
+
+        for record in records:
+            self.__apply(record)
+
+        self._offset += len(data)
+
+    def __apply(self, record):
+
+        self._records += 1
+
+        operation = record["op"]
+        message = self._messages.get(record.get("id"))
+
+        if operation == "send":
+            self._messages[record["id"]] = {key: record[key] for key in ("content", "inserted", "expires", "visible", "pop_receipt", "dequeue_count")}
+
+        elif operation == "clear":
+            self._messages.clear()
+
+        elif message is None:
+            return
+
+        elif operation == "delete":
+            del self._messages[record["id"]]
+
+        elif operation == "receive":
+            message["pop_receipt"] = record["pop_receipt"]
+            message["visible"] = record["visible"]
+            message["dequeue_count"] += 1
+
+        elif operation == "update":
+            message["pop_receipt"] = record["pop_receipt"]
+            message["visible"] = record["visible"]
+            message["content"] = record.get("content", message["content"])
+
+    def __compact(self):
+        """
+        Rewrites the log with a send record per live message, and renames it over the old log
+        """
+
+        temporary_path = os.path.join(self.directory, f"{uuid.uuid4().hex}.tmp")
+
+        with open(temporary_path, "wb") as log:
+
+            for message_id, message in self._messages.items():
+                log.write(json.dumps(dict(message, op="send", id=message_id), separators=(",", ":")).encode("utf-8") + b"\n")
+
+        os.replace(temporary_path, self.log_path)
+
+        stat = os.stat(self.log_path)
+
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._offset = stat.st_size
+        self._records = len(self._messages)
@@ -0,0 +1,485 @@
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+
+# Upper bounds in seconds of the buckets of every latency histogram
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CALLS = "storagewrapper_calls_total"
+ERRORS = "storagewrapper_errors_total"
+CALL_SECONDS = "storagewrapper_call_duration_seconds"
+STAGE_SECONDS = "storagewrapper_stage_duration_seconds"
+BYTES = "storagewrapper_bytes_total"
+
+_HELP = {
+    CALLS: ("counter", "Calls of wrapper methods"),
+    ERRORS: ("counter", "Calls of wrapper methods that failed"),
+    CALL_SECONDS: ("histogram", "Time taken by calls of wrapper methods"),
+    STAGE_SECONDS: ("histogram", "Time spent authenticating and preparing requests, by stage"),
+    BYTES: ("counter", "Bytes uploaded and downloaded"),
+}
+
+HistogramSnapshot = namedtuple("HistogramSnapshot", ["count", "sum", "buckets"])
+HistogramSnapshot.__doc__ = """
+Snapshot of one latency histogram
+
+Attributes:
+    count (int): observations made
+    sum (float): total of every observation, in seconds
+    buckets (list): (upper bound, cumulative count) pairs, ending with (inf, count)
+"""
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+
+        buckets = []
+        cumulative = 0
+
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+
+        return HistogramSnapshot(self.count, self.sum, buckets)
+
+
+class InMemorySink:
+    """
+    Aggregates metrics in memory, for reading with snapshot or value
+
+    Any object with the same increment and observe methods can be passed to Metrics as a sink, eg to forward metrics to
+    statsd or OpenTelemetry.
+
+    Args:
+        buckets (tuple, optional): upper bounds in seconds of the histogram buckets. Defaults to DEFAULT_BUCKETS
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, labels, amount=1):
+        """
+        Adds amount to a counter
+
+        Args:
+            name (str): name of the metric
+            labels (tuple): sorted (label, value) pairs
+            amount (int, optional): Defaults to 1
+        """
+
+        key = (name, labels)
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """
+        Records an observation in a histogram
+
+        Args:
+            name (str): name of the metric
+            labels (tuple): sorted (label, value) pairs
+            value (float): seconds
+        """
+
+        key = (name, labels)
+
+        with self._lock:
+
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+
+            histogram.observe(value)
+
+    def value(self, name, **labels):
+        """
+        Returns the current value of one metric, eg value(CALLS, component="blob", method="upload_blob")
+
+        Returns:
+            int, HistogramSnapshot or None if nothing has been recorded
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+
+            if key in self._histograms:
+                return self._histograms[key].snapshot()
+
+            return self._counters.get(key)
+
+    def snapshot(self):
+        """
+        Returns every metric recorded so far
+
+        Returns:
+            dict: {name: [(labels dict, value)]} where value is an int for counters and a HistogramSnapshot for histograms
+        """
+
+        snapshot = {}
+
+        with self._lock:
+
+            for (name, labels), value in sorted(self._counters.items()):
+                snapshot.setdefault(name, []).append((dict(labels), value))
+
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                snapshot.setdefault(name, []).append((dict(labels), histogram.snapshot()))
+
+        return snapshot
+
+    def reset(self):
+        """
+        Forgets every metric recorded so far
+        """
+
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class PrometheusSink(InMemorySink):
+    """
+    In memory sink that renders its metrics in the Prometheus text exposition format
+
+    Either return exposition() from an existing http endpoint, or call serve to expose the metrics on their own port.
+    """
+
+    def exposition(self):
+        """
+        Returns:
+            str: every metric in the Prometheus text exposition format
+        """
+
+        lines = []
+
+        for name, samples in sorted(self.snapshot().items()):
+
+            kind, help_text = _HELP.get(name, ("untyped", name))
+
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for labels, value in samples:
+
+                if not isinstance(value, HistogramSnapshot):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+
+                for bound, count in value.buckets:
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {count}")
+
+                lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, address=""):
+        """
+        Serves exposition() at /metrics on a background thread
+
+        Args:
+            port (int): port to listen on. 0 picks a free port
+            address (str, optional): address to listen on. Defaults to every interface
+
+        Returns:
+            HTTPServer: the server. Call shutdown() on it to stop serving
+        """
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = sink.exposition().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = _ThreadingHTTPServer((address, port), Handler)
+
+        threading.Thread(target=server.serve_forever, name="storagewrapper-metrics", daemon=True).start()
+
+        return server
+
+
+def _format_labels(labels):
+
+    if not labels:
+        return ""
+
+    pairs = (f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value):
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Stage:
+    """
+    Context manager timing one stage
+    """
+
+    __slots__ = ("metrics", "labels", "started")
+
+    def __init__(self, metrics, labels):
+        self.metrics = metrics
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *args):
+
+        elapsed = time.perf_counter() - self.started
+
+        for sink in self.metrics.sinks:
+            sink.observe(STAGE_SECONDS, self.labels, elapsed)
+
+
+class Metrics:
+    """
+    Records how long wrapper methods and the stages of authentication take, how often they fail and how many bytes they move
+
+    Pass the same Metrics to BlobFunctions, FileShareFunctions, QueueFunctions and AuthenticateFunctions as metrics to
+    collect from all of them. Every public method records a call count and latency histogram labelled with its component
+    and method name, and failures are counted separately. For methods that return a generator the latency runs until it
+    is exhausted or closed, and errors raised while consuming it are counted as failures. Stages record time spent fetching tokens, key vault secrets, user delegation keys and
+    SAS tokens, and getting pooled clients, so time spent on the transfer itself can be told apart.
+
+    Metrics are passed to every sink. By default a single InMemorySink is used.
+
+    Args:
+        sinks (list, optional): objects with increment(name, labels, amount) and observe(name, labels, seconds) methods. Defaults to [InMemorySink()]
+    """
+
+    enabled = True
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks) if sinks is not None else [InMemorySink()]
+
+    def call(self, component, method, seconds):
+        """
+        Records a call of a wrapper method
+        """
+
+        labels = (("component", component), ("method", method))
+
+        for sink in self.sinks:
+            sink.increment(CALLS, labels)
+            sink.observe(CALL_SECONDS, labels, seconds)
+
+    def error(self, component, method):
+        """
+        Records a failed call of a wrapper method
+        """
+
+        labels = (("component", component), ("method", method))
+
+        for sink in self.sinks:
+            sink.increment(ERRORS, labels)
+
+    def transferred(self, component, direction, count):
+        """
+        Records bytes moved
+
+        Args:
+            component (str): eg "blob"
+            direction (str): "upload" or "download"
+            count (int): bytes
+        """
+
+        labels = (("component", component), ("direction", direction))
+
+        for sink in self.sinks:
+            sink.increment(BYTES, labels, count)
+
+    def stage(self, component, stage):
+        """
+        Returns a context manager timing a stage, eg
+
+            with metrics.stage("blob", "key_vault"):
+                ...
+        """
+
+        return _Stage(self, (("component", component), ("stage", stage)))
+
+    def snapshot(self):
+        """
+        Returns the snapshot of the first in memory sink
+
+        Returns:
+            dict: see InMemorySink.snapshot
+        """
+
+        return self.__in_memory_sink().snapshot()
+
+    def exposition(self):
+        """
+        Returns the metrics of the first Prometheus sink in the Prometheus text exposition format
+
+        Returns:
+            str
+        """
+
+        for sink in self.sinks:
+
+            if isinstance(sink, PrometheusSink):
+                return sink.exposition()
+
+        raise ValueError("Metrics has no PrometheusSink")
+
+    def __in_memory_sink(self):
+
+        for sink in self.sinks:
+
+            if isinstance(sink, InMemorySink):
+                return sink
+
+        raise ValueError("Metrics has no InMemorySink")
+
+
+class _NullStage:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class _NullMetrics:
+    """
+    Metrics used when none are given. Every method does nothing
+    """
+
+    enabled = False
+    sinks = ()
+
+    _stage = _NullStage()
+
+    def call(self, component, method, seconds):
+        pass
+
+    def error(self, component, method):
+        pass
+
+    def transferred(self, component, direction, count):
+        pass
+
+    def stage(self, component, stage):
+        return self._stage
+
+
+NULL_METRICS = _NullMetrics()
+
+
+def instrumented(component):
+    """
+    Class decorator recording a call and its latency in self.metrics for every public method of a wrapper
+
+    For a method returning a generator the latency runs until iteration finishes, and an error raised while iterating
+    is counted as a failure of the method. When metrics are disabled a method call costs one extra attribute lookup.
+    """
+
+    def decorate(cls):
+
+        for name, member in list(vars(cls).items()):
+
+            if name.startswith("_") or not callable(member) or isinstance(member, (staticmethod, classmethod, type)):
+                continue
+
+            setattr(cls, name, _timed(component, name, member))
+
+        return cls
+
+    return decorate
+
+
+def _timed(component, name, function):
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+
+        metrics = self.metrics
+
+        if not metrics.enabled:
+            return function(self, *args, **kwargs)
+
+        started = time.perf_counter()
+
+        try:
+            result = function(self, *args, **kwargs)
+
+        except BaseException:
+            metrics.call(component, name, time.perf_counter() - started)
+            raise
+
+        if inspect.isgenerator(result):
+            return _timed_iteration(metrics, component, name, result, started)
+
+        metrics.call(component, name, time.perf_counter() - started)
+
+        return result
+
+    return wrapper
+
+
+def _timed_iteration(metrics, component, name, generator, started):
+
+    try:
+        yield from generator
+
+    except Exception:
+        metrics.error(component, name)
+        raise
+
+    finally:
+        metrics.call(component, name, time.perf_counter() - started)
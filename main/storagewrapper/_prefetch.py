@@ -0,0 +1,204 @@
+from collections import deque
+from queue import Empty
+import threading
+import time
+
+
+class MessagePrefetcher:
+    """
+    Iterator over queue messages that keeps a bounded local buffer topped up from a background thread
+
+    Messages are received in pages of up to max_messages, so most iterations are served from the buffer rather than
+    waiting on a round trip. A message is only invisible to other consumers until its visibility timeout expires, so
+    buffered messages whose visibility deadline is less than visibility_margin seconds away are dropped rather than
+    handed out. Dropped messages become visible again and are redelivered.
+
+    Args:
+        receive (callable): receive(count, visibility_timeout) returns a list of up to count messages
+        max_messages (int, optional): messages requested per receive. The service returns at most 32 per request, so larger values are reduced to 32. Defaults to 32
+        prefetch (int, optional): maximum messages held in the buffer. Defaults to 64
+        visibility_timeout (int, optional): seconds received messages stay invisible to other consumers. Defaults to 300
+        visibility_margin (int, optional): buffered messages this close to their visibility deadline are dropped. Defaults to 30
+        stop_when_empty (bool, optional): if True iteration stops once the queue is found empty, otherwise the queue is polled with backoff. Defaults to True
+        poll_interval (float, optional): initial seconds between polls of an empty queue. Defaults to 1
+        max_poll_interval (float, optional): maximum seconds between polls of an empty queue. Defaults to 30
+        check_out (callable, optional): called with each received message before it is buffered, returning the message to buffer.
+            A message for which it raises is left out, and becomes visible again once its visibility timeout expires. Defaults to None
+
+    Attributes:
+        received (int): number of messages received from the queue
+        dropped (int): number of messages dropped because they were close to their visibility deadline
+        failed_check_outs (int): number of messages left out because check_out raised
+        last_check_out_error (Exception): most recent exception raised by check_out, if any
+    """
+
+    def __init__(self, receive, max_messages=32, prefetch=64, visibility_timeout=300, visibility_margin=30, stop_when_empty=True,
+                 poll_interval=1, max_poll_interval=30, check_out=None):
+        self._receive = receive
+        self._check_out = check_out
+        self.max_messages = min(max(max_messages, 1), 32)
+        self.prefetch = max(prefetch, 1)
+        self.visibility_timeout = visibility_timeout
+        self.visibility_margin = visibility_margin
+        self.stop_when_empty = stop_when_empty
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.received = 0
+        self.dropped = 0
+        self.failed_check_outs = 0
+        self.last_check_out_error = None
+
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._exhausted = False
+        self._error = None
+
+        self._thread = threading.Thread(target=self.__fill, name="storagewrapper-prefetch", daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+
+        entry = self.get()
+
+        if entry is None:
+            raise StopIteration
+
+        return entry[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Stops receiving. Messages still in the buffer are abandoned and become visible again once their visibility timeout expires
+        """
+
+        with self._condition:
+            self._closed = True
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Takes the next message from the buffer, waiting for one to be received if the buffer is empty
+
+        Args:
+            timeout (float, optional): seconds to wait for a message. Defaults to waiting indefinitely
+
+        Raises:
+            queue.Empty: if no message arrived within timeout
+
+        Returns:
+            tuple: (message, deadline) where deadline is the time.monotonic() at which the message becomes visible again, or None once iteration has finished
+        """
+
+        wait_until = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+
+            while True:
+
+                while self._buffer:
+
+                    message, deadline = self._buffer.popleft()
+                    self._condition.notify_all()
+
+                    if deadline - time.monotonic() > self.visibility_margin:
+                        return message, deadline
+
+                    self.dropped += 1
+
+                if self._error is not None:
+                    raise self._error
+
+                if self._exhausted or self._closed:
+                    return None
+
+                remaining = None if wait_until is None else wait_until - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+
+                self._condition.wait(remaining)
+
+    def __fill(self):
+
+        interval = self.poll_interval
+
+        while True:
+
+            with self._condition:
+
+                while not self._closed and len(self._buffer) >= self.prefetch:
+                    self._condition.wait()
+
+                if self._closed:
+                    return
+
+                count = min(self.max_messages, self.prefetch - len(self._buffer))
+
+            started = time.monotonic()
+
+            try:
+                received = self._receive(count, self.visibility_timeout)
+
+            except Exception as e:
+
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+
+                return
+
+            messages = self.__check_out(received)
+            deadline = started + self.visibility_timeout
+
+            with self._condition:
+
+                if self._closed:
+                    return
+
+                self._buffer.extend((message, deadline) for message in messages)
+                self.received += len(received)
+
+                if not received and self.stop_when_empty:
+                    self._exhausted = True
+
+                self._condition.notify_all()
+
+                if self._exhausted:
+                    return
+
+                if not received:
+                    self._condition.wait(interval)
+                    interval = min(interval * 2, self.max_poll_interval)
+
+                else:
+                    interval = self.poll_interval
+
+    def __check_out(self, messages):
+
+        if self._check_out is None:
+            return messages
+
+        checked_out = []
+
+        for message in messages:
+
+            try:
+                checked_out.append(self._check_out(message))
+
+            except Exception as e:
+
+                with self._condition:
+                    self.failed_check_outs += 1
+                    self.last_check_out_error = e
+
+        return checked_out
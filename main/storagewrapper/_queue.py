@@ -1,17 +1,29 @@
-from azure.storage.queue import QueueServiceClient
+from azure.core.exceptions import ResourceExistsError
+from storagewrapper._bulk import ItemResult, OperationReport, run_bounded
+from storagewrapper._clients import ClientRegistry
+from storagewrapper._consumer import QueueConsumer
 from storagewrapper._exceptions import QueueFunctionsError
+from storagewrapper._local import configured_backend
+from storagewrapper._metrics import NULL_METRICS, instrumented
+from storagewrapper._prefetch import MessagePrefetcher
+from storagewrapper._retry import RetryingPaged, shared_retry_policy
 import sys
+import threading
 
 
+@instrumented("queue")
 class QueueFunctions:
     """
     Using a token generated in AuthenticateFunctions gives access to the following queue functions.
 
     clear messages
     receive message
+    receive messages
     delete message
     send message
+    send messages
     update message
+    consume
     create queue
     delete queue
 
@@ -24,22 +36,48 @@ class QueueFunctions:
     param storage_account: str
     param queue_name: str
     param queue_client: QueueClient obj
+    param client_registry: ClientRegistry obj
+    param claim_check: ClaimCheck obj
+    param retry_policy: RetryPolicy obj
+    param metrics: Metrics obj
+    param backend: LocalBackend obj
 
     If a queue client exists (eg after using create queue) then this can be client can be used rather than a fresh client being generated
+
+    Clients are kept in a ClientRegistry so connections are reused between operations. A registry can be shared between instances.
+
+    If a ClaimCheck is given, payloads larger than its threshold are stored as blobs and only a reference to the blob is sent on the queue.
+    Received messages have the payload fetched back into their content, and the blob is deleted along with the message.
+
+    Requests are made under a RetryPolicy, which retries transient failures and backs off when the account is throttled.
+    By default one policy is shared by every wrapper in the process.
+
+    If Metrics are given, call counts, latencies and bytes sent are recorded in them.
+
+    Queues are kept somewhere other than Azure if a backend is given, eg LocalBackend to keep them on local disk.
+    By default the backend is selected by the STORAGEWRAPPER_BACKEND environment variable, which is Azure unless set to local.
     """
 
-    def __init__(self, token, storage_account_name, queue_name=None, queue_client=None, handle_exceptions=False):
+    def __init__(self, token, storage_account_name, queue_name=None, queue_client=None, handle_exceptions=False, client_registry=None, claim_check=None, retry_policy=None, metrics=None, backend=None):
         self.token = token
         self.handle_exceptions = handle_exceptions
-        self.queue_client = queue_client
+        self._queue_client = queue_client
         self.storage_account_name = storage_account_name
         self.queue_name = queue_name
+        self.client_registry = client_registry if client_registry is not None else ClientRegistry()
+        self.claim_check = claim_check
+        self.retry_policy = retry_policy if retry_policy is not None else shared_retry_policy
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.backend = backend if backend is not None else configured_backend()
+        self.account_url = f"https://{self.storage_account_name}.queue.core.windows.net/"
 
     def __str__(self):
         return f"Functions for operating queue storage within storage account:'{self.storage_account_name}'"
 
     def __handle_errors(self, func_name, error, exception_type=None):
 
+        self.metrics.error("queue", func_name)
+
         error_message = f"{error} in {func_name}"
 
         if self.handle_exceptions:
@@ -59,9 +97,25 @@ class QueueFunctions:
         else:
             raise exception_type(message)
 
+    @property
+    def queue_client(self):
+        """
+        Queue client used for message operations. Either the client given at instantiation or a pooled client for queue_name
+        """
+
+        if self._queue_client is None and self.queue_name is not None:
+
+            return self._gen_queue_client(self.queue_name)
+
+        return self._queue_client
+
+    @queue_client.setter
+    def queue_client(self, queue_client):
+        self._queue_client = queue_client
+
     def _generate_queue_service_client(self):
         """
-        Creates a queue service client using a token created by authentication module
+        Returns the pooled queue service client, created using a token from the authentication module
 
         param storage_account_name: str
         param token: Authentication obj
@@ -69,25 +123,80 @@ class QueueFunctions:
         return QueueServiceClient obj
         """
 
-        url = f"https://{self.storage_account_name}.blob.core.windows.net/"
+        if self.backend is not None:
+            return self.backend.queue_service_client(self.storage_account_name)
 
-        queue_service_client = QueueServiceClient(account_url=url, credential=self.token)
+        from azure.storage.queue import QueueServiceClient
+
+        with self.metrics.stage("queue", "client"):
+            queue_service_client = self.client_registry.get(
+                ("queue", self.storage_account_name),
+                lambda transport: QueueServiceClient(account_url=self.account_url, credential=self.token, transport=transport, retry_total=0),
+                credential=self.token)
 
         return queue_service_client
 
     def _gen_queue_client(self, queue_name):
         """
-        Generates a queue client using a queue service client
+        Returns a pooled queue client
         param storage_account: str
         param queue_name: str
 
         return QueueClient obj
         """
-        queue_service_client = self._generate_queue_service_client()
-        queue_client = queue_service_client.get_queue_client(queue_name)
+
+        if self.backend is not None:
+            return self.backend.queue_client(self.storage_account_name, queue_name)
+
+        from azure.storage.queue import QueueClient
+
+        with self.metrics.stage("queue", "client"):
+            queue_client = self.client_registry.get(
+                ("queue", self.storage_account_name, queue_name),
+                lambda transport: QueueClient(account_url=self.account_url, queue_name=queue_name, credential=self.token, transport=transport, retry_total=0),
+                credential=self.token)
 
         return queue_client
 
+    def __run(self, operation):
+        """
+        Runs operation under the retry policy
+
+        param operation: callable taking no arguments
+
+        return result of operation
+        """
+
+        return self.retry_policy.run(operation, self.storage_account_name)
+
+    def __listing_error(self, func_name):
+        """
+        Returns the wrap_error of a RetryingPaged listing. A page that fails to be fetched is raised as QueueFunctionsError,
+        even if handle_exceptions is True, and counted as an error of func_name
+
+        return callable
+        """
+
+        def wrap_error(error):
+
+            self.metrics.error("queue", func_name)
+
+            return QueueFunctionsError(f"{error} in {func_name}")
+
+        return wrap_error
+
+    def invalidate_clients(self, token=None):
+        """
+        Drops pooled clients so they are rebuilt, eg after credentials have been rotated
+
+        param token: token obj, optional. New token to use from now on
+        """
+
+        if token is not None:
+            self.token = token
+
+        self.client_registry.invalidate(("queue", self.storage_account_name))
+
     def clear_messages(self, queue_name, timeout=10):
         """
         Deletes all messages from a queue. Timeout value auto-set to 10seconds.
@@ -96,7 +205,7 @@ class QueueFunctions:
         """
         try:
             queue_client = self._gen_queue_client(queue_name=queue_name)
-            queue_client.clear_messages(timeout=timeout)
+            self.__run(lambda: queue_client.clear_messages(timeout=timeout))
 
         except Exception as e:
             
@@ -117,7 +226,12 @@ class QueueFunctions:
         return message: QueueMessage class
         """
         try:
-            message = self.queue_client.receive_message(visibility_timeout=visibility_timeout, timeout=timeout)
+            queue_client = self.queue_client
+
+            message = self.__run(lambda: queue_client.receive_message(visibility_timeout=visibility_timeout, timeout=timeout))
+
+            if message is not None and self.claim_check is not None:
+                message = self.claim_check.check_out(message)
 
             return message
 
@@ -127,6 +241,59 @@ class QueueFunctions:
 
             return status
 
+    def receive_messages(self, max_messages=32, prefetch=64, visibility_timeout=300, visibility_margin=30, stop_when_empty=True, timeout=10):
+        """
+        Returns an iterator over messages at the front of the queue.
+        Messages are received in pages of up to max_messages per request, reduced to the service limit of 32 if larger, and a
+        background thread keeps a local buffer of up to prefetch messages topped up. Buffered messages within visibility_margin seconds of their
+        visibility timeout expiring are dropped rather than returned, so they are left to be redelivered.
+        If stop_when_empty is True iteration stops once the queue is empty, otherwise the queue is polled with backoff.
+        The iterator should be closed when finished with, or used as a context manager.
+
+        param max_messages: int
+        param prefetch: int
+        param visibility_timeout: int
+        param visibility_margin: int
+        param stop_when_empty: bool
+        param timeout: int
+
+        return MessagePrefetcher: iterator of QueueMessage. Its dropped attribute counts messages dropped near their deadline,
+            and failed_check_outs counts messages left to reappear because their claim checked payload could not be fetched
+        """
+        try:
+
+            prefetcher = self.__prefetcher(self.queue_client, max_messages, prefetch, visibility_timeout, visibility_margin, stop_when_empty, timeout)
+
+            return prefetcher
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __prefetcher(self, queue_client, max_messages, prefetch, visibility_timeout, visibility_margin, stop_when_empty, timeout, check_out=True):
+        """
+        Starts a MessagePrefetcher receiving from queue_client. Receive failures are raised from iteration as QueueFunctionsError
+        If check_out is True claim checked payloads are fetched as messages are received. A message whose payload can't be
+        fetched is left out, to reappear once its visibility timeout expires
+
+        return MessagePrefetcher
+        """
+
+        def receive(count, visibility_timeout):
+
+            try:
+                return self.__run(lambda: list(queue_client.receive_messages(messages_per_page=count, max_messages=count,
+                                                                             visibility_timeout=visibility_timeout, timeout=timeout)))
+
+            except Exception as e:
+                raise QueueFunctionsError(f"{e} in receive_messages")
+
+        return MessagePrefetcher(receive, max_messages=max_messages, prefetch=prefetch, visibility_timeout=visibility_timeout,
+                                 visibility_margin=visibility_margin, stop_when_empty=stop_when_empty,
+                                 check_out=self.claim_check.check_out if self.claim_check is not None and check_out else None)
+
     def delete_message(self, message, pop_receipt, timeout=10):
         """
         Deletes a message from the queue.
@@ -141,7 +308,12 @@ class QueueFunctions:
         """
         try:
 
-            self.queue_client.delete_message(message=message, pop_receipt=pop_receipt, timeout=timeout)
+            queue_client = self.queue_client
+
+            self.__run(lambda: queue_client.delete_message(message=message, pop_receipt=pop_receipt, timeout=timeout))
+
+            if self.claim_check is not None:
+                self.claim_check.release(message)
 
             return None
 
@@ -164,7 +336,7 @@ class QueueFunctions:
         """
         try:
 
-            sent_message = self.queue_client.send_message(content=content, visibility_timeout=visibility_timeout, time_to_live=time_to_live, timeout=timeout)
+            sent_message = self.__send(self.queue_client, content, visibility_timeout, time_to_live, timeout)
 
             return sent_message
 
@@ -174,6 +346,79 @@ class QueueFunctions:
 
             return status
 
+    def __send(self, queue_client, content, visibility_timeout, time_to_live, timeout):
+        """
+        Sends a message, storing its payload as a blob first if it is too large for the queue and a claim check is in use
+
+        return QueueMessage object
+        """
+
+        blob_name = None
+
+        if self.claim_check is not None:
+            content, blob_name = self.claim_check.check_in(content)
+
+        try:
+            sent_message = self.__run(lambda: queue_client.send_message(content=content, visibility_timeout=visibility_timeout, time_to_live=time_to_live,
+                                                                        timeout=timeout))
+
+            if isinstance(content, (str, bytes)):
+                self.metrics.transferred("queue", "upload", len(content))
+
+            return sent_message
+
+        except Exception:
+
+            if blob_name is not None:
+                self.claim_check.discard(blob_name)
+
+            raise
+
+    def send_messages(self, contents, concurrency=16, visibility_timeout=604800, time_to_live=604800, timeout=10):
+        """
+        Sends many messages to queue, keeping up to concurrency sends in flight over pooled connections.
+        contents is consumed lazily, only a few more messages than concurrency are read ahead of those being sent,
+        so it can be a generator over a very large stream of events.
+        Time to live and visibility timeout behave as in send_message.
+
+        param contents: iterable of str
+        param concurrency: int
+        param visibility_timeout: int
+        param time_to_live: int
+        param timeout: int
+
+        return OperationReport: one ItemResult per message, named by its position in contents, with the message id as its detail
+        """
+        try:
+
+            queue_client = self.queue_client
+
+            def send(item):
+
+                position, content = item
+
+                try:
+                    sent_message = self.__send(queue_client, content, visibility_timeout, time_to_live, timeout)
+
+                    return ItemResult(position, True, len(content), detail=sent_message.id)
+
+                except Exception as e:
+
+                    return ItemResult(position, False, error=str(e))
+
+            report = OperationReport()
+
+            for result in run_bounded(send, enumerate(contents), concurrency):
+                report.add(result)
+
+            return report.finish()
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
     def update_message(self, message, pop_receipt, content, visibility_timeout=604800, timeout=10):
         """
         Updates the visibility timeout of a message, or updates the content of a message
@@ -182,14 +427,18 @@ class QueueFunctions:
         param message: str or QueueMessage
         param pop_receipt: str
         param content: str
-        param visibility_timeout: int
+        param visibility_timeout: int, seconds until the message is visible again. The service always sets it, so a message whose content
+        is updated stays hidden for 7 days unless visibility_timeout is given, and visibility_timeout=0 makes it visible at once
         param timeout: int
 
         return updated_message: QueueMessage object
         """
 
         try:
-            updated_message = self.queue_client.update_message(message, pop_receipt=pop_receipt, content=content)
+            queue_client = self.queue_client
+
+            updated_message = self.__run(lambda: queue_client.update_message(message, pop_receipt=pop_receipt, content=content,
+                                                                             visibility_timeout=visibility_timeout, timeout=timeout))
 
             return updated_message
 
@@ -199,6 +448,102 @@ class QueueFunctions:
 
             return status
 
+    def consume(self, queue_name, handler, concurrency=8, visibility_timeout=60, heartbeat_interval=None, max_dequeue_count=5, dead_letter_queue_name=None,
+                prefetch=None, stop_when_empty=False, wait=True, timeout=10):
+        """
+        Runs handler on every message in a queue, with up to concurrency handlers running at once on a thread pool.
+        A message is deleted once its handler returns, if the handler raises the message is left to be redelivered.
+        While a handler runs, the visibility timeout of its message is extended every heartbeat_interval seconds
+        (default half of visibility_timeout) with update_message, so messages are not redelivered while still being handled.
+        Messages dequeued more than max_dequeue_count times are moved to the dead letter queue, which defaults to
+        "<queue_name>-poison" and is created if it does not exist. Set max_dequeue_count to None to disable dead lettering.
+
+        By default consume blocks until stopped, eg by KeyboardInterrupt or by calling stop() on the consumer from a handler.
+        With stop_when_empty=True it returns once the queue is empty. With wait=False it returns the running consumer immediately.
+
+        param queue_name: str
+        param handler: callable, called with each QueueMessage
+        param concurrency: int
+        param visibility_timeout: int
+        param heartbeat_interval: float
+        param max_dequeue_count: int
+        param dead_letter_queue_name: str
+        param prefetch: int, messages buffered ahead of the handlers. Defaults to twice concurrency
+        param stop_when_empty: bool
+        param wait: bool
+        param timeout: int
+
+        return QueueConsumer obj: stats() returns throughput, lag and outcome counters
+        """
+        try:
+
+            queue_client = self._gen_queue_client(queue_name)
+
+            if dead_letter_queue_name is None:
+                dead_letter_queue_name = f"{queue_name}-poison"
+
+            prefetcher = self.__prefetcher(queue_client, 32, prefetch or concurrency * 2, visibility_timeout, min(30, visibility_timeout / 4), stop_when_empty, timeout,
+                                           check_out=False)
+
+            consumer = QueueConsumer(queue_client, handler, prefetcher, concurrency=concurrency, visibility_timeout=visibility_timeout,
+                                     heartbeat_interval=heartbeat_interval, max_dequeue_count=max_dequeue_count,
+                                     dead_letter_client=self.__dead_letter_client_factory(dead_letter_queue_name), claim_check=self.claim_check,
+                                     timeout=timeout, run=self.__run)
+
+            consumer.start()
+
+            if wait:
+
+                try:
+                    consumer.join()
+
+                except KeyboardInterrupt:
+                    consumer.stop()
+                    consumer.join()
+
+                if consumer.error is not None:
+                    raise consumer.error
+
+            return consumer
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def __dead_letter_client_factory(self, queue_name):
+        """
+        Returns a callable that returns a pooled client of the dead letter queue, creating the queue on first use
+
+        param queue_name: str
+
+        return callable
+        """
+
+        lock = threading.Lock()
+        created = []
+
+        def dead_letter_client():
+
+            queue_client = self._gen_queue_client(queue_name)
+
+            with lock:
+
+                if not created:
+
+                    try:
+                        self.__run(lambda: queue_client.create_queue())
+
+                    except ResourceExistsError:
+                        pass
+
+                    created.append(True)
+
+            return queue_client
+
+        return dead_letter_client
+
     def create_queue(self, name, metadata, timeout=10):
         """
         Creates a new queue in storage acct. Timeout value auto-set to 10seconds.
@@ -215,7 +560,7 @@ class QueueFunctions:
         try:
 
             queue_service_client = self._generate_queue_service_client()
-            queue_client = queue_service_client.create_queue(name=name, metadata=metadata, timeout=timeout)
+            queue_client = self.__run(lambda: queue_service_client.create_queue(name=name, metadata=metadata, timeout=timeout))
 
             return queue_client
 
@@ -238,7 +583,7 @@ class QueueFunctions:
 
         try:
             queue_service_client = self._generate_queue_service_client()
-            queue_service_client.delete_queue(queue=queue_name, timeout=timeout)
+            self.__run(lambda: queue_service_client.delete_queue(queue=queue_name, timeout=timeout))
 
             return None
 
@@ -250,8 +595,10 @@ class QueueFunctions:
 
     def list_queues(self, name_starts_with="", include_metadata=True, results_per_page=100, timeout=60):
         """
-        Returns a generator to list the queues under the specified account.
-        The generator will lazily follow the continuation tokens returned by the service and stop when all queues have been returned.
+        Returns an iterator to list the queues under the specified account.
+        The iterator will lazily follow the continuation tokens returned by the service and stop when all queues have been returned.
+        As with the ItemPaged returned by the azure sdk, by_page() iterates pages and can start from a continuation token.
+        Each page is fetched under the retry policy, and a page that fails to be fetched raises QueueFunctionsError from the iterator.
         All params are optional, default behaviour is to list all queues in specified account.
 
         param name_starts_with: str
@@ -259,7 +606,7 @@ class QueueFunctions:
         results_per_page: int
         param timeout: int
 
-        return iterable (auto-paging) of QueueProperties
+        return RetryingPaged: an ItemPaged (auto-paging) of QueueProperties
 
         """
         try:
@@ -271,7 +618,7 @@ class QueueFunctions:
                 timeout=timeout
             )
 
-            return list_queues
+            return RetryingPaged(list_queues, self.retry_policy, self.storage_account_name, self.__listing_error(sys._getframe().f_code.co_name))
 
         except Exception as e:
                 
@@ -0,0 +1,319 @@
+from azure.storage.queue.aio import QueueServiceClient, QueueClient
+from storagewrapper._clients import AsyncClientRegistry
+from storagewrapper._exceptions import QueueFunctionsError
+import sys
+
+
+class AsyncQueueFunctions:
+    """
+    Asyncio version of QueueFunctions. Has the same methods, each of which must be awaited, and is built on the
+    azure.storage.queue.aio clients so thousands of operations can run concurrently on one event loop.
+    Requires aiohttp to be installed.
+
+    Required params:
+
+    param token: async credential, eg AuthenticateFunctions.async_token
+
+    Optional params:
+
+    param storage_account: str
+    param queue_name: str
+    param queue_client: aio QueueClient obj
+    param client_registry: AsyncClientRegistry obj
+
+    Usage:
+        async with AsyncQueueFunctions(authenticator.async_token, storage_account_name, queue_name=queue_name) as queue_functions:
+            await queue_functions.send_message(content)
+    """
+
+    def __init__(self, token, storage_account_name, queue_name=None, queue_client=None, handle_exceptions=False, client_registry=None):
+        self.token = token
+        self.handle_exceptions = handle_exceptions
+        self._queue_client = queue_client
+        self.storage_account_name = storage_account_name
+        self.queue_name = queue_name
+        self.client_registry = client_registry if client_registry is not None else AsyncClientRegistry()
+        self.account_url = f"https://{self.storage_account_name}.queue.core.windows.net/"
+
+    def __str__(self):
+        return f"Async functions for operating queue storage within storage account:'{self.storage_account_name}'"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes pooled clients and their shared connection pool
+        """
+
+        await self.client_registry.close()
+
+    def __handle_errors(self, func_name, error, exception_type=None):
+
+        error_message = f"{error} in {func_name}"
+
+        if self.handle_exceptions:
+
+            return False
+
+        elif not self.handle_exceptions:
+
+            self.__raise_exceptions(message=error_message, exception_type=exception_type)
+
+    def __raise_exceptions(self, message, exception_type):
+
+        if exception_type is None:
+
+            raise QueueFunctionsError(message)
+
+        else:
+            raise exception_type(message)
+
+    @property
+    def queue_client(self):
+        """
+        Queue client used for message operations. Either the client given at instantiation or a pooled client for queue_name
+        """
+
+        if self._queue_client is None and self.queue_name is not None:
+
+            return self._gen_queue_client(self.queue_name)
+
+        return self._queue_client
+
+    @queue_client.setter
+    def queue_client(self, queue_client):
+        self._queue_client = queue_client
+
+    def _generate_queue_service_client(self):
+        """
+        Returns the pooled async queue service client
+
+        return aio QueueServiceClient obj
+        """
+
+        queue_service_client = self.client_registry.get(
+            ("queue", self.storage_account_name),
+            lambda transport: QueueServiceClient(account_url=self.account_url, credential=self.token, transport=transport),
+            credential=self.token)
+
+        return queue_service_client
+
+    def _gen_queue_client(self, queue_name):
+        """
+        Returns a pooled async queue client
+        param queue_name: str
+
+        return aio QueueClient obj
+        """
+
+        queue_client = self.client_registry.get(
+            ("queue", self.storage_account_name, queue_name),
+            lambda transport: QueueClient(account_url=self.account_url, queue_name=queue_name, credential=self.token, transport=transport),
+            credential=self.token)
+
+        return queue_client
+
+    def invalidate_clients(self, token=None):
+        """
+        Drops pooled clients so they are rebuilt, eg after credentials have been rotated
+
+        param token: async token obj, optional. New token to use from now on
+        """
+
+        if token is not None:
+            self.token = token
+
+        self.client_registry.invalidate(("queue", self.storage_account_name))
+
+    async def clear_messages(self, queue_name, timeout=10):
+        """
+        Deletes all messages from a queue. Timeout value auto-set to 10seconds.
+
+        param timeout: int
+        """
+        try:
+            queue_client = self._gen_queue_client(queue_name=queue_name)
+            await queue_client.clear_messages(timeout=timeout)
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def receive_message(self, timeout=10, visibility_timeout=300):
+        """
+        Removes a message from the front of the queue.
+        Server timeout defaults to 10 seconds
+        Visibility timeout defaults to 300 seconds
+
+        param timeout: int
+        param visibility_timeout: int
+
+        return message: QueueMessage class
+        """
+        try:
+            message = await self.queue_client.receive_message(visibility_timeout=visibility_timeout, timeout=timeout)
+
+            return message
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_message(self, message, pop_receipt, timeout=10):
+        """
+        Deletes a message from the queue.
+        Message can either be a message object or id as a str
+
+        param message: str or QueueMessage
+        param pop_receipt: str
+        param timeout: int
+
+        return None
+        """
+        try:
+
+            await self.queue_client.delete_message(message=message, pop_receipt=pop_receipt, timeout=timeout)
+
+            return None
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def send_message(self, content, visibility_timeout=604800, time_to_live=604800, timeout=10):
+        """
+        Sends a message to queue.
+        Default time to live is 7 days, however this can be specified in seconds. Set to infinity with -1.
+        visibility timeout specifies the time that the message will be invisible. After the timeout expires, the message will become visible. Defaults to 7 days
+
+        param content: str
+        param visibility_timeout: int
+
+        return sent_message: QueueMessage object
+        """
+        try:
+
+            sent_message = await self.queue_client.send_message(content=content, visibility_timeout=visibility_timeout, time_to_live=time_to_live, timeout=timeout)
+
+            return sent_message
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def update_message(self, message, pop_receipt, content, visibility_timeout=604800, timeout=10):
+        """
+        Updates the visibility timeout of a message, or updates the content of a message
+
+        param message: str or QueueMessage
+        param pop_receipt: str
+        param content: str
+        param visibility_timeout: int
+        param timeout: int
+
+        return updated_message: QueueMessage object
+        """
+
+        try:
+            updated_message = await self.queue_client.update_message(message, pop_receipt=pop_receipt, content=content, visibility_timeout=visibility_timeout,
+                                                                     timeout=timeout)
+
+            return updated_message
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def create_queue(self, name, metadata, timeout=10):
+        """
+        Creates a new queue in storage acct. Timeout value auto-set to 10seconds.
+        Returns a queue client object for created queue
+
+        param name: name
+        param metadata: dict
+        param timeout: int
+
+        return aio QueueClient obj
+        """
+
+        try:
+
+            queue_service_client = self._generate_queue_service_client()
+            queue_client = await queue_service_client.create_queue(name=name, metadata=metadata, timeout=timeout)
+
+            return queue_client
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    async def delete_queue(self, queue_name, timeout=120):
+        """
+        Deletes the queue and all contained messages
+        Operation likely to take at least 40 seconds. Configure timeout accordingly. Default 120 seconds
+
+        param queue_name: str
+        param timeout: int (secs)
+
+        return None
+        """
+
+        try:
+            queue_service_client = self._generate_queue_service_client()
+            await queue_service_client.delete_queue(queue=queue_name, timeout=timeout)
+
+            return None
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def list_queues(self, name_starts_with="", include_metadata=True, results_per_page=100, timeout=60):
+        """
+        Returns an async generator to list the queues under the specified account. Iterate it with async for
+
+        param name_starts_with: str
+        param include_metadata: bool default=True,
+        results_per_page: int
+        param timeout: int
+
+        return async iterable (auto-paging) of QueueProperties
+        """
+        try:
+            queue_service_client = self._generate_queue_service_client()
+            list_queues = queue_service_client.list_queues(
+                name_starts_with=name_starts_with,
+                include_metadata=include_metadata,
+                results_per_page=results_per_page,
+                timeout=timeout
+            )
+
+            return list_queues
+
+        except Exception as e:
+
+            status = self.__handle_errors(sys._getframe().f_code.co_name, e)
+
+            return status
+
+    def create_queue_service_client(self):
+        queue_service_client = self._generate_queue_service_client()
+        return queue_service_client
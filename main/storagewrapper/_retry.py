@@ -0,0 +1,528 @@
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.core.paging import ItemPaged
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from storagewrapper._exceptions import CircuitOpenError
+import random
+import threading
+import time
+
+
+# Status codes storage returns for transient failures. 429 and 503 (ServerBusy) mean the account is being throttled
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+THROTTLE_STATUS_CODES = (429, 503)
+
+AccountState = namedtuple("AccountState", ["concurrency_limit", "in_flight", "circuit", "consecutive_failures"])
+AccountState.__doc__ = """
+Snapshot of how a RetryPolicy is treating one storage account
+
+Attributes:
+    concurrency_limit (int): requests currently allowed in flight at once
+    in_flight (int): requests currently in flight
+    circuit (str): "closed" while requests are allowed, "open" while they are rejected, "half_open" while a trial request is made
+    consecutive_failures (int): transient failures since the last success
+"""
+
+
+class AdaptiveLimiter:
+    """
+    Limits requests in flight using additive increase, multiplicative decrease
+
+    Each successful request raises the limit by 1 / limit, so it grows by about one per round of requests. A throttled
+    request multiplies it by decrease_factor, unless it was started before the last decrease: requests already in flight
+    when the limit was lowered belong to the same congestion event, so a burst of 503s only lowers the limit once.
+
+    Args:
+        max_concurrency (int): limit is never raised above this, and starts here
+        min_concurrency (int, optional): limit is never lowered below this. Defaults to 1
+        decrease_factor (float, optional): limit is multiplied by this when throttled. Defaults to 0.5
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1, decrease_factor=0.5):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._last_decrease = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Waits until a request may be made
+
+        Returns:
+            float: when the request was allowed, to be passed to release
+        """
+
+        with self._condition:
+
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+
+            self._in_flight += 1
+
+            return time.monotonic()
+
+    def release(self, started, throttled=False):
+        """
+        Records that a request has finished, adjusting the limit by its outcome
+
+        Args:
+            started (float): value returned by acquire
+            throttled (bool, optional): True if storage throttled the request. Defaults to False
+        """
+
+        with self._condition:
+
+            self._in_flight -= 1
+
+            if throttled:
+
+                if self._last_decrease is None or started >= self._last_decrease:
+                    self._limit = max(float(self.min_concurrency), self._limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+
+            elif self._limit < self.max_concurrency:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a storage account after repeated transient failures, giving it time to recover
+
+    After failure_threshold consecutive transient failures the circuit opens and requests are rejected with
+    CircuitOpenError for reset_timeout seconds. Throttling is not counted as a failure, as it is handled by backing off. A single trial request is then let through: if it succeeds the circuit
+    closes, otherwise it opens again.
+
+    Args:
+        failure_threshold (int, optional): consecutive transient failures that open the circuit. Defaults to 10
+        reset_timeout (float, optional): seconds the circuit stays open before a trial request. Defaults to 30
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+
+        with self._lock:
+
+            if self._opened_at is None:
+                return "closed"
+
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+
+            return "open"
+
+    @property
+    def consecutive_failures(self):
+        return self._failures
+
+    def allow(self):
+        """
+        Returns:
+            bool: True if a request may be made now
+        """
+
+        with self._lock:
+
+            if self._opened_at is None:
+                return True
+
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+
+            self._trial = True
+
+            return True
+
+    def record_success(self):
+
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+
+        with self._lock:
+
+            self._failures += 1
+
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+            self._trial = False
+
+    def record_other(self):
+        """
+        Records that a trial request finished without a transient failure, eg with a 404, which shows the account is answering
+        """
+
+        self.record_success()
+
+
+class _Account:
+
+    def __init__(self, limiter, breaker):
+        self.limiter = limiter
+        self.breaker = breaker
+
+
+class RetryingPaged(ItemPaged):
+    """
+    A listing whose pages are each fetched under a RetryPolicy, returned in place of the ItemPaged of an sdk list method
+
+    It is an ItemPaged, so iterating it yields every item and by_page() yields the pages, optionally starting from a
+    continuation token. The iterator returned by by_page() has the continuation_token of the page last fetched.
+
+    Args:
+        item_paged (ItemPaged): listing returned by an sdk list method
+        retry_policy (RetryPolicy): policy each page is fetched under
+        account (str): name of the storage account the listing is of
+        wrap_error (callable, optional): called with an error raised while fetching a page, returns the error to raise instead
+    """
+
+    def __init__(self, item_paged, retry_policy, account, wrap_error=None):
+        super().__init__()
+        self.item_paged = item_paged
+        self.retry_policy = retry_policy
+        self.account = account
+        self.wrap_error = wrap_error
+
+    def by_page(self, continuation_token=None):
+        """
+        Returns:
+            iterator: of pages, each an iterator of items
+        """
+
+        return _RetryingPages(self, self.item_paged.by_page(continuation_token=continuation_token))
+
+
+class _RetryingPages:
+
+    def __init__(self, paged, pages):
+        self.paged = paged
+        self.pages = pages
+
+    @property
+    def continuation_token(self):
+        return self.pages.continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+
+        try:
+            return self.paged.retry_policy.run(lambda: next(self.pages), self.paged.account)
+
+        except StopIteration:
+            raise
+
+        except Exception as e:
+
+            if self.paged.wrap_error is None:
+                raise
+
+            raise self.paged.wrap_error(e) from e
+
+
+class RetryPolicy:
+    """
+    Retries transient storage failures, adapts concurrency to throttling and breaks the circuit to failing accounts
+
+    One policy is shared by BlobFunctions, FileShareFunctions and QueueFunctions, by default process wide, so every
+    wrapper talking to an account sees the same view of its health.
+
+    A request that fails with a transient error (a connection failure, or a status in RETRY_STATUS_CODES) is retried up
+    to max_attempts times in total, waiting an exponentially growing backoff with random jitter between attempts. If the
+    response carries a Retry-After header the wait is at least that long. Other errors, such as 404 or 409, are raised
+    straight away.
+
+    Requests to each account are limited by an AdaptiveLimiter, which halves the requests allowed in flight when storage
+    throttles with 429 or 503 and grows them back while requests succeed, and a CircuitBreaker, which rejects requests
+    with CircuitOpenError once the account keeps failing with other transient errors. An operation run from inside
+    another operation on the same account and thread shares its slot, so nested requests can't deadlock the limiter.
+
+    Args:
+        max_attempts (int, optional): attempts made in total, including the first. Defaults to 4
+        initial_backoff (float, optional): seconds waited before the first retry. Defaults to 0.5
+        max_backoff (float, optional): maximum seconds waited between attempts, unless storage asks for longer with Retry-After. Defaults to 30
+        jitter (float, optional): fraction of each backoff that is randomised, between 0 and 1. Defaults to 0.5
+        max_concurrency (int, optional): maximum requests in flight to one account. Defaults to 128
+        min_concurrency (int, optional): requests in flight to one account are never limited below this. Defaults to 1
+        failure_threshold (int, optional): consecutive transient failures that open an account's circuit. Defaults to 10
+        reset_timeout (float, optional): seconds an account's circuit stays open. Defaults to 30
+    """
+
+    def __init__(self, max_attempts=4, initial_backoff=0.5, max_backoff=30, jitter=0.5, max_concurrency=128, min_concurrency=1,
+                 failure_threshold=10, reset_timeout=30):
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._held = threading.local()
+        self._sleep = time.sleep
+
+    def run(self, operation, account, max_attempts=None):
+        """
+        Runs operation under the policy
+
+        Args:
+            operation (callable): called with no arguments. Called again for each retry, so it must be safe to repeat
+            account (str): name of the storage account the operation talks to
+            max_attempts (int, optional): attempts made in total, eg 1 for an operation that can't be repeated. Defaults to the policy's max_attempts
+
+        Returns:
+            result of operation
+        """
+
+        state = self.__account(account)
+        max_attempts = max_attempts if max_attempts is not None else self.max_attempts
+        attempt = 1
+
+        # A request made while this thread already holds a slot for the account, eg for the user delegation key a SAS
+        # needs, is made in that slot. Waiting for a slot of its own could mean waiting for the one its caller holds
+        held = self.__held()
+        nested = account in held
+
+        while True:
+
+            if not nested and not state.breaker.allow():
+                raise CircuitOpenError(f"Requests to storage account {account} are suspended after repeated failures")
+
+            started = self.__acquire(state, account, held, nested)
+
+            try:
+                result = operation()
+
+            except Exception as e:
+
+                transient = is_transient(e)
+                throttled = is_throttled(e)
+
+                self.__release(state, account, held, started, throttled)
+
+                if transient and not throttled:
+                    state.breaker.record_failure()
+
+                else:
+                    state.breaker.record_other()
+
+                if not transient or attempt >= max_attempts:
+                    raise
+
+                self._sleep(self.backoff(attempt, retry_after(e)))
+
+                attempt += 1
+
+                continue
+
+            except BaseException:
+
+                self.__release(state, account, held, started)
+                state.breaker.record_other()
+                raise
+
+            self.__release(state, account, held, started)
+            state.breaker.record_success()
+
+            return result
+
+    def __held(self):
+        """
+        Returns the accounts the current thread holds a limiter slot for
+        """
+
+        held = getattr(self._held, "accounts", None)
+
+        if held is None:
+            held = self._held.accounts = set()
+
+        return held
+
+    @staticmethod
+    def __acquire(state, account, held, nested):
+
+        if nested:
+            return None
+
+        started = state.limiter.acquire()
+        held.add(account)
+
+        return started
+
+    @staticmethod
+    def __release(state, account, held, started, throttled=False):
+
+        if started is None:
+            return
+
+        held.discard(account)
+        state.limiter.release(started, throttled)
+
+    def pages(self, pager, account):
+        """
+        Iterates the pages of a listing, fetching each page under the policy
+
+        Args:
+            pager (iterator): pages of a listing, eg ItemPaged.by_page(). A page that fails is asked for again, so calling
+                next() again after a failure must fetch the same page, as it does for the azure.core page iterators
+            account (str): name of the storage account the listing is of
+
+        Yields:
+            each page
+        """
+
+        while True:
+
+            try:
+                page = self.run(lambda: next(pager), account)
+
+            except StopIteration:
+                return
+
+            yield page
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait before retrying after attempt failed
+
+        Args:
+            attempt (int): number of the attempt that failed, starting at 1
+            retry_after (float, optional): seconds storage asked the client to wait
+
+        Returns:
+            float: seconds
+        """
+
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** (attempt - 1))
+        delay -= delay * self.jitter * random.random()
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+    def account_state(self, account):
+        """
+        Returns how the policy is currently treating an account
+
+        Returns:
+            AccountState
+        """
+
+        state = self.__account(account)
+
+        return AccountState(state.limiter.limit, state.limiter.in_flight, state.breaker.state, state.breaker.consecutive_failures)
+
+    def reset(self, account=None):
+        """
+        Forgets the throttling and failure history of an account, or of every account if none is given
+        """
+
+        with self._lock:
+
+            if account is None:
+                self._accounts.clear()
+
+            else:
+                self._accounts.pop(account, None)
+
+    def __account(self, account):
+
+        with self._lock:
+
+            state = self._accounts.get(account)
+
+            if state is None:
+                state = _Account(AdaptiveLimiter(self.max_concurrency, self.min_concurrency),
+                                 CircuitBreaker(self.failure_threshold, self.reset_timeout))
+                self._accounts[account] = state
+
+            return state
+
+
+def is_transient(error):
+    """
+    Returns True if error is worth retrying: a connection failure or a status in RETRY_STATUS_CODES
+    """
+
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+
+    return isinstance(error, HttpResponseError) and error.status_code in RETRY_STATUS_CODES
+
+
+def is_throttled(error):
+    """
+    Returns True if storage rejected the request because the account is being throttled
+    """
+
+    return isinstance(error, HttpResponseError) and error.status_code in THROTTLE_STATUS_CODES
+
+
+def retry_after(error):
+    """
+    Returns the seconds given in the Retry-After header of an error response, or None if it has none
+    """
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+
+    if not headers:
+        return None
+
+    value = headers.get("Retry-After")
+
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+# Policy used by every wrapper that is not given its own
+shared_retry_policy = RetryPolicy()
@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta
+import asyncio
+import threading
+
+
+def running_loop():
+    """
+    Returns the event loop running the current coroutine. asyncio.get_running_loop arrived in Python 3.7
+    """
+
+    get_running_loop = getattr(asyncio, "get_running_loop", None)
+
+    if get_running_loop is None:
+        return asyncio.get_event_loop()
+
+    return get_running_loop()
+
+
+class SasCache:
+    """
+    Thread safe cache for user delegation keys and SAS tokens
+
+    Entries are created by a factory which returns the value along with its expiry time (utc). A cached entry is reused
+    until refresh_margin before it expires, after which the next caller refreshes it. Entries that are within twice the
+    margin of expiry are refreshed on a background thread while the cached value continues to be handed out, so callers
+    rarely wait on a network round trip.
+
+    A single SasCache can be shared between several BlobFunctions instances and threads. Asyncio callers use get_async,
+    which makes sure only one refresh per key is in flight on each event loop however many coroutines are waiting on it.
+
+    Args:
+        refresh_margin (timedelta, optional): How long before expiry an entry stops being reused. Defaults to 5 minutes.
+            Capped at a quarter of the entry's lifetime so short lived SAS tokens are still cached.
+        background_refresh (bool, optional): If True entries nearing expiry are refreshed on a background thread. Defaults to True.
+    """
+
+    def __init__(self, refresh_margin=timedelta(minutes=5), background_refresh=True):
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._refreshing = set()
+        self._pending = {}
+
+    def get(self, key, factory):
+        """
+        Returns the cached value for key, creating or refreshing it with factory if required
+
+        Args:
+            key (hashable): cache key, eg (storage_account_name, container_name, permissions)
+            factory (callable): takes no arguments and returns a tuple of (value, expiry). Expiry is a utc datetime
+
+        Returns:
+            The cached value
+        """
+
+        entry = self._entries.get(key)
+
+        if entry is not None:
+
+            value, expiry, margin = entry
+            now = datetime.utcnow()
+
+            if now < expiry - margin:
+
+                if self.background_refresh and now >= expiry - 2 * margin:
+
+                    self.__refresh_in_background(key, factory)
+
+                return value
+
+        return self.__refresh(key, factory, force=False)
+
+    async def get_async(self, key, factory):
+        """
+        Asyncio version of get
+
+        Args:
+            key (hashable): cache key, eg (storage_account_name, container_name, permissions)
+            factory (coroutine function): takes no arguments and returns a tuple of (value, expiry). Expiry is a utc datetime
+
+        Returns:
+            The cached value
+        """
+
+        entry = self._entries.get(key)
+
+        if entry is not None:
+
+            value, expiry, margin = entry
+            now = datetime.utcnow()
+
+            if now < expiry - margin:
+
+                if self.background_refresh and now >= expiry - 2 * margin:
+
+                    self.__refresh_async(key, factory)
+
+                return value
+
+        return await self.__refresh_async(key, factory)
+
+    def peek(self, key):
+        """
+        Returns the cached value for key if it is still usable, otherwise None
+        """
+
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        value, expiry, margin = entry
+
+        if datetime.utcnow() < expiry - margin:
+            return value
+
+        return None
+
+    def put(self, key, value, expiry):
+        """
+        Stores a value that was created outside of the cache, eg by an asyncio caller
+        """
+
+        with self._lock:
+            self._entries[key] = (value, expiry, self.__margin_for(expiry))
+
+    def invalidate(self, key=None):
+        """
+        Removes key from the cache. If no key is given the whole cache is cleared
+        """
+
+        with self._lock:
+
+            if key is None:
+                self._entries.clear()
+
+            else:
+                self._entries.pop(key, None)
+
+    def __margin_for(self, expiry):
+
+        lifetime = expiry - datetime.utcnow()
+
+        return max(min(self.refresh_margin, lifetime / 4), timedelta(0))
+
+    def __key_lock(self, key):
+
+        with self._lock:
+
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+
+            return self._key_locks[key]
+
+    def __refresh(self, key, factory, force):
+
+        with self.__key_lock(key):
+
+            if not force:
+
+                value = self.peek(key)
+
+                if value is not None:
+                    return value
+
+            value, expiry = factory()
+            self.put(key, value, expiry)
+
+            return value
+
+    def __refresh_in_background(self, key, factory):
+
+        with self._lock:
+
+            if key in self._refreshing:
+                return
+
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.__refresh(key, factory, force=True)
+
+            except Exception:
+                # the cached entry is still valid, the next caller past the margin will retry in the foreground
+                pass
+
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=refresh, name="storagewrapper-sas-refresh", daemon=True)
+        thread.start()
+
+    def __refresh_async(self, key, factory):
+
+        # A task can only be awaited on the loop that runs it, so each loop has its own refresh in flight
+        pending_key = (running_loop(), key)
+
+        with self._lock:
+
+            task = self._pending.get(pending_key)
+
+            if task is None:
+
+                task = asyncio.ensure_future(self.__fill_async(pending_key, factory))
+                # background refreshes are never awaited, retrieve their exception so it is not reported as unhandled
+                task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+                self._pending[pending_key] = task
+
+        return task
+
+    async def __fill_async(self, pending_key, factory):
+
+        try:
+            value, expiry = await factory()
+            self.put(pending_key[1], value, expiry)
+
+            return value
+
+        finally:
+            with self._lock:
+                self._pending.pop(pending_key, None)
@@ -0,0 +1,223 @@
+from collections import OrderedDict
+from datetime import timedelta
+from storagewrapper._sas_cache import running_loop
+import asyncio
+import threading
+import time
+
+
+class SecretCache:
+    """
+    Thread safe time-to-live cache for secrets held in key vault
+
+    A secret is fetched from key vault once and then served from memory until the ttl has passed. Secrets and secret
+    clients are held per credential, so a secret is only ever handed to callers using the credential it was fetched
+    with. A caller whose credential cannot read the vault fails as it would without the cache. Only the
+    max_credentials most recently used credentials are remembered, and the secrets and clients of older ones are dropped.
+
+    By default BlobFunctions and FileShareFunctions share one process wide SecretCache, so a storage account access key is
+    only fetched once however many wrapper instances created from the same AuthenticateFunctions use it.
+
+    Asyncio callers use get_async, which fetches with the async key vault client. Concurrent callers on the same event loop
+    share one request.
+
+    Args:
+        ttl (timedelta, optional): How long a secret is served from the cache before it is fetched again. Defaults to 1 hour.
+        max_credentials (int, optional): Number of credentials secrets are held for. Defaults to 16.
+    """
+
+    def __init__(self, ttl=timedelta(hours=1), max_credentials=16):
+        self.ttl = ttl
+        self.max_credentials = max_credentials
+        # (vault_url, secret_name, credential) -> (value, time.monotonic() it was fetched)
+        self._secrets = {}
+        # (vault_url, credential) -> SecretClient
+        self._secret_clients = {}
+        # credentials in order of use, least recent first. Held strongly, so the id of a remembered credential is never reused
+        self._credentials = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pending = {}
+
+    def get(self, vault_url, secret_name, credential):
+        """
+        Returns the value of a secret, fetching it from key vault if it is not cached or has expired
+
+        Args:
+            vault_url (str): URL of key vault in which the secret is stored
+            secret_name (str): Name of the secret
+            credential (token obj): Credential used to access key vault
+
+        Returns:
+            str: value of the secret
+        """
+
+        key = (vault_url, secret_name, credential)
+
+        value = self.__cached(key)
+
+        if value is not None:
+            return value
+
+        with self.__key_lock(key):
+
+            value = self.__cached(key)
+
+            if value is not None:
+                return value
+
+            secret_client = self.__get_secret_client(vault_url, credential)
+            value = secret_client.get_secret(secret_name).value
+
+            self.__store(key, value)
+
+            return value
+
+    async def get_async(self, vault_url, secret_name, credential):
+        """
+        Asyncio version of get. Concurrent callers on the same event loop share a single key vault request
+
+        Args:
+            vault_url (str): URL of key vault in which the secret is stored
+            secret_name (str): Name of the secret
+            credential (async token obj): Async credential used to access key vault
+
+        Returns:
+            str: value of the secret
+        """
+
+        key = (vault_url, secret_name, credential)
+
+        value = self.__cached(key)
+
+        if value is not None:
+            return value
+
+        # A task can only be awaited on the loop that runs it, so each loop has its own request in flight
+        pending_key = (running_loop(), key)
+
+        with self._lock:
+
+            task = self._pending.get(pending_key)
+
+            if task is None:
+
+                task = asyncio.ensure_future(self.__fetch_async(pending_key, credential))
+                self._pending[pending_key] = task
+
+        return await task
+
+    def invalidate(self, vault_url=None, secret_name=None, fetched_before=None):
+        """
+        Removes secrets from the cache so they are fetched again on next use, eg when storage has rejected a rotated key
+
+        Args:
+            vault_url (str, optional): Only secrets from this vault are removed. Defaults to all vaults
+            secret_name (str, optional): Only this secret is removed. Defaults to all secrets
+            fetched_before (float, optional): time.monotonic() value. Secrets fetched after this are kept, so concurrent callers
+                that fail at the same time only trigger one key vault request
+        """
+
+        with self._lock:
+
+            for key in list(self._secrets):
+
+                if vault_url is not None and key[0] != vault_url:
+                    continue
+
+                if secret_name is not None and key[1] != secret_name:
+                    continue
+
+                if fetched_before is not None and self._secrets[key][1] > fetched_before:
+                    continue
+
+                del self._secrets[key]
+
+    def __cached(self, key):
+
+        with self._lock:
+
+            entry = self._secrets.get(key)
+
+            if entry is None:
+                return None
+
+            self._credentials.move_to_end(key[2])
+
+        value, fetched_at = entry
+
+        if time.monotonic() - fetched_at > self.ttl.total_seconds():
+            return None
+
+        return value
+
+    def __store(self, key, value):
+
+        with self._lock:
+            self.__remember(key[2])
+            self._secrets[key] = (value, time.monotonic())
+
+    def __remember(self, credential):
+        """
+        Marks credential as the most recently used, forgetting the least recently used credential if there are too many.
+        Must be called holding _lock
+        """
+
+        self._credentials[credential] = True
+        self._credentials.move_to_end(credential)
+
+        while len(self._credentials) > self.max_credentials:
+
+            forgotten, _ = self._credentials.popitem(last=False)
+
+            # Clients of a forgotten credential are left for the garbage collector rather than closed, as another thread may be using one
+            for entries in (self._secrets, self._secret_clients, self._key_locks):
+
+                for key in [key for key in entries if key[-1] is forgotten]:
+                    del entries[key]
+
+    def __key_lock(self, key):
+
+        with self._lock:
+
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+
+            return self._key_locks[key]
+
+    def __get_secret_client(self, vault_url, credential):
+
+        from azure.keyvault.secrets import SecretClient
+
+        with self._lock:
+
+            self.__remember(credential)
+
+            client_key = (vault_url, credential)
+
+            if client_key not in self._secret_clients:
+                self._secret_clients[client_key] = SecretClient(vault_url=vault_url, credential=credential)
+
+            return self._secret_clients[client_key]
+
+    async def __fetch_async(self, pending_key, credential):
+
+        from azure.keyvault.secrets.aio import SecretClient as AsyncSecretClient
+
+        key = pending_key[1]
+        vault_url, secret_name, _ = key
+
+        try:
+            async with AsyncSecretClient(vault_url=vault_url, credential=credential) as secret_client:
+                secret = await secret_client.get_secret(secret_name)
+
+            self.__store(key, secret.value)
+
+            return secret.value
+
+        finally:
+            with self._lock:
+                self._pending.pop(pending_key, None)
+
+
+shared_secret_cache = SecretCache()
@@ -0,0 +1,108 @@
+from storagewrapper._bulk import OperationReport
+import base64
+import hashlib
+import json
+import os
+
+
+# Name of the manifest written into the root of a synced directory when no manifest_path is given. It is never uploaded
+DEFAULT_MANIFEST_NAME = ".storagewrapper-sync.json"
+
+MANIFEST_VERSION = 1
+
+
+class SyncReport(OperationReport):
+    """
+    Results of BlobFunctions.sync
+
+    results holds an ItemResult for every blob uploaded (detail "uploaded") or deleted (detail "deleted"), along with any
+    failures. Files found to be unchanged are only counted, so the report stays small however large the directory is.
+
+    Attributes:
+        unchanged (int): number of local files that did not need uploading
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.unchanged = 0
+
+    @property
+    def uploaded(self):
+        """list: names of blobs uploaded"""
+        return [result.name for result in self.results if result.succeeded and result.detail == "uploaded"]
+
+    @property
+    def deleted(self):
+        """list: names of orphaned blobs deleted"""
+        return [result.name for result in self.results if result.succeeded and result.detail == "deleted"]
+
+    def __repr__(self):
+        return (f"SyncReport(uploaded={len(self.uploaded)}, deleted={len(self.deleted)}, unchanged={self.unchanged}, failed={len(self.failed)}, "
+                f"bytes={self.bytes_transferred}, elapsed={self.elapsed:.2f}s)")
+
+
+def load_manifest(manifest_path, container_name, prefix):
+    """
+    Loads the entries of a sync manifest, keyed by path relative to the synced directory
+
+    A manifest written for a different container or prefix, or one that cannot be read, is treated as empty so every
+    file is checked against the remote listing.
+
+    Returns:
+        dict: {relative_path: {"size", "mtime_ns", "md5", "etag"}}
+    """
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("container") != container_name or manifest.get("prefix") != prefix:
+        return {}
+
+    return manifest.get("files", {})
+
+
+def save_manifest(manifest_path, container_name, prefix, entries):
+    """
+    Writes a sync manifest atomically, so an interrupted sync never leaves a truncated manifest behind
+    """
+
+    temporary_path = f"{manifest_path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump({"version": MANIFEST_VERSION, "container": container_name, "prefix": prefix, "files": entries}, file)
+
+    os.replace(temporary_path, manifest_path)
+
+
+def is_manifest_file(file_path, manifest_path):
+    """
+    Returns True if file_path is the manifest at manifest_path, or a temporary copy of it left by an interrupted save
+    """
+
+    path = os.path.abspath(file_path)
+
+    if path == manifest_path:
+        return True
+
+    temporary_suffix = path[len(manifest_path):] if path.startswith(manifest_path) else ""
+
+    return temporary_suffix.startswith(".") and temporary_suffix.endswith(".tmp") and temporary_suffix[1:-4].isdigit()
+
+
+def file_md5(file_path, block_size=1024 * 1024):
+    """
+    Returns the base64 encoded MD5 of a file, in the form used for a blob's Content-MD5
+    """
+
+    md5 = hashlib.md5()
+
+    with open(file_path, "rb") as file:
+
+        for block in iter(lambda: file.read(block_size), b""):
+            md5.update(block)
+
+    return base64.b64encode(md5.digest()).decode("ascii")
@@ -0,0 +1,256 @@
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from collections import deque
+from storagewrapper._checkpoint import DownloadProgress
+import io
+import mmap
+import os
+
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+# A block blob is made of at most this many blocks
+MAX_BLOCKS = 50000
+
+
+def split_ranges(size, chunk_size):
+    """
+    Splits size bytes into (offset, length) ranges of at most chunk_size bytes
+    """
+
+    return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+
+
+def stream_ranges(read_range, size, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4):
+    """
+    Yields the content of a remote object in order, fetching ranges of it concurrently
+
+    At most twice max_workers chunks are fetched or buffered at once, so memory use is bounded by chunk_size rather than
+    by the size of the object.
+
+    Args:
+        read_range (callable): read_range(offset, length, stream) writes that range of the object to stream
+        size (int): size of the object in bytes
+        chunk_size (int, optional): size of each ranged request. Defaults to 4MiB
+        max_workers (int, optional): number of ranged requests in flight at once. Defaults to 4
+
+    Yields:
+        bytes: consecutive chunks of the object
+    """
+
+    def fetch(offset, length):
+        stream = io.BytesIO()
+        read_range(offset, length, stream)
+
+        return stream.getvalue()
+
+    ranges = iter(split_ranges(size, chunk_size))
+    window = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storagewrapper-download") as executor:
+
+        try:
+            for offset, length in ranges:
+
+                window.append(executor.submit(fetch, offset, length))
+
+                if len(window) >= max_workers * 2:
+                    yield window.popleft().result()
+
+            while window:
+                yield window.popleft().result()
+
+        finally:
+            for future in window:
+                future.cancel()
+
+
+def download_ranges_to_path(read_range, size, file_path, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4, ranges=None, on_range_complete=None):
+    """
+    Downloads ranges of a remote object concurrently, writing each straight into a preallocated memory mapped file
+
+    Args:
+        read_range (callable): read_range(offset, length, stream) writes that range of the object to stream
+        size (int): size of the object in bytes
+        file_path (str): destination path. It is created, or resized to size if it already exists
+        chunk_size (int, optional): size of each ranged request. Defaults to 4MiB
+        max_workers (int, optional): number of ranged requests in flight at once. Defaults to 4
+        ranges (list, optional): (offset, length) ranges to fetch. Defaults to the whole object
+        on_range_complete (callable, optional): called with (offset, length) once a range has been written and flushed to disk
+
+    Returns:
+        int: number of bytes downloaded
+    """
+
+    if ranges is None:
+        ranges = split_ranges(size, chunk_size)
+
+    mode = "r+b" if os.path.exists(file_path) else "w+b"
+
+    with open(file_path, mode) as file:
+
+        file.truncate(size)
+
+        if size == 0:
+            return 0
+
+        with mmap.mmap(file.fileno(), size) as mapped:
+
+            def fetch(byte_range):
+                offset, length = byte_range
+
+                read_range(offset, length, _MappedWriter(mapped, offset, length))
+
+                if on_range_complete is not None:
+
+                    # Flushes start on a page boundary
+                    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+                    mapped.flush(start, offset + length - start)
+
+                    on_range_complete(offset, length)
+
+                return length
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storagewrapper-download") as executor:
+
+                downloaded = sum(executor.map(fetch, ranges))
+
+            mapped.flush()
+
+    return downloaded
+
+
+def download_resumable(read_range, size, file_path, download, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=4, progress_path=None):
+    """
+    Downloads ranges of a remote object to a local file as download_ranges_to_path does, recording each range written in
+    a DownloadProgress file so that a download that failed part way only fetches the ranges it is missing
+
+    The progress is discarded if it describes another download, eg because the object has a new ETag, or if the partial
+    file is missing or the wrong size. The progress file is deleted once the download is complete, and kept along with
+    the partial file if it fails.
+
+    Args:
+        read_range (callable): read_range(offset, length, stream) writes that range of the object to stream
+        size (int): size of the object in bytes
+        file_path (str): destination path
+        download (dict): describes the object and the version of it being downloaded, eg its url and ETag
+        chunk_size (int, optional): size of each ranged request. Defaults to 4MiB
+        max_workers (int, optional): number of ranged requests in flight at once. Defaults to 4
+        progress_path (str, optional): path of the progress file. Defaults to file_path followed by ".progress"
+
+    Returns:
+        int: number of bytes downloaded by this call
+    """
+
+    ranges = split_ranges(size, chunk_size)
+
+    progress = DownloadProgress(progress_path or f"{file_path}.progress", dict(download, size=size, chunk_size=chunk_size), len(ranges))
+
+    with progress.open(resume=os.path.isfile(file_path) and os.path.getsize(file_path) == size):
+
+        missing = [byte_range for index, byte_range in enumerate(ranges) if not progress.is_complete(index)]
+
+        downloaded = download_ranges_to_path(read_range, size, file_path, chunk_size=chunk_size, max_workers=max_workers, ranges=missing,
+                                             on_range_complete=lambda offset, length: progress.complete(offset // chunk_size))
+
+    progress.remove()
+
+    return downloaded
+
+
+def block_size_for(size, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Returns block_size, or the smallest size that splits size bytes into no more than MAX_BLOCKS blocks if that is larger
+    """
+
+    return max(block_size, -(-size // MAX_BLOCKS), 1)
+
+
+def stage_blocks_from_path(stage_block, file_path, blocks, max_workers=8, on_block_staged=None):
+    """
+    Stages blocks of a local file concurrently, reading each straight out of a memory map of the file
+
+    Only max_workers blocks are held in memory at once. The first block that fails to stage stops the blocks not yet
+    started, and its error is raised once those in flight have finished.
+
+    Args:
+        stage_block (callable): stage_block(index, data) uploads one block
+        file_path (str): path of the source file
+        blocks (list): (index, offset, length) of each block to stage
+        max_workers (int, optional): number of blocks staged at once. Defaults to 8
+        on_block_staged (callable, optional): called with index once a block has been staged
+
+    Returns:
+        int: number of bytes staged
+    """
+
+    if not blocks:
+        return 0
+
+    with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+        def stage(index, offset, length):
+
+            stage_block(index, mapped[offset:offset + length])
+
+            if on_block_staged is not None:
+                on_block_staged(index)
+
+            return length
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storagewrapper-upload") as executor:
+
+            futures = [executor.submit(stage, *block) for block in blocks]
+
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in pending:
+                future.cancel()
+
+        for future in futures:
+
+            if not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+
+        return sum(future.result() for future in futures)
+
+
+class _MappedWriter:
+    """
+    File-like object that writes into one range of a memory mapped file
+    """
+
+    def __init__(self, mapped, offset, length):
+        self.mapped = mapped
+        self.position = offset
+        self.end = offset + length
+
+    def write(self, data):
+
+        length = len(data)
+
+        if self.position + length > self.end:
+            raise ValueError("More data received than the requested range")
+
+        self.mapped[self.position:self.position + length] = data
+        self.position += length
+
+        return length
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position):
+        # Only used to rewind to the start of the range before a request is retried
+        self.position = position
+
+        return position
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
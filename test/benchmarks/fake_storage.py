@@ -0,0 +1,639 @@
+"""
+In-process stand-in for the parts of the blob, file share and queue REST APIs used by the benchmarks
+
+FakeTransport is an azure-core HttpTransport, so requests go through the real sdk clients and pipelines and only the
+network is replaced. Pass it to a ClientRegistry with transport_factory. Each request sleeps for latency seconds to
+simulate a round trip, which is what makes concurrency matter.
+"""
+
+from azure.core.pipeline.transport import HttpTransport, HttpResponse
+from azure.core.utils import CaseInsensitiveDict
+from email.utils import formatdate
+from urllib.parse import urlparse, parse_qs, unquote
+from xml.sax.saxutils import escape
+import base64
+import hashlib
+import re
+import threading
+import time
+import uuid
+
+
+class FakeResponse(HttpResponse):
+
+    def __init__(self, request, status, body=b"", headers=None):
+        super().__init__(request, None)
+        self.status_code = status
+        self.reason = "OK" if status < 400 else "Error"
+        self._body = body
+        self.headers = CaseInsensitiveDict({"x-ms-request-id": str(uuid.uuid4()), "Date": formatdate(usegmt=True), "x-ms-version": "2021-08-06"})
+        self.headers.update(headers or {})
+        self.headers.setdefault("Content-Length", str(len(body)))
+        self.content_type = self.headers.get("Content-Type")
+
+    def body(self):
+        return self._body
+
+    def read(self):
+        return self._body
+
+    def text(self, encoding=None):
+        return self._body.decode(encoding or "utf-8")
+
+    def stream_download(self, pipeline, **kwargs):
+        return _Stream(self._body, self)
+
+
+class _Stream:
+
+    def __init__(self, data, response):
+        self._chunks = iter([data] if data else [])
+        self.response = response
+        self.content_length = len(data)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        pass
+
+
+class FakeStorage:
+    """
+    State of one fake storage account: containers of blobs, shares of files and queues of messages
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.containers = {}
+        self.blocks = {}
+        self.shares = {}
+        self.queues = {}
+        self.requests = 0
+
+    def seed_blobs(self, container_name, names, data):
+        """
+        Creates blobs directly in the store, without making requests
+        """
+
+        blobs = self.containers.setdefault(container_name, {})
+        md5 = base64.b64encode(hashlib.md5(data).digest()).decode()
+
+        for name in names:
+            blobs[name] = {"data": data, "etag": _etag(), "modified": _now(), "md5": md5}
+
+    def seed_messages(self, queue_name, contents):
+        """
+        Adds visible messages directly to a queue, without making requests
+        """
+
+        messages = self.queues.setdefault(queue_name, [])
+        now = time.time()
+
+        for content in contents:
+            messages.append({"id": str(uuid.uuid4()), "text": escape(content), "inserted": now, "visible_at": now, "pop_receipt": uuid.uuid4().hex,
+                             "dequeue_count": 0})
+
+    def seed_tree(self, share_name, root, directories, files_per_directory, depth, size=0):
+        """
+        Creates a directory tree directly in the store, without making requests
+
+        Returns:
+            int: number of files and directories created
+        """
+
+        share = self.shares.setdefault(share_name, {"": None})
+        share[root] = None
+        created = 1
+
+        level = [root]
+
+        for _ in range(depth):
+
+            next_level = []
+
+            for parent in level:
+
+                for index in range(files_per_directory):
+                    share[f"{parent}/file{index}"] = b"\0" * size
+                    created += 1
+
+                for index in range(directories):
+                    path = f"{parent}/dir{index}"
+                    share[path] = None
+                    next_level.append(path)
+                    created += 1
+
+            level = next_level
+
+        return created
+
+
+def _now():
+    return formatdate(usegmt=True)
+
+
+def _etag():
+    return '"0x%s"' % uuid.uuid4().hex[:16].upper()
+
+
+def _body_bytes(body):
+
+    if body is None:
+        return b""
+
+    if hasattr(body, "read"):
+        return body.read()
+
+    if isinstance(body, str):
+        return body.encode("utf-8")
+
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+
+    return b"".join(body)
+
+
+class FakeTransport(HttpTransport):
+    """
+    Answers blob, file and queue requests from a FakeStorage
+
+    Args:
+        storage (FakeStorage): account state, shared by every transport of a benchmark
+        latency (float, optional): seconds each request takes. Defaults to 0
+    """
+
+    def __init__(self, storage, latency=0.0):
+        self.storage = storage
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, request, **kwargs):
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.storage.lock:
+            self.storage.requests += 1
+
+        url = urlparse(request.url)
+        query = {key: values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        headers = {key.lower(): value for key, value in request.headers.items()}
+        parts = [unquote(part) for part in url.path.lstrip("/").split("/")] if url.path.strip("/") else []
+
+        if ".blob." in url.netloc:
+            return self.__blob(request, query, headers, parts)
+
+        if ".file." in url.netloc:
+            return self.__file(request, query, headers, parts)
+
+        if ".queue." in url.netloc:
+            return self.__queue(request, query, headers, parts)
+
+        raise NotImplementedError(url.netloc)
+
+    # Blob
+
+    def __blob(self, request, query, headers, parts):
+
+        storage = self.storage
+        method = request.method
+
+        if not parts:
+
+            if query.get("comp") == "userdelegationkey":
+                key = base64.b64encode(b"k" * 32).decode()
+                body = ('<?xml version="1.0" encoding="utf-8"?><UserDelegationKey><SignedOid>o</SignedOid><SignedTid>t</SignedTid>'
+                        '<SignedStart>2020-01-01T00:00:00Z</SignedStart><SignedExpiry>2030-01-01T00:00:00Z</SignedExpiry>'
+                        f'<SignedService>b</SignedService><SignedVersion>2020-02-10</SignedVersion><Value>{key}</Value></UserDelegationKey>')
+
+                return FakeResponse(request, 200, body.encode(), {"Content-Type": "application/xml"})
+
+            raise NotImplementedError(query)
+
+        container = parts[0]
+        name = "/".join(parts[1:]) or None
+
+        with storage.lock:
+
+            if name is None:
+
+                if query.get("comp") == "batch":
+                    return self.__blob_batch(request, container)
+
+                if query.get("restype") == "container" and method == "PUT":
+
+                    if container in storage.containers:
+                        return FakeResponse(request, 409, b"", {"x-ms-error-code": "ContainerAlreadyExists"})
+
+                    storage.containers[container] = {}
+
+                    return FakeResponse(request, 201, b"", {"ETag": _etag(), "Last-Modified": _now()})
+
+                if query.get("restype") == "container" and method == "DELETE":
+                    storage.containers.pop(container, None)
+
+                    return FakeResponse(request, 202)
+
+                if query.get("comp") == "list":
+                    return self.__list_blobs(request, container, query)
+
+                raise NotImplementedError((method, query))
+
+            blobs = storage.containers.get(container)
+
+            if blobs is None:
+                return FakeResponse(request, 404, b"", {"x-ms-error-code": "ContainerNotFound"})
+
+            if method == "PUT" and query.get("comp") == "block":
+                storage.blocks.setdefault((container, name), {})[query["blockid"]] = _body_bytes(request.body)
+
+                return FakeResponse(request, 201)
+
+            if method == "PUT" and query.get("comp") == "blocklist":
+                block_ids = re.findall(r"<(?:Latest|Uncommitted|Committed)>([^<]*)<", _body_bytes(request.body).decode("utf-8"))
+                staged = storage.blocks.pop((container, name), {})
+
+                return self.__put_blob(request, blobs, name, b"".join(staged[block_id] for block_id in block_ids), headers)
+
+            if method == "PUT":
+                return self.__put_blob(request, blobs, name, _body_bytes(request.body), headers)
+
+            blob = blobs.get(name)
+
+            if blob is None:
+                return FakeResponse(request, 404, b"", {"x-ms-error-code": "BlobNotFound"})
+
+            if "if-match" in headers and headers["if-match"] != blob["etag"]:
+                return FakeResponse(request, 412, b"", {"x-ms-error-code": "ConditionNotMet"})
+
+            if "if-none-match" in headers and headers["if-none-match"] == blob["etag"]:
+                return FakeResponse(request, 304, b"", self.__blob_headers(blob))
+
+            if method == "DELETE":
+                del blobs[name]
+
+                return FakeResponse(request, 202)
+
+            if method == "HEAD":
+                return FakeResponse(request, 200, b"", dict(self.__blob_headers(blob), **{"Content-Length": str(len(blob["data"]))}))
+
+            if method == "GET":
+
+                data = blob["data"]
+                byte_range = headers.get("x-ms-range") or headers.get("range")
+                response_headers = self.__blob_headers(blob)
+
+                if byte_range:
+                    start, end = byte_range.split("=")[1].split("-")
+                    start = int(start)
+                    end = min(int(end), len(data) - 1) if end else len(data) - 1
+                    response_headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+
+                    return FakeResponse(request, 206, data[start:end + 1], response_headers)
+
+                return FakeResponse(request, 200, data, response_headers)
+
+        raise NotImplementedError(method)
+
+    @staticmethod
+    def __blob_headers(blob):
+
+        return {"ETag": blob["etag"], "Last-Modified": blob["modified"], "x-ms-creation-time": blob["modified"], "x-ms-blob-type": "BlockBlob",
+                "Content-Type": "application/octet-stream", "Content-MD5": blob["md5"]}
+
+    @staticmethod
+    def __put_blob(request, blobs, name, data, headers):
+
+        blob = {"data": data, "etag": _etag(), "modified": _now(),
+                "md5": headers.get("x-ms-blob-content-md5") or base64.b64encode(hashlib.md5(data).digest()).decode()}
+
+        blobs[name] = blob
+
+        return FakeResponse(request, 201, b"", {"ETag": blob["etag"], "Last-Modified": blob["modified"], "Content-MD5": blob["md5"]})
+
+    def __list_blobs(self, request, container, query):
+
+        blobs = self.storage.containers.get(container)
+
+        if blobs is None:
+            return FakeResponse(request, 404, b"", {"x-ms-error-code": "ContainerNotFound"})
+
+        prefix = query.get("prefix", "")
+        delimiter = query.get("delimiter")
+        marker = query.get("marker", "")
+        max_results = int(query.get("maxresults", 5000))
+
+        items = []
+        prefixes = set()
+
+        for name in sorted(blobs):
+
+            if not name.startswith(prefix) or (marker and name < marker):
+                continue
+
+            rest = name[len(prefix):]
+
+            if delimiter and delimiter in rest:
+
+                virtual_directory = prefix + rest.split(delimiter)[0] + delimiter
+
+                if virtual_directory not in prefixes:
+                    prefixes.add(virtual_directory)
+                    items.append(("prefix", virtual_directory))
+
+                continue
+
+            items.append(("blob", name))
+
+        page, remaining = items[:max_results], items[max_results:]
+
+        out = [f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="https://x/" ContainerName="{escape(container)}">'
+               f'<Prefix>{escape(prefix)}</Prefix><MaxResults>{max_results}</MaxResults>']
+
+        if delimiter:
+            out.append(f"<Delimiter>{escape(delimiter)}</Delimiter>")
+
+        out.append("<Blobs>")
+
+        for kind, name in page:
+
+            if kind == "prefix":
+                out.append(f"<BlobPrefix><Name>{escape(name)}</Name></BlobPrefix>")
+                continue
+
+            blob = blobs[name]
+            out.append(f"<Blob><Name>{escape(name)}</Name><Properties><Last-Modified>{blob['modified']}</Last-Modified><Etag>{blob['etag']}</Etag>"
+                       f"<Content-Length>{len(blob['data'])}</Content-Length><Content-Type>application/octet-stream</Content-Type>"
+                       f"<Content-MD5>{blob['md5']}</Content-MD5><BlobType>BlockBlob</BlobType></Properties></Blob>")
+
+        out.append("</Blobs>")
+        out.append(f"<NextMarker>{escape(remaining[0][1]) if remaining else ''}</NextMarker></EnumerationResults>")
+
+        return FakeResponse(request, 200, "".join(out).encode("utf-8"), {"Content-Type": "application/xml"})
+
+    def __blob_batch(self, request, container):
+
+        blobs = self.storage.containers.get(container, {})
+        body = _body_bytes(request.body).decode("utf-8")
+        boundary = "batchresponse_" + uuid.uuid4().hex
+
+        out = []
+
+        for content_id, path in enumerate(re.findall(r"^DELETE (\S+) HTTP/1.1", body, re.MULTILINE)):
+
+            name = unquote(urlparse(path).path.lstrip("/").split("/", 1)[1])
+
+            if blobs.pop(name, None) is None:
+                status = "404 The specified blob does not exist.\r\nx-ms-error-code: BlobNotFound"
+
+            else:
+                status = "202 Accepted\r\nx-ms-delete-type-permanent: true"
+
+            out.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                       f"HTTP/1.1 {status}\r\nx-ms-request-id: {uuid.uuid4()}\r\nx-ms-version: 2021-08-06\r\n\r\n")
+
+        out.append(f"--{boundary}--\r\n")
+
+        return FakeResponse(request, 202, "".join(out).encode("utf-8"), {"Content-Type": f"multipart/mixed; boundary={boundary}"})
+
+    # File share
+
+    def __file(self, request, query, headers, parts):
+
+        storage = self.storage
+        method = request.method
+
+        if not parts:
+            raise NotImplementedError(query)
+
+        share_name = parts[0]
+        path = "/".join(parts[1:])
+
+        with storage.lock:
+
+            if not path and query.get("restype") == "share":
+
+                if method == "PUT":
+                    storage.shares.setdefault(share_name, {"": None})
+
+                    return FakeResponse(request, 201, b"", {"ETag": _etag(), "Last-Modified": _now()})
+
+                if method == "DELETE":
+                    storage.shares.pop(share_name, None)
+
+                    return FakeResponse(request, 202)
+
+            share = storage.shares.get(share_name)
+
+            if share is None:
+                return FakeResponse(request, 404, b"", {"x-ms-error-code": "ShareNotFound"})
+
+            parent = path.rsplit("/", 1)[0] if "/" in path else ""
+
+            if query.get("restype") == "directory":
+
+                if query.get("comp") == "list":
+                    return self.__list_directory(request, share_name, share, path)
+
+                if method == "PUT":
+
+                    if path in share:
+                        return FakeResponse(request, 409, b"", {"x-ms-error-code": "ResourceAlreadyExists"})
+
+                    if parent not in share:
+                        return FakeResponse(request, 404, b"", {"x-ms-error-code": "ParentNotFound"})
+
+                    share[path] = None
+
+                    return FakeResponse(request, 201, b"", {"ETag": _etag(), "Last-Modified": _now()})
+
+                if method == "DELETE":
+
+                    if path not in share or share[path] is not None:
+                        return FakeResponse(request, 404, b"", {"x-ms-error-code": "ResourceNotFound"})
+
+                    if any(other.startswith(path + "/") for other in share):
+                        return FakeResponse(request, 409, b"", {"x-ms-error-code": "DirectoryNotEmpty"})
+
+                    del share[path]
+
+                    return FakeResponse(request, 202)
+
+            if method == "PUT" and query.get("comp") == "range":
+
+                if share.get(path) is None:
+                    return FakeResponse(request, 404, b"", {"x-ms-error-code": "ResourceNotFound"})
+
+                start, end = headers["x-ms-range"].split("=")[1].split("-")
+                data = bytearray(share[path])
+                data[int(start):int(end) + 1] = _body_bytes(request.body)
+                share[path] = bytes(data)
+
+                return FakeResponse(request, 201, b"", {"ETag": _etag(), "Last-Modified": _now()})
+
+            if method == "PUT":
+
+                if parent not in share:
+                    return FakeResponse(request, 404, b"", {"x-ms-error-code": "ParentNotFound"})
+
+                share[path] = b"\0" * int(headers.get("x-ms-content-length", 0))
+
+                return FakeResponse(request, 201, b"", {"ETag": _etag(), "Last-Modified": _now()})
+
+            if method == "DELETE":
+
+                if share.get(path) is None:
+                    return FakeResponse(request, 404, b"", {"x-ms-error-code": "ResourceNotFound"})
+
+                del share[path]
+
+                return FakeResponse(request, 202)
+
+        raise NotImplementedError((method, query))
+
+    @staticmethod
+    def __list_directory(request, share_name, share, path):
+
+        if path not in share or share[path] is not None:
+            return FakeResponse(request, 404, b"", {"x-ms-error-code": "ResourceNotFound"})
+
+        prefix = path + "/" if path else ""
+
+        out = [f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="https://x/" ShareName="{escape(share_name)}" '
+               f'DirectoryPath="{escape(path)}"><Entries>']
+
+        for other in sorted(share):
+
+            if not other or not other.startswith(prefix) or "/" in other[len(prefix):]:
+                continue
+
+            name = escape(other[len(prefix):])
+
+            if share[other] is None:
+                out.append(f"<Directory><Name>{name}</Name><Properties /></Directory>")
+
+            else:
+                out.append(f"<File><Name>{name}</Name><Properties><Content-Length>{len(share[other])}</Content-Length></Properties></File>")
+
+        out.append("</Entries><NextMarker /></EnumerationResults>")
+
+        return FakeResponse(request, 200, "".join(out).encode("utf-8"), {"Content-Type": "application/xml"})
+
+    # Queue
+
+    def __queue(self, request, query, headers, parts):
+
+        storage = self.storage
+        method = request.method
+
+        if not parts:
+            raise NotImplementedError(query)
+
+        queue_name = parts[0]
+
+        with storage.lock:
+
+            if len(parts) == 1:
+
+                if method == "PUT":
+                    storage.queues.setdefault(queue_name, [])
+
+                    return FakeResponse(request, 201)
+
+                if method == "DELETE":
+                    storage.queues.pop(queue_name, None)
+
+                    return FakeResponse(request, 204)
+
+                raise NotImplementedError((method, query))
+
+            messages = storage.queues.get(queue_name)
+
+            if messages is None:
+                return FakeResponse(request, 404, b"", {"x-ms-error-code": "QueueNotFound"})
+
+            now = time.time()
+
+            if len(parts) == 2 and method == "POST":
+
+                text = re.search(r"<MessageText>(.*)</MessageText>", _body_bytes(request.body).decode("utf-8"), re.DOTALL).group(1)
+                message = {"id": str(uuid.uuid4()), "text": text, "inserted": now, "visible_at": now + int(query.get("visibilitytimeout", 0)),
+                           "pop_receipt": uuid.uuid4().hex, "dequeue_count": 0}
+                messages.append(message)
+
+                return FakeResponse(request, 201, ("<QueueMessagesList>" + self.__message_xml(message, False) + "</QueueMessagesList>").encode("utf-8"),
+                                    {"Content-Type": "application/xml"})
+
+            if len(parts) == 2 and method == "GET":
+
+                count = int(query.get("numofmessages", 1))
+                visibility_timeout = int(query.get("visibilitytimeout", 30))
+                received = []
+
+                for message in messages:
+
+                    if len(received) >= count:
+                        break
+
+                    if message["visible_at"] > now:
+                        continue
+
+                    message["visible_at"] = now + visibility_timeout
+                    message["pop_receipt"] = uuid.uuid4().hex
+                    message["dequeue_count"] += 1
+                    received.append(message)
+
+                body = "<QueueMessagesList>" + "".join(self.__message_xml(message, True) for message in received) + "</QueueMessagesList>"
+
+                return FakeResponse(request, 200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+            if len(parts) == 2 and method == "DELETE":
+                messages.clear()
+
+                return FakeResponse(request, 204)
+
+            message = next((message for message in messages if message["id"] == parts[2]), None)
+
+            if message is None or message["pop_receipt"] != query.get("popreceipt"):
+                return FakeResponse(request, 404, b"", {"x-ms-error-code": "MessageNotFound"})
+
+            if method == "DELETE":
+                messages.remove(message)
+
+                return FakeResponse(request, 204)
+
+            if method == "PUT":
+                message["visible_at"] = now + int(query.get("visibilitytimeout", 0))
+                message["pop_receipt"] = uuid.uuid4().hex
+
+                return FakeResponse(request, 204, b"", {"x-ms-popreceipt": message["pop_receipt"],
+                                                        "x-ms-time-next-visible": formatdate(message["visible_at"], usegmt=True)})
+
+        raise NotImplementedError((method, query))
+
+    @staticmethod
+    def __message_xml(message, with_content):
+
+        xml = (f"<QueueMessage><MessageId>{message['id']}</MessageId><InsertionTime>{formatdate(message['inserted'], usegmt=True)}</InsertionTime>"
+               f"<ExpirationTime>{formatdate(message['inserted'] + 604800, usegmt=True)}</ExpirationTime><PopReceipt>{message['pop_receipt']}</PopReceipt>"
+               f"<TimeNextVisible>{formatdate(message['visible_at'], usegmt=True)}</TimeNextVisible>")
+
+        if with_content:
+            xml += f"<DequeueCount>{message['dequeue_count']}</DequeueCount><MessageText>{message['text']}</MessageText>"
+
+        return xml + "</QueueMessage>"
@@ -0,0 +1,127 @@
+"""
+Measures how long importing storagewrapper takes in a fresh interpreter, and which azure sdks each import loads
+
+Public names are imported from their modules on first use, so a program only pays for the sdks of the wrappers it
+uses. The "everything" scenario imports every public name, which is what import storagewrapper did before names were
+loaded lazily, and the other scenarios are compared against it.
+
+Usage, from the root of the repository:
+
+    python test/benchmarks/import_time.py --repeat 10 --output import_time.json
+"""
+
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = {
+    "package": "import storagewrapper",
+    "authenticate": "from storagewrapper import AuthenticateFunctions",
+    "queue": "from storagewrapper import AuthenticateFunctions, QueueFunctions",
+    "blob": "from storagewrapper import AuthenticateFunctions, BlobFunctions",
+    "fileshare": "from storagewrapper import AuthenticateFunctions, FileShareFunctions",
+    "everything": "import storagewrapper\nfor name in storagewrapper.__all__:\n    getattr(storagewrapper, name)",
+}
+
+# Run in a fresh interpreter for each measurement, so nothing is already imported
+_MEASURE = """
+import json
+import sys
+import time
+
+started = time.perf_counter()
+exec(compile({statement!r}, "<import>", "exec"))
+elapsed = time.perf_counter() - started
+
+sdks = sorted({{".".join(name.split(".")[:3 if name.startswith("azure.storage.") else 2]) for name in sys.modules
+               if name.startswith("azure.") and name != "azure.storage" and not name.startswith("azure.core")}})
+
+print(json.dumps({{"seconds": elapsed, "sdks": sdks}}))
+"""
+
+
+def measure(statement):
+    """
+    Runs statement in a new interpreter with main on its path
+
+    Returns:
+        dict: seconds the statement took and the azure packages, other than azure.core, it imported
+    """
+
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.join(ROOT, "main"), os.environ.get("PYTHONPATH")])),
+                       PYTHONDONTWRITEBYTECODE="")
+
+    output = subprocess.run([sys.executable, "-c", _MEASURE.format(statement=statement)], check=True, stdout=subprocess.PIPE,
+                            env=environment).stdout
+
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def run(scenarios, repeat):
+
+    # Compiles bytecode up front so the first measurement doesn't include it
+    measure(SCENARIOS["everything"])
+
+    results = []
+
+    for scenario in scenarios:
+
+        measurements = [measure(SCENARIOS[scenario]) for _ in range(repeat)]
+        seconds = [measurement["seconds"] for measurement in measurements]
+
+        results.append({
+            "scenario": scenario,
+            "repeat": repeat,
+            "median_ms": round(statistics.median(seconds) * 1000, 3),
+            "min_ms": round(min(seconds) * 1000, 3),
+            "sdks": measurements[-1]["sdks"],
+        })
+
+    everything = next((result["median_ms"] for result in results if result["scenario"] == "everything"), None)
+
+    print(f"{'scenario':<14}{'median':>12}{'min':>12}{'saving':>10}  sdks imported")
+
+    for result in results:
+
+        saving = f"{1 - result['median_ms'] / everything:.0%}" if everything else "-"
+
+        print(f"{result['scenario']:<14}{result['median_ms']:>10.1f}ms{result['min_ms']:>10.1f}ms{saving:>10}  {', '.join(result['sdks']) or '-'}")
+
+    return results
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="scenarios to run. Defaults to all")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to time each scenario in. Defaults to 5")
+    parser.add_argument("--output", help="file to write results to as JSON")
+
+    args = parser.parse_args(argv)
+
+    results = run(args.scenarios, args.repeat)
+
+    if args.output:
+
+        document = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+Benchmarks BlobFunctions, FileShareFunctions and QueueFunctions against an in-process fake of Azure storage
+
+Every scenario is run at each level of concurrency given, and reports operations per second, MB per second and p50/p99
+latency of the individual calls. Results are written as JSON so runs on different commits can be compared, and a
+previous result file can be given as a baseline to flag regressions.
+
+Usage, from the root of the repository:
+
+    python test/benchmarks/run_benchmarks.py --concurrency 1 4 16 --output benchmark.json
+    python test/benchmarks/run_benchmarks.py --baseline benchmark.json
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.insert(0, os.path.join(ROOT, "main"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from azure.core.credentials import AccessToken  # noqa: E402
+from azure.storage.blob import ContainerSasPermissions  # noqa: E402
+from azure.storage.fileshare import AccountSasPermissions  # noqa: E402
+from fake_storage import FakeStorage, FakeTransport  # noqa: E402
+from storagewrapper import BlobFunctions, ClientRegistry, FileShareFunctions, QueueFunctions, RetryPolicy  # noqa: E402
+
+
+ACCOUNT = "benchmarkaccount"
+ACCOUNT_KEY = "YmVuY2htYXJrYWNjb3VudGtleWJlbmNobWFya2FjY291bnRrZXk="
+
+
+class _Credential:
+
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("token", int(time.time()) + 3600)
+
+
+class _Authenticator:
+    """
+    Stands in for AuthenticateFunctions, which needs a real AAD tenant
+    """
+
+    def __init__(self):
+        self.token = _Credential()
+        self.sas_duration = timedelta(hours=1)
+        self.container_sas_permissions = ContainerSasPermissions(read=True, write=True, delete=True, list=True)
+        self.fileshare_sas_permissions = AccountSasPermissions(read=True, write=True, delete=True, list=True, create=True)
+
+
+class Measurement:
+    """
+    Timings of one scenario at one level of concurrency
+    """
+
+    def __init__(self, operations, seconds, bytes_transferred=0, latencies=None):
+        self.operations = operations
+        self.seconds = seconds
+        self.bytes_transferred = bytes_transferred
+        self.latencies = sorted(latencies) if latencies else []
+
+    def percentile(self, percent):
+
+        if not self.latencies:
+            return None
+
+        index = max(int(round(percent / 100 * len(self.latencies))) - 1, 0)
+
+        return self.latencies[min(index, len(self.latencies) - 1)] * 1000
+
+    def as_dict(self, scenario, concurrency):
+
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "operations": self.operations,
+            "bytes": self.bytes_transferred,
+            "seconds": round(self.seconds, 6),
+            "ops_per_second": round(self.operations / self.seconds, 2) if self.seconds else None,
+            "mb_per_second": round(self.bytes_transferred / self.seconds / 1024 ** 2, 3) if self.seconds and self.bytes_transferred else None,
+            "p50_ms": _round(self.percentile(50)),
+            "p99_ms": _round(self.percentile(99)),
+        }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class Benchmark:
+    """
+    Wrappers connected to a fresh fake storage account
+    """
+
+    def __init__(self, latency, items, size):
+        self.items = items
+        self.size = size
+        self.payload = os.urandom(size)
+        self.storage = FakeStorage()
+
+        registry = ClientRegistry(transport_factory=lambda: FakeTransport(self.storage, latency))
+        retry_policy = RetryPolicy(max_concurrency=1024)
+        authenticator = _Authenticator()
+
+        self.blob = BlobFunctions(ACCOUNT, authenticator, client_registry=registry, retry_policy=retry_policy)
+        self.file = FileShareFunctions(ACCOUNT, authenticator, storage_account_access_key=ACCOUNT_KEY, client_registry=registry, retry_policy=retry_policy)
+        self.queue = QueueFunctions(authenticator.token, ACCOUNT, queue_name="benchmark", client_registry=registry, retry_policy=retry_policy)
+
+        self.storage.containers["benchmark"] = {}
+        self.storage.queues["benchmark"] = []
+
+    def seed_blobs(self, count):
+
+        self.storage.seed_blobs("benchmark", (f"seed/{index:06d}" for index in range(count)), self.payload)
+
+    def seed_messages(self, count):
+
+        self.storage.seed_messages("benchmark", (f"message {index}" for index in range(count)))
+
+
+def _timed_calls(function, arguments, concurrency):
+    """
+    Calls function once per argument on concurrency threads
+
+    Returns:
+        tuple: (elapsed seconds, list of latencies)
+    """
+
+    def call(argument):
+        started = time.perf_counter()
+        function(argument)
+
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, arguments))
+
+    return time.perf_counter() - started, latencies
+
+
+def blob_upload(benchmark, concurrency):
+
+    names = [f"upload/{index:06d}" for index in range(benchmark.items)]
+
+    elapsed, latencies = _timed_calls(lambda name: benchmark.blob.upload_blob(name, benchmark.payload, "benchmark"), names, concurrency)
+
+    return Measurement(len(names), elapsed, len(names) * benchmark.size, latencies)
+
+
+def blob_upload_many(benchmark, concurrency):
+
+    items = [(f"upload_many/{index:06d}", benchmark.payload) for index in range(benchmark.items)]
+
+    started = time.perf_counter()
+    report = benchmark.blob.upload_many(items, "benchmark", max_workers=concurrency)
+
+    return Measurement(len(report.succeeded), time.perf_counter() - started, report.bytes_transferred)
+
+
+def blob_download(benchmark, concurrency):
+
+    benchmark.seed_blobs(benchmark.items)
+    names = [f"seed/{index:06d}" for index in range(benchmark.items)]
+
+    elapsed, latencies = _timed_calls(lambda name: benchmark.blob.read_blob("benchmark", name), names, concurrency)
+
+    return Measurement(len(names), elapsed, len(names) * benchmark.size, latencies)
+
+
+def blob_list(benchmark, concurrency):
+
+    benchmark.seed_blobs(benchmark.items * 10)
+    listings = max(concurrency, 4)
+
+    elapsed, latencies = _timed_calls(lambda _: benchmark.blob.list_blobs("benchmark", name_starts_with="seed/", results_per_page=500),
+                                      range(listings), concurrency)
+
+    return Measurement(listings * benchmark.items * 10, elapsed, latencies=latencies)
+
+
+def blob_delete(benchmark, concurrency):
+
+    benchmark.seed_blobs(benchmark.items)
+    names = [f"seed/{index:06d}" for index in range(benchmark.items)]
+
+    elapsed, latencies = _timed_calls(lambda name: benchmark.blob.delete_blob(name, "benchmark"), names, concurrency)
+
+    return Measurement(len(names), elapsed, latencies=latencies)
+
+
+def blob_delete_batch(benchmark, concurrency):
+
+    benchmark.seed_blobs(benchmark.items * 10)
+
+    started = time.perf_counter()
+    report = benchmark.blob.delete_blobs("benchmark", prefix="seed/", max_batches=concurrency)
+
+    return Measurement(len(report.succeeded), time.perf_counter() - started)
+
+
+def file_delete_recursive(benchmark, concurrency):
+
+    created = benchmark.storage.seed_tree("benchmark", "tree", directories=3, files_per_directory=max(benchmark.items // 40, 1), depth=4)
+
+    started = time.perf_counter()
+    report = benchmark.file.delete_directory("benchmark", "tree", recursive=True, delete_files=True, max_workers=concurrency,
+                                             include_directory=True, return_report=True)
+
+    if len(report.succeeded) != created:
+        raise Exception(f"Deleted {len(report.succeeded)} of {created} entries: {report.failed}")
+
+    return Measurement(created, time.perf_counter() - started)
+
+
+def queue_send(benchmark, concurrency):
+
+    contents = [f"message {index}" for index in range(benchmark.items)]
+
+    elapsed, latencies = _timed_calls(benchmark.queue.send_message, contents, concurrency)
+
+    return Measurement(len(contents), elapsed, sum(len(content) for content in contents), latencies)
+
+
+def queue_send_many(benchmark, concurrency):
+
+    contents = [f"message {index}" for index in range(benchmark.items)]
+
+    started = time.perf_counter()
+    report = benchmark.queue.send_messages(contents, concurrency=concurrency)
+
+    return Measurement(len(report.succeeded), time.perf_counter() - started, report.bytes_transferred)
+
+
+def queue_receive(benchmark, concurrency):
+
+    benchmark.seed_messages(benchmark.items)
+
+    started = time.perf_counter()
+    consumer = benchmark.queue.consume("benchmark", lambda message: None, concurrency=concurrency, stop_when_empty=True)
+
+    return Measurement(consumer.stats().succeeded, time.perf_counter() - started)
+
+
+SCENARIOS = {
+    "blob_upload": blob_upload,
+    "blob_upload_many": blob_upload_many,
+    "blob_download": blob_download,
+    "blob_list": blob_list,
+    "blob_delete": blob_delete,
+    "blob_delete_batch": blob_delete_batch,
+    "file_delete_recursive": file_delete_recursive,
+    "queue_send": queue_send,
+    "queue_send_many": queue_send_many,
+    "queue_receive": queue_receive,
+}
+
+
+def _git_commit():
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL).decode("ascii").strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios, concurrency_levels, latency, items, size):
+
+    results = []
+
+    for scenario in scenarios:
+
+        for concurrency in concurrency_levels:
+
+            measurement = SCENARIOS[scenario](Benchmark(latency, items, size), concurrency)
+            result = measurement.as_dict(scenario, concurrency)
+            results.append(result)
+
+            print(f"{scenario:<24}{concurrency:>4}  {_column(result['ops_per_second'], 'ops/s', 10)}  {_column(result['mb_per_second'], 'MB/s', 8)}"
+                  f"  p50 {_column(result['p50_ms'], 'ms', 8)}  p99 {_column(result['p99_ms'], 'ms', 8)}", flush=True)
+
+    return results
+
+
+def _column(value, unit, width):
+
+    return f"{value if value is not None else '-':>{width}} {unit}"
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change in ops/s of every result also in baseline
+
+    Returns:
+        list: results slower than threshold times their baseline
+    """
+
+    previous = {(result["scenario"], result["concurrency"]): result for result in baseline["results"]}
+    regressions = []
+
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+
+    for result in results:
+
+        before = previous.get((result["scenario"], result["concurrency"]))
+
+        if before is None or not before["ops_per_second"] or not result["ops_per_second"]:
+            continue
+
+        ratio = result["ops_per_second"] / before["ops_per_second"]
+        flag = "  REGRESSION" if ratio < threshold else ""
+
+        print(f"{result['scenario']:<24}{result['concurrency']:>4}  {ratio:>6.2f}x{flag}")
+
+        if ratio < threshold:
+            regressions.append(result)
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS), help="scenarios to run. Defaults to all")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="levels of concurrency to run each scenario at")
+    parser.add_argument("--latency", type=float, default=5.0, help="simulated round trip of each request in milliseconds. Defaults to 5")
+    parser.add_argument("--items", type=int, default=200, help="blobs, messages or calls per scenario. Defaults to 200")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="size of each blob in bytes. Defaults to 64KiB")
+    parser.add_argument("--output", help="file to write results to as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.8, help="flag results slower than this fraction of the baseline. Defaults to 0.8")
+
+    args = parser.parse_args(argv)
+
+    results = run(args.scenarios, args.concurrency, args.latency / 1000, args.items, args.size)
+
+    document = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"latency_ms": args.latency, "items": args.items, "size": args.size},
+        "results": results,
+    }
+
+    if args.output:
+
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=2)
+
+    if args.baseline:
+
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
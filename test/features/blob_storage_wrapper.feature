@@ -11,6 +11,7 @@ Feature: Blob storage functionality
         And BlobFunctions has been instantiated with all permissions
         When a <container> is created
         When a upload to blob function is called to <container>
+        When the data directory is uploaded to <container> under bulk/
         Then all <container> in storage account are listed
         Then list blobs function is used in <container>
         Then blob is deleted from <container>
@@ -13,6 +13,7 @@ Feature: File storage functionality
         When a <recursive_path> directory is created recursively in FS <share>
         When a <file> is uploaded to <share> in <directory>
         Then <file> and <directory> are found in <share>
+        Then <recursive_path> is found by walking <share>
         Then <file> is deleted from <directory> in <share>
         Then <directory> is deleted from <share>
         Then <recursive_path> is deleted recursively from <share>
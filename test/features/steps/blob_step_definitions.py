@@ -47,6 +47,14 @@ def upload_file_to_blob(context, container):
     assert blob_client is not None
 
 
+@when("the data directory is uploaded to {container} under {prefix}")
+def upload_data_directory(context, container, prefix):
+    report = context.blob_functions.upload_directory(local_dir=f"{os.getcwd()}/data", container_name=container, prefix=prefix)
+
+    assert report
+    assert f"{prefix}{context.blob_name}" in report.succeeded
+
+
 @then("all {container} in storage account are listed")
 def list_all_containers(context, container):
     list_of_containers = context.blob_functions.list_containers()
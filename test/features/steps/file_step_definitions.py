@@ -102,6 +102,12 @@ def delete_directory_from_share(context, directory, share):
 
     assert delete_dir_status
 
+@then("{recursive_path} is found by walking {share}")
+def walk_share(context, recursive_path, share):
+    paths = [entry.path for entry in context.fileshare_functions.walk(share_name=share) if entry.is_directory]
+
+    assert recursive_path in paths
+
 @then("{recursive_path} is deleted recursively from {share}")
 def delete_path_recursively(context, recursive_path, share):
     delete_dir_status = context.fileshare_functions.delete_directory(share_name=share, directory_name=recursive_path, recursive=True)
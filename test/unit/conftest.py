@@ -0,0 +1,79 @@
+"""
+Shared fixtures for the unit tests, which run offline against LocalBackend and stand-ins for AuthenticateFunctions
+
+Usage, from the root of the repository:
+
+    python -m pytest test/unit
+"""
+
+from datetime import timedelta
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "main"))
+
+from storagewrapper import LocalBackend, RetryPolicy  # noqa: E402
+
+
+class Authenticator:
+    """
+    Stands in for AuthenticateFunctions, which needs a real AAD tenant. LocalBackend needs neither tokens nor SAS permissions
+    """
+
+    token = None
+    sas_duration = timedelta(hours=1)
+    container_sas_permissions = None
+    fileshare_sas_permissions = None
+
+
+@pytest.fixture
+def backend(tmp_path):
+
+    return LocalBackend(str(tmp_path / "storage"))
+
+
+@pytest.fixture
+def retry_policy():
+    """
+    A policy of its own for each test, which doesn't sleep between attempts
+    """
+
+    policy = RetryPolicy()
+    policy._sleep = lambda seconds: None
+
+    return policy
+
+
+@pytest.fixture
+def blob_functions(backend, retry_policy):
+
+    from storagewrapper import BlobFunctions
+
+    blob_functions = BlobFunctions("account", Authenticator(), retry_policy=retry_policy, backend=backend)
+    blob_functions.create_container("container")
+
+    return blob_functions
+
+
+@pytest.fixture
+def fileshare_functions(backend, retry_policy):
+
+    from storagewrapper import FileShareFunctions
+
+    fileshare_functions = FileShareFunctions("account", Authenticator(), retry_policy=retry_policy, backend=backend)
+    fileshare_functions.create_share("share")
+
+    return fileshare_functions
+
+
+@pytest.fixture
+def queue_functions(backend, retry_policy):
+
+    from storagewrapper import QueueFunctions
+
+    queue_functions = QueueFunctions(None, "account", queue_name="queue", retry_policy=retry_policy, backend=backend)
+    queue_functions.create_queue("queue", None)
+
+    return queue_functions
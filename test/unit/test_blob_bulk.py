@@ -0,0 +1,111 @@
+import io
+
+from azure.core.exceptions import ServiceResponseError
+import pytest
+
+from storagewrapper._exceptions import BlobFunctionsError
+
+
+class _Unseekable:
+
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+def test_upload_many_uploads_str_as_content_even_if_it_names_a_file(blob_functions, tmp_path):
+
+    path = tmp_path / "local.txt"
+    path.write_bytes(b"file content")
+
+    report = blob_functions.upload_many([("from-str", str(path)), ("from-path", path)], "container")
+
+    assert report
+    assert blob_functions.read_blob("container", "from-str") == str(path).encode("utf-8")
+    assert blob_functions.read_blob("container", "from-path") == b"file content"
+
+
+def test_upload_many_counts_bytes_of_file_like_sources(blob_functions):
+
+    seekable = io.BytesIO(b"skipped" + b"x" * 100)
+    seekable.seek(7)
+
+    report = blob_functions.upload_many([("seekable", seekable), ("unseekable", _Unseekable(b"y" * 50)), ("bytes", b"z" * 10)], "container")
+
+    assert report
+    assert {result.name: result.bytes_transferred for result in report.results} == {"seekable": 100, "unseekable": 50, "bytes": 10}
+    assert report.bytes_transferred == 160
+    assert blob_functions.read_blob("container", "seekable") == b"x" * 100
+    assert blob_functions.read_blob("container", "unseekable") == b"y" * 50
+
+
+def test_upload_directory_keeps_relative_paths(blob_functions, tmp_path):
+
+    local_dir = tmp_path / "local"
+    (local_dir / "sub").mkdir(parents=True)
+    (local_dir / "top.txt").write_bytes(b"top")
+    (local_dir / "sub" / "nested.txt").write_bytes(b"nested")
+
+    report = blob_functions.upload_directory(str(local_dir), "container", prefix="data/")
+
+    assert report
+    assert sorted(report.succeeded) == ["data/sub/nested.txt", "data/top.txt"]
+    assert report.bytes_transferred == 9
+    assert blob_functions.read_blob("container", "data/sub/nested.txt") == b"nested"
+
+
+class _FlakyBlobClient:
+    """
+    Reads part of the data of the first upload and then drops the connection
+    """
+
+    def __init__(self, blob_client, attempts):
+        self.blob_client = blob_client
+        self.attempts = attempts
+
+    def upload_blob(self, data, **kwargs):
+
+        self.attempts.append(data)
+
+        if len(self.attempts) == 1:
+            data.read(10)
+            raise ServiceResponseError("connection reset")
+
+        return self.blob_client.upload_blob(data=data, **kwargs)
+
+
+def _flaky(blob_functions, monkeypatch):
+
+    attempts = []
+    create = blob_functions._BlobFunctions__create_blob_client_from_url
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__create_blob_client_from_url",
+                        lambda blob_name, container_name: _FlakyBlobClient(create(blob_name, container_name), attempts))
+
+    return attempts
+
+
+def test_upload_blob_rewinds_a_stream_before_retrying(blob_functions, monkeypatch):
+
+    attempts = _flaky(blob_functions, monkeypatch)
+
+    stream = io.BytesIO(b"skipped" + b"x" * 100)
+    stream.seek(7)
+
+    blob_functions.upload_blob("blob", stream, "container")
+    monkeypatch.undo()
+
+    assert len(attempts) == 2
+    assert blob_functions.read_blob("container", "blob") == b"x" * 100
+
+
+def test_upload_blob_does_not_retry_a_stream_that_cannot_seek(blob_functions, monkeypatch):
+
+    attempts = _flaky(blob_functions, monkeypatch)
+
+    with pytest.raises(BlobFunctionsError):
+        blob_functions.upload_blob("blob", _Unseekable(b"x" * 100), "container")
+
+    assert len(attempts) == 1
@@ -0,0 +1,75 @@
+from storagewrapper._blob import BATCH_SIZE
+
+
+class _RecordingContainerClient:
+    """
+    Records the number of blobs in each batch deletion
+    """
+
+    def __init__(self, container_client, batches):
+        self.container_client = container_client
+        self.batches = batches
+
+    def delete_blobs(self, *blobs, **kwargs):
+
+        self.batches.append(len(blobs))
+
+        return self.container_client.delete_blobs(*blobs, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.container_client, name)
+
+
+def _batches(blob_functions, monkeypatch):
+
+    batches = []
+    create = blob_functions._BlobFunctions__create_container_client
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__create_container_client",
+                        lambda container_name: _RecordingContainerClient(create(container_name=container_name), batches))
+
+    return batches
+
+
+def _upload(blob_functions, names):
+
+    for name in names:
+        blob_functions.upload_blob(name, b"x", "container")
+
+    return names
+
+
+def test_names_are_deleted_in_batches_of_at_most_256(blob_functions, monkeypatch):
+
+    names = _upload(blob_functions, [f"blob-{index:03d}" for index in range(BATCH_SIZE + 44)])
+    batches = _batches(blob_functions, monkeypatch)
+
+    report = blob_functions.delete_blobs("container", names=iter(names))
+
+    assert report
+    assert sorted(batches) == [44, BATCH_SIZE]
+    assert sorted(report.succeeded) == names
+    assert blob_functions.list_blobs("container") == []
+
+
+def test_blobs_are_deleted_by_prefix(blob_functions):
+
+    deleted = _upload(blob_functions, ["logs/1", "logs/2", "logs/sub/3"])
+    _upload(blob_functions, ["logsheet", "data/1"])
+
+    report = blob_functions.delete_blobs("container", prefix="logs/")
+
+    assert sorted(report.succeeded) == deleted
+    assert sorted(blob_functions.list_blobs("container")) == ["data/1", "logsheet"]
+
+
+def test_missing_blob_is_reported_as_not_found(blob_functions):
+
+    _upload(blob_functions, ["present"])
+
+    report = blob_functions.delete_blobs("container", names=["present", "missing"])
+
+    assert not report
+    assert report.succeeded == ["present"]
+    assert report.failed == {"missing": "BlobNotFound"}
+    assert [result.detail for result in report.results if result.name == "missing"] == [404]
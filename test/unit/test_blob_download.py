@@ -0,0 +1,26 @@
+import pytest
+
+from storagewrapper._exceptions import BlobFunctionsError
+
+
+def test_download_blob_stream_yields_chunks_in_order(blob_functions):
+
+    data = bytes(range(256)) * 40
+    blob_functions.upload_blob("blob", data, "container")
+
+    chunks = list(blob_functions.download_blob_stream("container", "blob", chunk_size=1000, max_workers=3))
+
+    assert [len(chunk) for chunk in chunks] == [1000] * 10 + [240]
+    assert b"".join(chunks) == data
+
+
+def test_download_blob_stream_raises_blob_functions_error_if_the_blob_changes(blob_functions):
+
+    blob_functions.upload_blob("blob", b"original", "container")
+
+    chunks = blob_functions.download_blob_stream("container", "blob", chunk_size=1)
+
+    blob_functions.upload_blob("blob", b"changed!", "container")
+
+    with pytest.raises(BlobFunctionsError):
+        b"".join(chunks)
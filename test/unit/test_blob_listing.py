@@ -0,0 +1,72 @@
+from azure.core.exceptions import ServiceResponseError
+import pytest
+
+from storagewrapper import BlobFunctions
+from storagewrapper._blob import BlobPage
+from storagewrapper._exceptions import BlobFunctionsError
+
+from conftest import Authenticator
+
+NAMES = ["a/1", "a/2", "a/b/3", "c", "d"]
+
+
+@pytest.fixture
+def populated(blob_functions):
+
+    for name in NAMES:
+        blob_functions.upload_blob(name, name.encode("utf-8"), "container")
+
+    return blob_functions
+
+
+def test_list_blobs_filters_by_prefix_and_rolls_up_directories(populated):
+
+    assert populated.list_blobs("container") == NAMES
+    assert populated.list_blobs("container", name_starts_with="a/") == ["a/1", "a/2", "a/b/3"]
+    assert populated.list_blobs("container", delimiter="/") == ["a/", "c", "d"]
+    assert list(populated.list_blobs("container", lazy=True)) == NAMES
+
+
+def test_list_blob_pages_resumes_from_a_continuation_token(populated):
+
+    pages = list(populated.list_blob_pages("container", results_per_page=2))
+
+    assert [[blob.name for blob in page.blobs] for page in pages] == [["a/1", "a/2"], ["a/b/3", "c"], ["d"]]
+    assert pages[-1].continuation_token is None
+
+    resumed = list(populated.list_blob_pages("container", results_per_page=2, continuation_token=pages[0].continuation_token))
+
+    assert [blob.name for page in resumed for blob in page.blobs] == ["a/b/3", "c", "d"]
+
+
+def test_lazy_listing_of_missing_container_fails_when_called(blob_functions):
+
+    with pytest.raises(BlobFunctionsError):
+        blob_functions.list_blobs("missing", lazy=True)
+
+    with pytest.raises(BlobFunctionsError):
+        blob_functions.list_blob_pages("missing")
+
+
+def test_lazy_listing_with_handle_exceptions_returns_false_when_it_cannot_start(backend):
+
+    blob_functions = BlobFunctions("account", Authenticator(), handle_exceptions=True, backend=backend)
+
+    assert blob_functions.list_blobs("missing", lazy=True) is False
+    assert blob_functions.list_blob_pages("missing") is False
+
+
+def test_page_failing_during_iteration_raises_blob_functions_error(populated, monkeypatch):
+
+    def list_pages(*args):
+        yield BlobPage([], ["a/"], "token")
+        raise ServiceResponseError("connection reset")
+
+    monkeypatch.setattr(populated, "_BlobFunctions__list_pages", list_pages)
+
+    names = populated.list_blobs("container", lazy=True)
+
+    assert next(names) == "a/"
+
+    with pytest.raises(BlobFunctionsError):
+        next(names)
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+import asyncio
+import base64
+
+from azure.storage.blob import UserDelegationKey
+import pytest
+
+from storagewrapper import BlobFunctions, SasCache
+
+from conftest import Authenticator
+
+KEY = ("UserDelegationKey", "account")
+
+
+def user_delegation_key():
+
+    udk = UserDelegationKey()
+    udk.signed_oid = udk.signed_tid = udk.signed_service = udk.signed_version = "x"
+    udk.signed_start = udk.signed_expiry = "2000-01-01T00:00:00Z"
+    udk.value = base64.b64encode(b"key").decode("utf-8")
+
+    return udk
+
+
+@pytest.fixture
+def requested():
+    return []
+
+
+@pytest.fixture
+def blob_functions(requested, monkeypatch):
+
+    blob_functions = BlobFunctions("account", Authenticator(), sas_cache=SasCache(background_refresh=False))
+    blob_functions.sas_permissions = "r"
+
+    def request_user_delegation_key(duration=None):
+
+        expiry = datetime.utcnow() + duration
+        requested.append(expiry)
+
+        return (user_delegation_key(), expiry), expiry
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__request_user_delegation_key", request_user_delegation_key)
+
+    return blob_functions
+
+
+def sas(blob_functions, container_name="container"):
+
+    return blob_functions._BlobFunctions__create_blob_sas_token(container_name)
+
+
+def expiry_of(sas_token):
+
+    return datetime.strptime(parse_qs(sas_token)["se"][0], "%Y-%m-%dT%H:%M:%SZ")
+
+
+def test_sas_tokens_are_cached_and_share_one_key(blob_functions, requested):
+
+    first = sas(blob_functions)
+
+    assert sas(blob_functions) == first
+    assert sas(blob_functions, "other") != first
+    assert len(requested) == 1
+
+
+def test_sas_is_refreshed_before_it_expires(blob_functions):
+
+    sas_key = ("UserDelegationKey", "account", "container", "r")
+    blob_functions.sas_cache._entries[sas_key] = ("old", datetime.utcnow() + timedelta(minutes=2), timedelta(minutes=5))
+
+    refreshed = sas(blob_functions)
+
+    assert refreshed != "old"
+    assert timedelta(minutes=59) < expiry_of(refreshed) - datetime.utcnow() <= timedelta(hours=1)
+
+
+def test_sas_gets_its_whole_duration_from_a_key_near_expiry(blob_functions, requested):
+
+    key_expiry = datetime.utcnow() + timedelta(minutes=30)
+    blob_functions.sas_cache.put(KEY, (user_delegation_key(), key_expiry), key_expiry)
+
+    expiry = expiry_of(sas(blob_functions))
+
+    assert len(requested) == 1
+    assert timedelta(minutes=59) < expiry - datetime.utcnow() <= timedelta(hours=1)
+    assert expiry <= requested[0]
+
+
+def test_sas_never_outlives_its_key(blob_functions, requested):
+
+    blob_functions.sas_duration = timedelta(days=30)
+
+    expiry = expiry_of(sas(blob_functions))
+
+    assert expiry <= requested[0]
+    assert timedelta(days=6) < expiry - datetime.utcnow() < timedelta(days=7)
+
+
+def test_async_sas_gets_its_whole_duration_from_a_key_near_expiry(monkeypatch):
+
+    from storagewrapper import AsyncBlobFunctions
+
+    class AsyncAuthenticator(Authenticator):
+        async_token = None
+
+    blob_functions = AsyncBlobFunctions("account", AsyncAuthenticator(), sas_cache=SasCache(background_refresh=False))
+    blob_functions.sas_permissions = "r"
+    requested = []
+
+    async def request_user_delegation_key(duration):
+
+        expiry = datetime.utcnow() + duration
+        requested.append(expiry)
+
+        return (user_delegation_key(), expiry), expiry
+
+    monkeypatch.setattr(blob_functions, "_AsyncBlobFunctions__request_user_delegation_key", request_user_delegation_key)
+
+    key_expiry = datetime.utcnow() + timedelta(minutes=30)
+    blob_functions.sas_cache.put(KEY, (user_delegation_key(), key_expiry), key_expiry)
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        expiry = expiry_of(loop.run_until_complete(blob_functions._AsyncBlobFunctions__access_key_or_udk("container")))
+
+    finally:
+        loop.close()
+
+    assert len(requested) == 1
+    assert timedelta(minutes=59) < expiry - datetime.utcnow() <= timedelta(hours=1)
+    assert expiry <= requested[0]
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from storagewrapper._sync import DEFAULT_MANIFEST_NAME
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+
+    local_dir = tmp_path / "local"
+    (local_dir / "sub").mkdir(parents=True)
+    (local_dir / "a.txt").write_bytes(b"a")
+    (local_dir / "sub" / "b.txt").write_bytes(b"b")
+
+    return str(local_dir)
+
+
+def blobs(blob_functions):
+
+    return sorted(blob_functions.list_blobs("container"))
+
+
+def test_first_sync_uploads_every_file(blob_functions, local_dir):
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/")
+
+    assert report
+    assert sorted(report.uploaded) == ["data/a.txt", "data/sub/b.txt"]
+    assert blobs(blob_functions) == ["data/a.txt", "data/sub/b.txt"]
+    assert blob_functions.read_blob("container", "data/sub/b.txt") == b"b"
+    assert os.path.isfile(os.path.join(local_dir, DEFAULT_MANIFEST_NAME))
+
+
+def test_unchanged_files_are_skipped(blob_functions, local_dir):
+
+    blob_functions.sync(local_dir, "container", prefix="data/")
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/")
+
+    assert report.uploaded == []
+    assert report.unchanged == 2
+
+
+def test_changed_file_is_uploaded_again(blob_functions, local_dir):
+
+    blob_functions.sync(local_dir, "container", prefix="data/")
+
+    with open(os.path.join(local_dir, "a.txt"), "wb") as file:
+        file.write(b"changed")
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/")
+
+    assert report.uploaded == ["data/a.txt"]
+    assert report.unchanged == 1
+    assert blob_functions.read_blob("container", "data/a.txt") == b"changed"
+
+
+def test_orphans_are_only_deleted_when_asked(blob_functions, local_dir):
+
+    blob_functions.upload_blob("data/orphan.txt", b"orphan", "container")
+    blob_functions.upload_blob("other/kept.txt", b"kept", "container")
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/")
+
+    assert report.deleted == []
+    assert "data/orphan.txt" in blobs(blob_functions)
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/", delete_orphans=True)
+
+    assert report.deleted == ["data/orphan.txt"]
+    assert blobs(blob_functions) == ["data/a.txt", "data/sub/b.txt", "other/kept.txt"]
+
+
+def test_failed_orphan_deletion_is_reported_when_handling_exceptions(blob_functions, local_dir, monkeypatch):
+
+    blob_functions.upload_blob("data/orphan.txt", b"orphan", "container")
+    blob_functions.handle_exceptions = True
+    monkeypatch.setattr(blob_functions, "delete_blobs", lambda container_name, names: False)
+
+    report = blob_functions.sync(local_dir, "container", prefix="data/", delete_orphans=True)
+
+    assert not report
+    assert list(report.failed) == ["data/orphan.txt"]
+
+
+def test_only_the_manifest_itself_is_left_out(blob_functions, local_dir):
+
+    manifest_path = os.path.join(local_dir, DEFAULT_MANIFEST_NAME)
+
+    with open(f"{manifest_path}.backup", "wb") as file:
+        file.write(b"backup")
+
+    with open(f"{manifest_path}.123.tmp", "wb") as file:
+        file.write(b"interrupted save")
+
+    blob_functions.sync(local_dir, "container")
+
+    assert blobs(blob_functions) == sorted([f"{DEFAULT_MANIFEST_NAME}.backup", "a.txt", "sub/b.txt"])
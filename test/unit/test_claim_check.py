@@ -0,0 +1,50 @@
+import pytest
+
+from storagewrapper import ClaimCheck
+
+
+@pytest.fixture
+def claim_check(queue_functions, blob_functions):
+
+    claim_check = ClaimCheck(blob_functions, "container", threshold=16)
+    queue_functions.claim_check = claim_check
+
+    return claim_check
+
+
+def test_payloads_are_checked_out_on_receive(queue_functions, claim_check):
+
+    queue_functions.send_message("x" * 100, visibility_timeout=0)
+
+    with queue_functions.receive_messages() as messages:
+        assert [message.content for message in messages] == ["x" * 100]
+
+
+def test_message_with_missing_payload_is_left_to_reappear(queue_functions, blob_functions, claim_check):
+
+    queue_functions.send_message("x" * 100, visibility_timeout=0)
+
+    for blob_name in blob_functions.list_blobs("container"):
+        blob_functions.delete_blob(blob_name, "container")
+
+    queue_functions.send_message("small", visibility_timeout=0)
+    queue_functions.send_message("y" * 100, visibility_timeout=0)
+
+    with queue_functions.receive_messages(max_messages=1) as messages:
+
+        assert [message.content for message in messages] == ["small", "y" * 100]
+        assert messages.failed_check_outs == 1
+
+
+def test_check_out_raises_when_the_download_is_handled(queue_functions, blob_functions, claim_check):
+
+    queue_functions.send_message("x" * 100, visibility_timeout=0)
+
+    for blob_name in blob_functions.list_blobs("container"):
+        blob_functions.delete_blob(blob_name, "container")
+
+    blob_functions.handle_exceptions = True
+    message = queue_functions.queue_client.receive_message()
+
+    with pytest.raises(Exception, match="Failed to fetch message payload"):
+        claim_check.check_out(message)
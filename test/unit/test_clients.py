@@ -0,0 +1,62 @@
+from storagewrapper import ClientRegistry
+
+
+class Client:
+
+    def __init__(self, transport):
+        self.transport = transport
+
+
+def test_client_is_reused_for_the_same_key_and_credential():
+
+    registry = ClientRegistry()
+
+    client = registry.get(("blob", "account", "container"), Client, credential="token")
+
+    assert registry.get(("blob", "account", "container"), Client, credential="token") is client
+    assert registry.get(("blob", "other", "container"), Client, credential="token") is not client
+    assert len(registry) == 2
+
+
+def test_client_is_rebuilt_when_its_credential_changes():
+
+    registry = ClientRegistry()
+
+    client = registry.get(("blob", "account", "container"), Client, credential="old token")
+    rebuilt = registry.get(("blob", "account", "container"), Client, credential="new token")
+
+    assert rebuilt is not client
+    assert registry.get(("blob", "account", "container"), Client, credential="new token") is rebuilt
+    assert len(registry) == 1
+
+
+def test_least_recently_used_client_is_evicted():
+
+    registry = ClientRegistry(max_clients=2)
+
+    first = registry.get(("blob", "account", "first"), Client)
+    registry.get(("blob", "account", "second"), Client)
+
+    assert registry.get(("blob", "account", "first"), Client) is first
+
+    registry.get(("blob", "account", "third"), Client)
+
+    assert len(registry) == 2
+    assert registry.get(("blob", "account", "first"), Client) is first
+    assert ("blob", "account", "second") not in registry._clients
+
+
+def test_clients_share_one_session():
+
+    registry = ClientRegistry(pool_size=4)
+
+    first = registry.get(("blob", "account", "first"), Client)
+    second = registry.get(("queue", "account", "second"), Client)
+
+    assert first.transport.session is second.transport.session is registry.session
+    assert registry.session.get_adapter("https://account.blob.core.windows.net")._pool_maxsize == 4
+
+    registry.close()
+
+    assert len(registry) == 0
+    assert registry.session is None
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+import base64
+
+from azure.storage.blob import UserDelegationKey
+
+from storagewrapper import BlobFunctions, FileShareFunctions
+
+from conftest import Authenticator
+
+ACCESS_KEY = base64.b64encode(b"key").decode("utf-8")
+
+
+class SecretCache:
+
+    def get(self, vault_url, secret_name, credential):
+        return ACCESS_KEY
+
+
+def sas(url):
+
+    query = parse_qs(urlparse(url).query)
+    expiry = datetime.strptime(query["se"][0], "%Y-%m-%dT%H:%M:%SZ")
+
+    return query["sp"][0], expiry - datetime.utcnow()
+
+
+def test_blob_url_has_a_read_only_sas_of_its_own():
+
+    blob_functions = BlobFunctions("account", Authenticator(), sas_method="AccessKey", vault_url="https://vault", access_key_secret_name="key",
+                                   secret_cache=SecretCache())
+
+    permission, remaining = sas(blob_functions.get_blob_url("container", "blob", sas_duration=timedelta(hours=12)))
+
+    assert permission == "r"
+    assert timedelta(hours=11) < remaining <= timedelta(hours=12)
+
+
+def test_blob_url_user_delegation_key_covers_the_copy(monkeypatch):
+
+    blob_functions = BlobFunctions("account", Authenticator())
+    requested = []
+
+    def request_user_delegation_key(duration=None):
+
+        requested.append(duration)
+
+        udk = UserDelegationKey()
+        udk.signed_oid = udk.signed_tid = udk.signed_service = udk.signed_version = "x"
+        udk.signed_start = udk.signed_expiry = "2000-01-01T00:00:00Z"
+        udk.value = ACCESS_KEY
+        expiry = datetime.utcnow() + duration
+
+        return (udk, expiry), expiry
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__request_user_delegation_key", request_user_delegation_key)
+
+    _, remaining = sas(blob_functions.get_blob_url("container", "first"))
+    blob_functions.get_blob_url("container", "second")
+
+    assert timedelta(hours=23) < remaining <= timedelta(hours=24)
+    assert len(requested) == 1
+    assert timedelta(hours=47) < requested[0] <= timedelta(hours=48)
+
+    _, remaining = sas(blob_functions.get_blob_url("container", "third", sas_duration=timedelta(days=30)))
+
+    assert timedelta(days=6) < remaining < timedelta(days=7)
+    assert len(requested) == 2
+
+
+def test_file_url_has_a_read_only_sas_of_its_own():
+
+    fileshare_functions = FileShareFunctions("account", Authenticator(), storage_account_access_key=ACCESS_KEY)
+
+    url = fileshare_functions.get_file_url("share", "/directory/file.txt")
+    permission, remaining = sas(url)
+
+    assert urlparse(url).path == "/share/directory/file.txt"
+    assert permission == "r"
+    assert timedelta(hours=23) < remaining <= timedelta(hours=24)
@@ -0,0 +1,60 @@
+import time
+
+from azure.core.credentials import AccessToken
+import pytest
+
+from storagewrapper import _credentials
+from storagewrapper._credentials import shared_prefetching_credential
+
+
+class Credential:
+
+    def __init__(self):
+        self.requests = 0
+        self.closed = False
+
+    def get_token(self, *scopes, **kwargs):
+        self.requests += 1
+        return AccessToken("token", int(time.time()) + 3600)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def shared_credentials(monkeypatch):
+
+    shared = {}
+    monkeypatch.setattr(_credentials, "_shared_credentials", shared)
+
+    yield shared
+
+    for _, prefetching_credential in shared.values():
+        prefetching_credential.close()
+
+
+def test_credential_is_shared_for_the_same_secret():
+
+    first, second = Credential(), Credential()
+
+    shared = shared_prefetching_credential(("client_secret", "tenant", "app"), first, version="secret")
+
+    assert shared_prefetching_credential(("client_secret", "tenant", "app"), second, version="secret") is shared
+    assert second.closed
+    assert not first.closed
+
+
+def test_rotated_secret_replaces_the_shared_credential():
+
+    old, new = Credential(), Credential()
+
+    replaced = shared_prefetching_credential(("client_secret", "tenant", "app"), old, version="old secret")
+    shared = shared_prefetching_credential(("client_secret", "tenant", "app"), new, version="new secret")
+
+    assert shared is not replaced
+    assert shared.credential is new
+
+    replaced._thread.join(5)
+
+    assert not replaced._thread.is_alive()
+    assert replaced.get_token("scope").token == "token"
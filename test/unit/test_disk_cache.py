@@ -0,0 +1,50 @@
+import os
+import time
+
+from storagewrapper import DiskCache
+from storagewrapper._disk_cache import STALE_TEMPORARY_FILE_AGE
+
+
+def store(cache, name, size):
+
+    return cache.store(("account", "container", name), "etag", lambda file: file.write(b"x" * size))
+
+
+def age(path, seconds):
+
+    modified = time.time() - seconds
+    os.utime(path, (modified, modified))
+
+
+def test_reads_keep_entries_from_being_evicted(tmp_path):
+
+    cache = DiskCache(str(tmp_path), max_size=250, revalidate_after=60)
+
+    first = store(cache, "first", 100)
+    second = store(cache, "second", 100)
+    age(first.path, 20)
+    age(second.path, 10)
+
+    entry = cache.lookup(("account", "container", "first"))
+
+    assert entry.fresh
+    assert cache.read(entry) == b"x" * 100
+
+    store(cache, "third", 100)
+
+    assert cache.lookup(("account", "container", "first")) is not None
+    assert cache.lookup(("account", "container", "second")) is None
+
+
+def test_stale_temporary_files_are_removed_on_open(tmp_path):
+
+    stale = tmp_path / "stale.data.1.tmp"
+    recent = tmp_path / "recent.data.2.tmp"
+    stale.write_bytes(b"partial")
+    recent.write_bytes(b"partial")
+    age(str(stale), STALE_TEMPORARY_FILE_AGE + 60)
+
+    DiskCache(str(tmp_path))
+
+    assert not stale.exists()
+    assert recent.exists()
@@ -0,0 +1,176 @@
+import os
+
+import pytest
+
+from storagewrapper._checkpoint import DownloadProgress
+from storagewrapper._exceptions import BlobFunctionsError
+
+DOWNLOAD = {"account": "account", "container": "container", "blob": "blob", "etag": "etag", "size": 100, "chunk_size": 10}
+
+
+def test_ranges_are_marked_across_bitmap_bytes(tmp_path):
+
+    path = str(tmp_path / "file.progress")
+
+    with DownloadProgress(path, DOWNLOAD, 10).open() as progress:
+
+        for index in (0, 7, 8):
+            progress.complete(index)
+
+        assert [index for index in range(10) if progress.is_complete(index)] == [0, 7, 8]
+        assert progress.completed == 3
+
+    with DownloadProgress(path, DOWNLOAD, 10).open() as resumed:
+
+        assert [index for index in range(10) if resumed.is_complete(index)] == [0, 7, 8]
+        assert resumed.completed == 3
+
+
+def _completed(path, download, ranges, resume=True):
+
+    with DownloadProgress(path, download, ranges).open(resume=resume) as progress:
+        return progress.completed
+
+
+def test_progress_of_another_version_is_discarded(tmp_path):
+
+    path = str(tmp_path / "file.progress")
+
+    with DownloadProgress(path, DOWNLOAD, 10).open() as progress:
+        progress.complete(0)
+
+    assert _completed(path, dict(DOWNLOAD, etag="changed"), 10) == 0
+    assert _completed(path, DOWNLOAD, 10) == 0
+
+
+def test_bitmap_of_the_wrong_size_is_discarded(tmp_path):
+
+    path = str(tmp_path / "file.progress")
+
+    with DownloadProgress(path, DOWNLOAD, 10).open() as progress:
+        progress.complete(0)
+
+    assert _completed(path, DOWNLOAD, 20) == 0
+
+
+def test_progress_is_discarded_unless_resuming(tmp_path):
+
+    path = str(tmp_path / "file.progress")
+
+    with DownloadProgress(path, DOWNLOAD, 10).open() as progress:
+        progress.complete(0)
+
+    assert _completed(path, DOWNLOAD, 10, resume=False) == 0
+
+
+class ReadFailed(Exception):
+    pass
+
+
+class _FailingBlobClient:
+    """
+    Fails to download the range starting at failing, and records the offset of each range downloaded
+    """
+
+    def __init__(self, blob_client, offsets, failing):
+        self.blob_client = blob_client
+        self.offsets = offsets
+        self.failing = failing
+
+    def download_blob(self, offset=None, length=None, **kwargs):
+
+        if offset == self.failing:
+            raise ReadFailed(offset)
+
+        self.offsets.append(offset)
+
+        return self.blob_client.download_blob(offset=offset, length=length, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.blob_client, name)
+
+
+def _downloading(blob_functions, monkeypatch, failing=None):
+
+    offsets = []
+    create = blob_functions._BlobFunctions__create_blob_client_from_url
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__create_blob_client_from_url",
+                        lambda blob_name, container_name: _FailingBlobClient(create(blob_name, container_name), offsets, failing))
+
+    return offsets
+
+
+@pytest.fixture
+def destination(blob_functions, tmp_path):
+
+    blob_functions.upload_blob("blob", bytes(range(100)), "container")
+
+    return str(tmp_path / "file.bin")
+
+
+def _download(blob_functions, destination):
+
+    return blob_functions.download_to_path("container", "blob", destination, chunk_size=10, max_workers=1, resumable=True)
+
+
+def _fail_part_way(blob_functions, destination, monkeypatch):
+
+    offsets = _downloading(blob_functions, monkeypatch, failing=50)
+
+    with pytest.raises(BlobFunctionsError):
+        _download(blob_functions, destination)
+
+    monkeypatch.undo()
+
+    return offsets
+
+
+def test_failed_download_only_fetches_the_missing_ranges(blob_functions, destination, monkeypatch):
+
+    fetched = _fail_part_way(blob_functions, destination, monkeypatch)
+
+    assert os.path.isfile(f"{destination}.progress")
+
+    # Ranges already started when the range at 50 fails still complete
+    offsets = _downloading(blob_functions, monkeypatch)
+    _download(blob_functions, destination)
+
+    assert 50 in offsets
+    assert sorted(offsets) == [offset for offset in range(0, 100, 10) if offset not in fetched]
+
+    with open(destination, "rb") as file:
+        assert file.read() == bytes(range(100))
+
+    assert not os.path.exists(f"{destination}.progress")
+
+
+def test_download_starts_again_when_the_etag_changes(blob_functions, destination, monkeypatch):
+
+    _fail_part_way(blob_functions, destination, monkeypatch)
+
+    blob_functions.upload_blob("blob", bytes(reversed(range(100))), "container")
+
+    offsets = _downloading(blob_functions, monkeypatch)
+    _download(blob_functions, destination)
+
+    assert offsets == list(range(0, 100, 10))
+
+    with open(destination, "rb") as file:
+        assert file.read() == bytes(reversed(range(100)))
+
+
+def test_download_starts_again_when_the_partial_file_is_the_wrong_size(blob_functions, destination, monkeypatch):
+
+    _fail_part_way(blob_functions, destination, monkeypatch)
+
+    with open(destination, "r+b") as file:
+        file.truncate(30)
+
+    offsets = _downloading(blob_functions, monkeypatch)
+    _download(blob_functions, destination)
+
+    assert offsets == list(range(0, 100, 10))
+
+    with open(destination, "rb") as file:
+        assert file.read() == bytes(range(100))
@@ -0,0 +1,84 @@
+from azure.core.exceptions import ServiceResponseError
+import pytest
+
+from storagewrapper._exceptions import FileShareFunctionsError
+
+
+@pytest.fixture
+def tree(fileshare_functions):
+
+    fileshare_functions.create_fileshare_directory("share", "top/middle/bottom", recursive=True)
+
+    for directory, name in [("top", "a.txt"), ("top/middle", "b.txt"), ("top/middle/bottom", "c.txt")]:
+        fileshare_functions.upload_file("share", directory, name, name.encode("utf-8"))
+
+    return fileshare_functions
+
+
+def paths(fileshare_functions):
+
+    return sorted(entry.path for entry in fileshare_functions.walk("share"))
+
+
+def test_recursive_delete_keeps_the_target_directory_by_default(tree):
+
+    assert tree.delete_directory("share", "top", recursive=True, delete_files=True) is True
+
+    assert paths(tree) == ["top"]
+
+
+def test_recursive_delete_can_include_the_target_directory(tree):
+
+    report = tree.delete_directory("share", "top", recursive=True, delete_files=True, include_directory=True, return_report=True)
+
+    assert report
+    assert report.results[-1].name == "top"
+    assert paths(tree) == []
+
+
+def test_share_root_is_never_deleted(tree):
+
+    report = tree.delete_directory("share", "/", recursive=True, delete_files=True, include_directory=True, return_report=True)
+
+    assert report
+    assert "" not in [result.name for result in report.results]
+    assert paths(tree) == []
+
+
+def test_recursive_delete_fails_when_part_of_the_tree_cannot_be_listed(tree, monkeypatch):
+
+    list_directory = tree._FileShareFunctions__list_directory
+
+    def failing(share_name, directory_name, timeout):
+
+        if directory_name == "top/middle":
+            raise ServiceResponseError("connection reset")
+
+        return list_directory(share_name, directory_name, timeout)
+
+    monkeypatch.setattr(tree, "_FileShareFunctions__list_directory", failing)
+
+    with pytest.raises(FileShareFunctionsError):
+        tree.delete_directory("share", "top", recursive=True, delete_files=True, return_report=True)
+
+    monkeypatch.undo()
+
+    assert "top/middle/bottom" in paths(tree)
+
+
+def test_delete_files_raises_unless_a_report_is_requested(tree):
+
+    with pytest.raises(FileShareFunctionsError, match="1 of 2"):
+        tree.delete_files("share", "top", ["a.txt", "missing.txt"])
+
+    tree.upload_file("share", "top", "a.txt", b"a.txt")
+
+    report = tree.delete_files("share", "top", ["a.txt", "missing.txt"], return_report=True)
+
+    assert not report
+    assert list(report.failed) == ["top/missing.txt"]
+    assert "top/a.txt" not in paths(tree)
+
+    tree.handle_exceptions = True
+
+    assert tree.delete_files("share", "top", ["missing.txt"]) is False
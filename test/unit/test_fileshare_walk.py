@@ -0,0 +1,59 @@
+from azure.core.exceptions import ServiceResponseError
+import pytest
+
+from storagewrapper import FileShareFunctions
+from storagewrapper._exceptions import FileShareFunctionsError
+
+from conftest import Authenticator
+
+
+@pytest.fixture
+def tree(fileshare_functions):
+
+    fileshare_functions.create_fileshare_directory("share", "top/middle/bottom", recursive=True)
+    fileshare_functions.create_fileshare_directory("share", "other")
+
+    for directory, name in [("top", "a.txt"), ("top/middle", "b.txt"), ("top/middle/bottom", "c.txt"), ("", "root.txt")]:
+        fileshare_functions.upload_file("share", directory, name, name.encode("utf-8"))
+
+    return fileshare_functions
+
+
+def test_walk_lists_the_whole_tree(tree):
+
+    entries = sorted(tree.walk("share", max_workers=2))
+
+    assert [(entry.path, entry.is_directory) for entry in entries] == [
+        ("other", True), ("root.txt", False), ("top", True), ("top/a.txt", False), ("top/middle", True), ("top/middle/b.txt", False),
+        ("top/middle/bottom", True), ("top/middle/bottom/c.txt", False)]
+
+    assert sorted(entry.path for entry in tree.walk("share", "/top/middle/")) == ["top/middle/b.txt", "top/middle/bottom", "top/middle/bottom/c.txt"]
+
+
+def test_walk_of_missing_share_fails_when_called(fileshare_functions, backend):
+
+    with pytest.raises(FileShareFunctionsError):
+        fileshare_functions.walk("nosuchshare")
+
+    handled = FileShareFunctions("account", Authenticator(), handle_exceptions=True, backend=backend)
+
+    assert handled.walk("nosuchshare") is False
+
+
+def test_directory_failing_to_list_during_a_walk_raises(tree, monkeypatch):
+
+    list_directory = tree._FileShareFunctions__list_directory
+
+    def failing(share_name, directory_name, timeout):
+
+        if directory_name == "top/middle":
+            raise ServiceResponseError("connection reset")
+
+        return list_directory(share_name, directory_name, timeout)
+
+    monkeypatch.setattr(tree, "_FileShareFunctions__list_directory", failing)
+
+    tree.handle_exceptions = True
+
+    with pytest.raises(FileShareFunctionsError):
+        list(tree.walk("share"))
@@ -0,0 +1,60 @@
+from azure.core.exceptions import ServiceResponseError
+import pytest
+
+from storagewrapper import Metrics
+from storagewrapper._blob import BlobPage
+from storagewrapper._exceptions import BlobFunctionsError
+from storagewrapper._metrics import CALLS, ERRORS
+
+
+class RecordingSink:
+
+    def __init__(self):
+        self.counts = {}
+
+    def increment(self, name, labels, amount=1):
+
+        if name in (CALLS, ERRORS):
+            key = (name, dict(labels)["method"])
+            self.counts[key] = self.counts.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        pass
+
+
+@pytest.fixture
+def sink(blob_functions):
+
+    sink = RecordingSink()
+    blob_functions.metrics = Metrics([sink])
+
+    return sink
+
+
+def test_generator_methods_are_timed_until_consumed(blob_functions, sink):
+
+    blob_functions.upload_blob("blob", b"x" * 100, "container")
+    sink.counts.clear()
+
+    chunks = blob_functions.download_blob_stream("container", "blob", chunk_size=10)
+
+    assert (CALLS, "download_blob_stream") not in sink.counts
+
+    assert b"".join(chunks) == b"x" * 100
+    assert sink.counts == {(CALLS, "download_blob_stream"): 1}
+
+
+def test_errors_raised_while_iterating_are_counted_once(blob_functions, sink, monkeypatch):
+
+    def pages(*args):
+        yield BlobPage([], ["first/"], "token")
+        raise ServiceResponseError("connection reset")
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__list_pages", pages)
+
+    listing = blob_functions.list_blob_pages("container")
+
+    with pytest.raises(BlobFunctionsError):
+        list(listing)
+
+    assert sink.counts == {(CALLS, "list_blob_pages"): 1, (ERRORS, "list_blob_pages"): 1}
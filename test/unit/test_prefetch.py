@@ -0,0 +1,18 @@
+from storagewrapper._prefetch import MessagePrefetcher
+
+
+def test_max_messages_is_limited_to_the_service_maximum():
+
+    counts = []
+
+    def receive(count, visibility_timeout):
+        counts.append(count)
+        return []
+
+    with MessagePrefetcher(receive, max_messages=100, prefetch=200) as prefetcher:
+
+        assert prefetcher.max_messages == 32
+        assert list(prefetcher) == []
+
+    assert counts == [32]
+    assert MessagePrefetcher(receive, max_messages=0).max_messages == 1
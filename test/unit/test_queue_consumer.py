@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+import threading
+import time
+
+from storagewrapper._consumer import QueueConsumer
+
+
+class Message:
+
+    def __init__(self, message_id, content):
+        self.id = message_id
+        self.pop_receipt = "receipt"
+        self.content = content
+        self.dequeue_count = 1
+        self.inserted_on = datetime.now(timezone.utc)
+
+
+class Prefetcher:
+    """
+    Stands in for MessagePrefetcher, handing out the given messages and then finishing
+    """
+
+    dropped = 0
+
+    def __init__(self, messages, visibility_timeout):
+        self.entries = [(message, time.monotonic() + visibility_timeout) for message in messages]
+
+    def get(self, timeout=None):
+        return self.entries.pop(0) if self.entries else None
+
+    def close(self):
+        pass
+
+
+class UnreachableQueue:
+
+    def __init__(self):
+        self.deleted = []
+
+    def update_message(self, message, **kwargs):
+        raise ConnectionError("connection reset")
+
+    def delete_message(self, message, **kwargs):
+        self.deleted.append(message)
+
+
+def test_message_stays_hidden_after_a_content_only_update(queue_functions):
+
+    queue_functions.send_message("first", visibility_timeout=0)
+    message = queue_functions.queue_client.receive_message(visibility_timeout=60)
+
+    updated = queue_functions.update_message(message, message.pop_receipt, "second")
+
+    assert queue_functions.queue_client.receive_message() is None
+
+    queue_functions.update_message(updated, updated.pop_receipt, "third", visibility_timeout=0)
+
+    assert queue_functions.queue_client.receive_message().content == "third"
+
+
+def test_failed_heartbeats_are_counted():
+
+    queue_client = UnreachableQueue()
+    released = threading.Event()
+
+    def handler(message):
+        released.wait(5)
+
+    consumer = QueueConsumer(queue_client, handler, Prefetcher([Message("1", "content")], visibility_timeout=1), visibility_timeout=1,
+                             heartbeat_interval=0.05, max_dequeue_count=None)
+
+    with consumer.start():
+
+        deadline = time.monotonic() + 5
+
+        while consumer.stats().heartbeat_failures < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        released.set()
+
+    stats = consumer.stats()
+
+    assert stats.heartbeat_failures >= 2
+    assert stats.heartbeats == 0
+    assert isinstance(consumer.last_heartbeat_error, ConnectionError)
+    assert queue_client.deleted == ["1"]
@@ -0,0 +1,78 @@
+import threading
+
+
+class _RecordingQueueClient:
+    """
+    Records the content of each message sent, and fails to send content in failing
+    """
+
+    def __init__(self, queue_client, failing=()):
+        self.queue_client = queue_client
+        self.failing = failing
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send_message(self, content, **kwargs):
+
+        if content in self.failing:
+            raise ValueError(f"cannot send {content}")
+
+        sent_message = self.queue_client.send_message(content, **kwargs)
+
+        with self._lock:
+            self.sent.append(content)
+
+        return sent_message
+
+    def __getattr__(self, name):
+        return getattr(self.queue_client, name)
+
+
+def _recording(queue_functions, failing=()):
+
+    queue_client = _RecordingQueueClient(queue_functions.queue_client, failing)
+    queue_functions.queue_client = queue_client
+
+    return queue_client
+
+
+def test_contents_are_read_lazily(queue_functions):
+
+    queue_client = _recording(queue_functions)
+    read_ahead = []
+
+    def contents():
+
+        for index in range(200):
+            read_ahead.append(index - len(queue_client.sent))
+            yield f"message {index}"
+
+    report = queue_functions.send_messages(contents(), concurrency=2)
+
+    assert report
+    assert len(queue_client.sent) == 200
+    assert max(read_ahead) <= 4
+
+
+def test_report_is_indexed_by_position(queue_functions):
+
+    report = queue_functions.send_messages(["first", "second", "third"], visibility_timeout=0)
+
+    assert sorted(report.succeeded) == [0, 1, 2]
+
+    ids = {result.name: result.detail for result in report.results}
+    received = {message.id: message.content for message in queue_functions.queue_client.receive_messages(messages_per_page=32)}
+
+    assert [received[ids[position]] for position in range(3)] == ["first", "second", "third"]
+
+
+def test_failed_send_is_reported(queue_functions):
+
+    queue_client = _recording(queue_functions, failing={"bad"})
+
+    report = queue_functions.send_messages(["good", "bad", "also good"])
+
+    assert not report
+    assert sorted(report.succeeded) == [0, 2]
+    assert report.failed == {1: "cannot send bad"}
+    assert sorted(queue_client.sent) == ["also good", "good"]
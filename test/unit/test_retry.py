@@ -0,0 +1,201 @@
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ResourceNotFoundError, ServiceResponseError
+from azure.core.paging import ItemPaged
+from azure.storage.blob import ContainerSasPermissions
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from storagewrapper import BlobFunctions, ClientRegistry, RetryPolicy
+from storagewrapper._retry import RetryingPaged
+
+from conftest import Authenticator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+
+class _Pager:
+    """
+    Pages of a listing, failing to fetch each page in failures once before returning it
+    """
+
+    def __init__(self, pages, failures):
+        self.pages = list(pages)
+        self.failures = set(failures)
+        self.requests = 0
+
+    def __next__(self):
+
+        self.requests += 1
+
+        if not self.pages:
+            raise StopIteration
+
+        if len(self.pages) in self.failures:
+            self.failures.discard(len(self.pages))
+            raise ServiceResponseError("connection reset")
+
+        return self.pages.pop(0)
+
+
+def test_pages_are_fetched_again_after_a_transient_failure(retry_policy):
+
+    pager = _Pager([["a", "b"], ["c"]], failures={2, 1})
+
+    assert list(retry_policy.pages(pager, "account")) == [["a", "b"], ["c"]]
+    assert pager.requests == 5
+
+
+def test_pages_raise_other_errors(retry_policy):
+
+    class Missing:
+
+        requests = 0
+
+        def __next__(self):
+            self.requests += 1
+            raise ResourceNotFoundError("no such container")
+
+    pager = Missing()
+
+    with pytest.raises(ResourceNotFoundError):
+        list(retry_policy.pages(pager, "account"))
+
+    assert pager.requests == 1
+
+
+def test_max_attempts_can_be_lowered_for_one_operation(retry_policy):
+
+    attempts = []
+
+    def operation():
+        attempts.append(1)
+        raise ServiceResponseError("connection reset")
+
+    with pytest.raises(ServiceResponseError):
+        retry_policy.run(operation, "account", max_attempts=1)
+
+    assert len(attempts) == 1
+
+
+def _run_on_thread(function, timeout=5):
+    """
+    Runs function on a daemon thread, so a deadlock fails the test instead of hanging it
+    """
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    assert not thread.is_alive(), "deadlocked"
+
+    return results[0]
+
+
+def test_nested_operations_share_their_callers_slot():
+
+    policy = RetryPolicy(max_concurrency=1)
+    policy._sleep = lambda seconds: None
+    failures = [ServiceResponseError("connection reset")]
+
+    def nested():
+
+        if failures:
+            raise failures.pop()
+
+        return "key"
+
+    assert _run_on_thread(lambda: policy.run(lambda: policy.run(nested, "account"), "account")) == "key"
+    assert policy.account_state("account").in_flight == 0
+
+
+class _Credential:
+
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("token", int(time.time()) + 3600)
+
+
+def test_upload_with_one_request_in_flight_fetches_its_user_delegation_key():
+
+    from fake_storage import FakeStorage, FakeTransport
+
+    class FakeAuthenticator(Authenticator):
+        token = _Credential()
+        container_sas_permissions = ContainerSasPermissions(read=True, write=True)
+
+    storage = FakeStorage()
+    storage.containers["container"] = {}
+
+    blob_functions = BlobFunctions("account", FakeAuthenticator(), client_registry=ClientRegistry(transport_factory=lambda: FakeTransport(storage, 0)),
+                                   retry_policy=RetryPolicy(max_concurrency=1))
+
+    _run_on_thread(lambda: blob_functions.upload_blob("blob", b"data", "container"))
+
+    assert blob_functions.read_blob("container", "blob") == b"data"
+
+
+class _Paged:
+    """
+    Stands in for an ItemPaged, recording the continuation token its pages were asked to start from
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.continuation_tokens = []
+
+    def by_page(self, continuation_token=None):
+
+        self.continuation_tokens.append(continuation_token)
+
+        return self.pages
+
+
+def test_paged_listing_fetches_pages_again_after_a_transient_failure(retry_policy):
+
+    paged = RetryingPaged(_Paged(_Pager([["a", "b"], ["c"]], failures={1})), retry_policy, "account")
+
+    assert isinstance(paged, ItemPaged)
+    assert list(paged) == ["a", "b", "c"]
+
+
+def test_paged_listing_resumes_from_a_continuation_token(retry_policy):
+
+    pager = _Pager([["c"]], failures=())
+    pager.continuation_token = "next"
+    item_paged = _Paged(pager)
+
+    pages = RetryingPaged(item_paged, retry_policy, "account").by_page(continuation_token="token")
+
+    assert list(pages) == [["c"]]
+    assert pages.continuation_token == "next"
+    assert item_paged.continuation_tokens == ["token"]
+
+
+def test_paged_listing_wraps_errors(retry_policy):
+
+    class Missing:
+
+        def __next__(self):
+            raise ResourceNotFoundError("gone")
+
+    paged = RetryingPaged(_Paged(Missing()), retry_policy, "account", wrap_error=lambda error: ValueError(f"wrapped {error}"))
+
+    with pytest.raises(ValueError, match="wrapped gone"):
+        list(paged)
+
+
+def test_listings_are_pageable(blob_functions, queue_functions, fileshare_functions):
+
+    containers = blob_functions.list_containers()
+
+    assert isinstance(containers, ItemPaged)
+    assert [container.name for page in containers.by_page() for container in page] == ["container"]
+    assert [queue.name for page in queue_functions.list_queues().by_page() for queue in page] == ["queue"]
+
+    fileshare_functions.create_fileshare_directory("share", "directory")
+
+    assert [item["name"] for item in fileshare_functions.list_directories_and_files("share")] == ["directory"]
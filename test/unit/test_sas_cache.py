@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import asyncio
+import threading
+import time
+
+from storagewrapper import SasCache
+
+
+def test_value_is_created_once_and_reused():
+
+    cache = SasCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "sas", datetime.utcnow() + timedelta(hours=1)
+
+    assert cache.get("key", factory) == "sas"
+    assert cache.get("key", factory) == "sas"
+    assert len(calls) == 1
+
+
+def test_expired_value_is_refreshed():
+
+    cache = SasCache(background_refresh=False)
+
+    cache.get("key", lambda: ("old", datetime.utcnow() - timedelta(seconds=1)))
+
+    assert cache.get("key", lambda: ("new", datetime.utcnow() + timedelta(hours=1))) == "new"
+
+
+def test_concurrent_coroutines_share_one_refresh():
+
+    cache = SasCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "sas", datetime.utcnow() + timedelta(hours=1)
+
+    async def main():
+        return await asyncio.gather(*(cache.get_async("key", factory) for _ in range(10)))
+
+    assert asyncio.new_event_loop().run_until_complete(main()) == ["sas"] * 10
+    assert len(calls) == 1
+
+
+def test_event_loops_on_other_threads_do_not_await_each_others_refresh():
+
+    cache = SasCache()
+    results = []
+    errors = []
+
+    async def factory():
+        await asyncio.sleep(0.2)
+        return "sas", datetime.utcnow() + timedelta(hours=1)
+
+    def run():
+        loop = asyncio.new_event_loop()
+
+        try:
+            results.append(loop.run_until_complete(cache.get_async("key", factory)))
+
+        except Exception as e:
+            errors.append(e)
+
+        finally:
+            loop.close()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == ["sas"] * 4
+    assert cache._pending == {}
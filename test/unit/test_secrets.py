@@ -0,0 +1,102 @@
+from collections import namedtuple
+
+import pytest
+
+from storagewrapper import SecretCache
+
+Secret = namedtuple("Secret", ["value"])
+
+
+class FakeSecretClient:
+    """
+    Stands in for SecretClient. Each credential has the secrets it is allowed to read
+    """
+
+    created = []
+
+    def __init__(self, vault_url, credential):
+        self.vault_url = vault_url
+        self.credential = credential
+        self.requests = 0
+        FakeSecretClient.created.append(self)
+
+    def get_secret(self, secret_name):
+        self.requests += 1
+
+        if secret_name not in self.credential.readable:
+            raise PermissionError(f"{self.credential.name} cannot read {secret_name}")
+
+        return Secret(f"{secret_name}-value")
+
+
+class Credential:
+
+    def __init__(self, name, readable=("key",)):
+        self.name = name
+        self.readable = readable
+
+
+@pytest.fixture(autouse=True)
+def secret_client(monkeypatch):
+
+    import azure.keyvault.secrets
+
+    FakeSecretClient.created = []
+    monkeypatch.setattr(azure.keyvault.secrets, "SecretClient", FakeSecretClient)
+
+
+def test_secret_is_fetched_once_per_credential():
+
+    cache = SecretCache()
+    credential = Credential("reader")
+
+    assert cache.get("https://vault", "key", credential) == "key-value"
+    assert cache.get("https://vault", "key", credential) == "key-value"
+
+    assert len(FakeSecretClient.created) == 1
+    assert FakeSecretClient.created[0].requests == 1
+
+
+def test_secret_is_not_shared_with_another_credential():
+
+    cache = SecretCache()
+
+    assert cache.get("https://vault", "key", Credential("reader")) == "key-value"
+
+    with pytest.raises(PermissionError):
+        cache.get("https://vault", "key", Credential("outsider", readable=()))
+
+
+def test_least_recently_used_credentials_are_forgotten():
+
+    cache = SecretCache(max_credentials=2)
+    first, second, third = Credential("first"), Credential("second"), Credential("third")
+
+    cache.get("https://vault", "key", first)
+    cache.get("https://vault", "key", second)
+    cache.get("https://vault", "key", first)
+    cache.get("https://vault", "key", third)
+
+    assert list(cache._credentials) == [first, third]
+    assert {key[1] for key in cache._secret_clients} == {first, third}
+
+    cache.get("https://vault", "key", second)
+
+    assert len(FakeSecretClient.created) == 4
+
+
+def test_invalidate_only_drops_secrets_fetched_before():
+
+    cache = SecretCache()
+    credential = Credential("reader")
+
+    cache.get("https://vault", "key", credential)
+    cache.invalidate("https://vault", "key", fetched_before=0)
+    cache.get("https://vault", "key", credential)
+
+    assert FakeSecretClient.created[0].requests == 1
+
+    cache.invalidate("https://vault", "key")
+    cache.get("https://vault", "key", credential)
+
+    assert FakeSecretClient.created[0].requests == 2
@@ -0,0 +1,181 @@
+import os
+
+import pytest
+
+from storagewrapper._checkpoint import UploadJournal
+from storagewrapper._exceptions import BlobFunctionsError
+
+UPLOAD = {"account": "account", "container": "container", "blob": "blob", "size": 100, "mtime_ns": 1, "block_size": 10}
+
+
+def test_journal_is_resumed_by_the_same_upload(tmp_path):
+
+    path = str(tmp_path / "file.upload")
+
+    with UploadJournal(path, UPLOAD) as journal:
+        journal.record(0)
+        journal.record(3)
+
+    with UploadJournal(path, UPLOAD) as resumed:
+
+        assert resumed.upload_id == journal.upload_id
+        assert resumed.staged == {0, 3}
+
+
+def test_truncated_record_is_dropped(tmp_path):
+
+    path = str(tmp_path / "file.upload")
+
+    with UploadJournal(path, UPLOAD) as journal:
+        journal.record(0)
+
+    with open(path, "ab") as file:
+        file.write(b'{"blo')
+
+    with UploadJournal(path, UPLOAD) as resumed:
+
+        assert resumed.upload_id == journal.upload_id
+        assert resumed.staged == {0}
+
+        resumed.record(1)
+
+    with UploadJournal(path, UPLOAD) as resumed:
+        assert resumed.staged == {0, 1}
+
+
+def test_journal_of_another_upload_is_discarded(tmp_path):
+
+    path = str(tmp_path / "file.upload")
+
+    with UploadJournal(path, UPLOAD) as journal:
+        journal.record(0)
+
+    with UploadJournal(path, dict(UPLOAD, mtime_ns=2)) as restarted:
+
+        assert restarted.upload_id != journal.upload_id
+        assert restarted.staged == set()
+
+
+def test_journal_with_a_corrupt_header_is_discarded(tmp_path):
+
+    path = tmp_path / "file.upload"
+    path.write_bytes(b"not json\n")
+
+    with UploadJournal(str(path), UPLOAD) as journal:
+
+        assert journal.upload_id is not None
+        assert journal.staged == set()
+
+    with UploadJournal(str(path), UPLOAD) as resumed:
+        assert resumed.upload_id == journal.upload_id
+
+
+class StageFailed(Exception):
+    pass
+
+
+class _FailingBlobClient:
+    """
+    Stages blocks until limit of them have been staged, then fails. Records the id of each block staged
+    """
+
+    def __init__(self, blob_client, staged, limit):
+        self.blob_client = blob_client
+        self.staged = staged
+        self.limit = limit
+
+    def stage_block(self, block_id, data, **kwargs):
+
+        if self.limit is not None and len(self.staged) >= self.limit:
+            raise StageFailed(block_id)
+
+        self.staged.append(block_id)
+
+        return self.blob_client.stage_block(block_id, data, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.blob_client, name)
+
+
+def _staging(blob_functions, monkeypatch, limit=None):
+
+    staged = []
+    create = blob_functions._BlobFunctions__create_blob_client_from_url
+
+    monkeypatch.setattr(blob_functions, "_BlobFunctions__create_blob_client_from_url",
+                        lambda blob_name, container_name: _FailingBlobClient(create(blob_name, container_name), staged, limit))
+
+    return staged
+
+
+@pytest.fixture
+def source(tmp_path):
+
+    path = tmp_path / "file.bin"
+    path.write_bytes(bytes(range(100)))
+
+    return str(path)
+
+
+def _fail_part_way(blob_functions, source, monkeypatch):
+
+    staged = _staging(blob_functions, monkeypatch, limit=4)
+
+    with pytest.raises(BlobFunctionsError):
+        blob_functions.upload_from_path("blob", source, "container", block_size=10, max_workers=1)
+
+    monkeypatch.undo()
+
+    return staged
+
+
+def test_failed_upload_only_stages_the_missing_blocks(blob_functions, source, monkeypatch):
+
+    first = _fail_part_way(blob_functions, source, monkeypatch)
+
+    assert len(first) == 4
+    assert os.path.isfile(f"{source}.upload")
+
+    second = _staging(blob_functions, monkeypatch)
+    blob_functions.upload_from_path("blob", source, "container", block_size=10, max_workers=1)
+    monkeypatch.undo()
+
+    assert len(second) == 6
+    assert not set(first) & set(second)
+    assert blob_functions.read_blob("container", "blob") == bytes(range(100))
+    assert not os.path.exists(f"{source}.upload")
+
+
+def test_recorded_blocks_storage_no_longer_holds_are_staged_again(blob_functions, source, monkeypatch):
+
+    _fail_part_way(blob_functions, source, monkeypatch)
+
+    client = blob_functions._BlobFunctions__create_blob_client_from_url("blob", "container")
+    monkeypatch.setattr(type(client), "get_block_list", lambda self, block_list_type="committed", **kwargs: ([], []))
+
+    staged = _staging(blob_functions, monkeypatch)
+    blob_functions.upload_from_path("blob", source, "container", block_size=10, max_workers=1)
+
+    assert len(staged) == 10
+
+    monkeypatch.undo()
+
+    assert blob_functions.read_blob("container", "blob") == bytes(range(100))
+
+
+def test_upload_starts_again_when_the_source_changes(blob_functions, source, monkeypatch):
+
+    first = _fail_part_way(blob_functions, source, monkeypatch)
+
+    with open(source, "wb") as file:
+        file.write(bytes(reversed(range(100))))
+
+    os.utime(source, ns=(0, 0))
+
+    second = _staging(blob_functions, monkeypatch)
+    blob_functions.upload_from_path("blob", source, "container", block_size=10, max_workers=1)
+    monkeypatch.undo()
+
+    assert len(second) == 10
+    assert not set(first) & set(second)
+    assert blob_functions.read_blob("container", "blob") == bytes(reversed(range(100)))